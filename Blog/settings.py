@@ -33,10 +33,13 @@ INSTALLED_APPS = [
     'column',
     'link',
     'notification',
+    'search',
 ]
 
 # 中间件
 MIDDLEWARE = [
+    # 查询预算 须放在最前面
+    'common.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +108,8 @@ DATABASES = {
 DEBUG = True
 # 域名
 DOMAIN = 'blog.dreamgotech.com'
+# 协议 站点地图、订阅等处的绝对链接使用
+SITE_PROTOCOL = 'https'
 
 # 允许访问的主机
 ALLOWED_HOSTS = ['*'] if DEBUG else [DOMAIN]
@@ -122,6 +127,12 @@ USE_TZ = False
 AUTH_USER_MODEL = "user.User"
 # 分页配置
 PAGE_NUM = 8
+# 文章详情页每次加载的评论数
+COMMENT_PAGE_SIZE = 20
+# 阅读速度(字/分钟) 用于计算阅读时间
+ARTICLE_READING_SPEED = 300
+# 摘要为空时由正文生成的摘要长度
+ARTICLE_SUMMARY_LENGTH = 200
 
 # 静态文件 (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
@@ -194,6 +205,69 @@ CACHES = {
     },
 }
 
+# 计数器写缓冲 计数先累加在缓存中 再定期批量写回数据库
+COUNTER_FIELDS = {
+    'article.Article': ('view_times',),
+    'user.Attachment': ('download_times',),
+}
+# 写回间隔(秒)
+COUNTER_FLUSH_INTERVAL = 60
+# 在请求中顺带写回 使用 python manage.py flush_counters --loop 常驻写回时可关闭
+COUNTER_FLUSH_ON_REQUEST = True
+
+# 文章浏览访客去重 可选 common.dedup.SlotDedup/KeyDedup/BloomDedup
+# SlotDedup每篇文章内存固定 KeyDedup每个访客一个键 BloomDedup多进程同时写入时会互相覆盖 只适合单进程部署
+VISITOR_DEDUP_BACKEND = 'common.dedup.SlotDedup'
+# 去重窗口期(秒) 窗口期内同一ip只计一次浏览
+VISITOR_DEDUP_WINDOW = 15 * 60
+# 每篇文章每个窗口期的预计访客数 超出后新访客可能不计入浏览次数
+VISITOR_DEDUP_CAPACITY = 10000
+# 布隆过滤器误判率
+VISITOR_DEDUP_ERROR_RATE = 0.001
+
+# 通知异步写入 关闭时在事务提交后于当前请求中写入
+NOTIFICATION_ASYNC = True
+# 后台线程每批最多写入的通知数
+NOTIFICATION_BATCH_SIZE = 100
+# 凑批等待时间(秒)
+NOTIFICATION_BATCH_WAIT = 0.5
+# 队列长度 队列满时在当前请求中直接写入
+NOTIFICATION_QUEUE_SIZE = 10000
+# 后台线程写入失败时的重试间隔(秒) 重试后仍失败时逐个任务写入
+NOTIFICATION_RETRY_DELAYS = [1, 5]
+
+# 侧边栏缓存时间(秒) 相关模型保存/删除时立即失效 该时间仅用于刷新热门文章的浏览次数
+SIDEBAR_CACHE_TIMEOUT = 5 * 60
+
+# 标签云中显示的标签数
+TAG_CLOUD_SIZE = 30
+
+# 站点框架数据(网站标题、导航条、友情链接、轮播图)快照 两次检查版本号的最短间隔(秒)
+SITE_CHROME_CHECK_INTERVAL = 5
+
+# 匿名用户整页缓存时间 为0时不缓存
+PAGE_CACHE_TIMEOUT = 5 * 60
+
+# 订阅中的文章数
+FEED_SIZE = 10
+# 订阅内容缓存时间 文章变化时立即失效
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# 站点地图文件保存目录
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemap')
+# 站点地图中使用的域名 为空时使用DOMAIN 不使用请求的域名
+SITEMAP_DOMAIN = None
+
+# 新闻时间线单次最多显示的天数
+NEWS_TIMELINE_MAX_DAYS = 31
+
+# 全文搜索后端 可选 search.backends.database.DatabaseBackend(数据库倒排索引)
+# search.backends.sqlite_fts.SqliteFtsBackend(SQLite FTS5 保存在SEARCH_SQLITE_PATH)
+SEARCH_BACKEND = 'search.backends.database.DatabaseBackend'
+SEARCH_SQLITE_PATH = os.path.join(BASE_DIR, 'search.sqlite3')
+# 单次搜索最多返回的结果数
+SEARCH_RESULT_LIMIT = 200
+
 # Email配置
 # 如果想要支持ssl (比如qq邮箱) 见 https://github.com/bancek/django-smtp-ssl
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -205,6 +279,49 @@ EMAIL_SUBJECT_PREFIX = u'DreamgoBlog'  # 为邮件Subject-line前缀,默认是'[
 EMAIL_USE_TLS = False  # 与SMTP服务器通信时，是否启动TLS链接(安全链接)。默认是false
 DEFAULT_FROM_EMAIL = 'DreamGo<verify@dreamgo.tech>'
 
+# 响应式图片 生成的宽度(像素)
+IMAGE_WIDTHS = [320, 640, 1280]
+# 可生成缩小版本的上传目录 文章缩略图、轮播图、summernote上传的图片及头像 附件等其它上传文件不可
+IMAGE_SOURCE_DIRS = ['article/', 'banner/', 'summer_note/', 'user/']
+# 生成的图片保存目录
+IMAGE_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'cache', 'images')
+# 压缩质量
+IMAGE_QUALITY = 80
+# 浏览器缓存时间(秒)
+IMAGE_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+# 正文图片的sizes属性
+IMAGE_CONTENT_SIZES = '(max-width: 767px) 100vw, 750px'
+
+# 头像尺寸(像素) 最大尺寸用于个人资料 最小尺寸用于评论
+PORTRAIT_SIZES = [200, 40]
+# 头像处理进程数 为0时在请求进程中处理
+PORTRAIT_WORKERS = 2
+# 头像处理超时(秒)
+PORTRAIT_TIMEOUT = 10
+# 上传头像的最大字节数与像素数
+PORTRAIT_MAX_BYTES = 2 * 1024 * 1024
+PORTRAIT_MAX_PIXELS = 4096 * 4096
+
+# 发件箱 每批发送的邮件数 整批共用一个SMTP连接
+EMAIL_OUTBOX_BATCH_SIZE = 50
+# 最多尝试次数 超过后标记为发送失败
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# 重试间隔(秒) 第n次失败后等待 EMAIL_OUTBOX_RETRY_DELAY * 2^(n-1) 秒
+EMAIL_OUTBOX_RETRY_DELAY = 60
+# 领取邮件后的租约(秒) 发送进程中途退出时租约到期后重新发送
+EMAIL_OUTBOX_LEASE = 5 * 60
+# 事务提交后唤醒进程内的后台线程发送 使用 python manage.py send_emails --loop 常驻发送时可关闭
+EMAIL_OUTBOX_SEND_ON_COMMIT = True
+
+# 查询预算 记录每个请求的查询数、重复查询与数据库耗时
+QUERY_BUDGET_ENABLED = DEBUG
+# 超出预算或重复查询时抛出异常 测试中开启 否则只记录日志
+QUERY_BUDGET_RAISE = False
+# 未声明预算的视图允许的查询数
+QUERY_BUDGET_DEFAULT = 20
+# 同一查询(忽略参数)在一个请求中允许执行的次数
+QUERY_DUPLICATE_LIMIT = 2
+
 # 输出日志
 LOG_PATH = os.path.join(BASE_DIR, "log/")
 DJANGO_LOG_PATH = LOG_PATH + 'django.log'
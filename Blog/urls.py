@@ -2,11 +2,9 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls import url, include
 from django.conf.urls.static import static
-from django.contrib.sitemaps.views import sitemap
 
-from common.views import IndexView, VersionView
-from common.sitemaps import sitemaps
-from common.feeds import BlogFeed
+from common.views import IndexView, VersionView, sitemap_index, sitemap_section, image_view
+from common.feeds import feed_view
 
 urlpatterns = [
     url(r'^$', IndexView.as_view(), name='index'),
@@ -16,9 +14,18 @@ urlpatterns = [
     url(r'^article/', include('article.urls')),
     url(r'^news/', include('news.urls')),
     url(r'^column/', include('column.urls')),
+    url(r'^search/', include('search.urls')),
     url(r'^version/$', VersionView.as_view(), name='version'),
-    url(r'^rss/$', BlogFeed(), name='rss'),
-    url(r'^sitemap\.xml$', sitemap, {'sitemaps': sitemaps}, name='sitemap')
+    url(r'^rss/$', feed_view, name='rss'),
+    url(r'^feed/(?P<format>rss|atom|json)/$', feed_view, name='feed'),
+    url(r'^feed/(?P<format>rss|atom|json)/category/(?P<category>\d+)/$', feed_view, name='feed_category'),
+    url(r'^feed/(?P<format>rss|atom|json)/tag/(?P<tag>[^/]+)/$', feed_view, name='feed_tag'),
+    url(r'^sitemap\.xml$', sitemap_index, name='sitemap'),
+    url(r'^sitemap-(?P<section>\w+)-(?P<page>\d+)\.xml$', sitemap_section, name='sitemap_section'),
+    url(r'^image/(?P<width>\d+)/(?P<format>webp|orig)/(?P<digest>[0-9a-f]{12})/(?P<name>.+)$', image_view,
+        name='image'),
+    # 不含hash的旧链接 重定向到新链接
+    url(r'^image/(?P<width>\d+)/(?P<format>webp|orig)/(?P<name>.+)$', image_view),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if not settings.DEBUG:
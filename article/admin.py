@@ -13,23 +13,32 @@ class CategoryAdminForm(ModelForm):
 
     def __init__(self, *args, **kwargs):
         super(CategoryAdminForm, self).__init__(*args, **kwargs)
-        if self:
-            self.fields['parent'].queryset = Category.objects.exclude(id=self.instance.id)
+        if self.instance.pk:
+            # 上级分类不能为本分类或其子分类
+            self.fields['parent'].queryset = Category.objects.exclude(path__startswith=self.instance.path)
 
 
 class CategoryAdmin(admin.ModelAdmin):
     form = CategoryAdminForm
     search_fields = ('name',)
     list_filter = ('create_time',)
-    list_display = ('id', 'name', 'parent')
+    list_display = ('id', 'full_name', 'article_count')
     fields = ('name', 'parent')
 
 
+class TagAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+    list_display = ('id', 'name', 'article_count')
+    readonly_fields = ('article_count',)
+
+
 class ArticleAdmin(SummernoteModelAdmin):
     search_fields = ('title', 'summary',)
     list_filter = ('status', 'category', 'is_top', 'create_time', 'update_time', 'is_top')
     list_display = ('id', 'title', 'category', 'author', 'status', 'view_times', 'is_public', 'is_top', 'publish_time')
     summernote_fields = ('content',)
+    # 浏览次数由计数器写回 保存文章时不修改
+    readonly_fields = ('view_times',)
     fieldsets = (
         ('基本信息', {
             'fields': ('title', 'tags', 'thumbnail', 'category', 'author', 'status', 'view_times',
@@ -46,6 +55,13 @@ class ArticleAdmin(SummernoteModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        queryset = super(ArticleAdmin, self).get_queryset(request)
+        # 列表页不查询正文
+        if request.resolver_match and request.resolver_match.url_name == 'article_article_changelist':
+            queryset = queryset.for_list()
+        return queryset
+
 
 class CommentAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'article__title', 'text')
@@ -53,7 +69,16 @@ class CommentAdmin(admin.ModelAdmin):
     list_display = ('user', 'article', 'text', 'create_time')
     fields = ('user', 'article', 'parent', 'text')
 
+    def get_queryset(self, request):
+        queryset = super(CommentAdmin, self).get_queryset(request)
+        # 列表页一次查出用户名与文章标题 不查询正文
+        if request.resolver_match and request.resolver_match.url_name == 'article_comment_changelist':
+            queryset = queryset.select_related('user', 'article').only(
+                'text', 'create_time', 'user__username', 'article__title')
+        return queryset
+
 
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Article, ArticleAdmin)
 admin.site.register(Comment, CommentAdmin)
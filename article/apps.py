@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ArticleConfig(AppConfig):
     name = 'article'
     verbose_name = '博客'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,99 @@
+"""
+评论加载
+
+一篇文章的评论按 (create_time, id) 游标分页，一次查询取出本页评论及评论者，
+引用的上级评论在本页中时直接关联，不在本页中时再用一次查询补齐，之后在内存中组装成树。
+"""
+from collections import namedtuple
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+
+CURSOR_SALT = 'article.comments'
+
+Page = namedtuple('Page', ['object_list', 'cursor', 'is_end'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(comment):
+    return signing.dumps([comment.create_time.isoformat(), comment.id], salt=CURSOR_SALT)
+
+
+def _decode(cursor):
+    try:
+        create_time, last_id = signing.loads(cursor, salt=CURSOR_SALT)
+        return parse_datetime(create_time), int(last_id)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor('游标无效')
+
+
+def attach_parents(comments):
+    """
+    为评论关联引用的上级评论及其用户 并记录每条评论在本批中的回复
+    :param comments: 评论列表
+    :return: 无返回
+    """
+    comments_by_id = {comment.id: comment for comment in comments}
+    missing = {comment.parent_id for comment in comments if comment.parent_id} - set(comments_by_id)
+    parents = dict(comments_by_id)
+    if missing:
+        parents.update(Comment.objects.select_related('user').in_bulk(missing))
+    for comment in comments:
+        comment.replies = []
+    for comment in comments:
+        parent = parents.get(comment.parent_id)
+        # 上级评论已被删除时parent_id为空
+        Comment.parent.field.set_cached_value(comment, parent)
+        if comment.parent_id in comments_by_id:
+            comments_by_id[comment.parent_id].replies.append(comment)
+
+
+def get_comments(article, cursor=None, size=20):
+    """
+    按时间顺序分页加载文章的评论
+    :param article: 文章
+    :param cursor: 上一页返回的游标 为空时返回第一页
+    :param size: 每页评论数
+    :return: Page(本页评论列表, 下一页游标, 是否为最后一页)
+    """
+    comments = Comment.objects.filter(article=article).select_related('user')
+    if cursor:
+        create_time, last_id = _decode(cursor)
+        comments = comments.filter(create_time__gte=create_time).filter(
+            Q(create_time__gt=create_time) | Q(id__gt=last_id))
+    comments = list(comments.order_by('create_time', 'id')[:size + 1])
+    is_end = len(comments) <= size
+    comments = comments[:size]
+    attach_parents(comments)
+    return Page(comments, _encode(comments[-1]) if comments and not is_end else None, is_end)
+
+
+def get_tree(comments):
+    """
+    :param comments: attach_parents处理过的评论列表
+    :return: 根评论列表 回复见comment.replies 上级评论不在列表中的评论也作为根评论
+    """
+    ids = {comment.id for comment in comments}
+    return [comment for comment in comments if comment.parent_id not in ids]
+
+
+def serialize(comment):
+    """
+    :param comment: attach_parents处理过的评论
+    :return: 评论及其回复的dict
+    """
+    return {
+        'id': comment.id,
+        'user': comment.user.username if comment.user else None,
+        'portrait': comment.user.get_small_portrait() if comment.user else None,
+        'text': comment.text,
+        'parent': comment.parent_id,
+        'create_time': comment.create_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'replies': [serialize(reply) for reply in comment.replies],
+    }
@@ -0,0 +1,236 @@
+"""
+正文处理
+
+文章保存时将summernote生成的html处理一次，结果保存在文章的以下字段中，详情页直接输出：
+content_html 按白名单过滤标签、属性及链接协议后的html，上传的图片添加loading="lazy"、宽高及srcset
+toc          由h1~h4生成的目录html，标题自动添加id
+plain_text   纯文本 用于搜索及自动摘要
+word_count   字数 中日文按字、其它按单词计算
+reading_time 阅读时间(分钟) 按ARTICLE_READING_SPEED计算
+
+已有文章使用 python manage.py process_articles 批量处理。
+"""
+import math
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import unquote
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from common import images
+from search.text import CJK_RE
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'caption', 'code', 'col', 'colgroup', 'dd', 'div', 'dl', 'dt', 'em',
+    'figcaption', 'figure', 'font', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'iframe', 'img', 'li',
+    'ol', 'p', 'pre', 's', 'small', 'span', 'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td',
+    'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+GLOBAL_ATTRIBUTES = {'class', 'style', 'id', 'title', 'align'}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'target', 'rel', 'name'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'iframe': {'src', 'width', 'height', 'frameborder', 'allowfullscreen'},
+    'font': {'color', 'face', 'size'},
+    'table': {'border', 'cellpadding', 'cellspacing', 'width'},
+    'col': {'span', 'width'},
+    'td': {'colspan', 'rowspan', 'width'},
+    'th': {'colspan', 'rowspan', 'width'},
+    'ol': {'start', 'type'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto'}
+# 连同内容一起删除的标签
+DROP_CONTENT_TAGS = {'script', 'style', 'noscript', 'template', 'object', 'embed', 'textarea', 'select'}
+VOID_TAGS = {'br', 'col', 'hr', 'img'}
+# 纯文本中需要以空格分隔的块级标签
+BLOCK_TAGS = {
+    'blockquote', 'br', 'caption', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'li', 'ol', 'p', 'pre', 'table', 'td', 'th', 'tr', 'ul',
+}
+TOC_TAGS = {'h1', 'h2', 'h3', 'h4'}
+# CSS转义(\75rl)与注释可拼出url、expression 一并拒绝
+UNSAFE_STYLE_RE = re.compile(r'expression|javascript:|url\s*\(|behavior|\\|/\*', re.IGNORECASE)
+SCHEME_RE = re.compile(r'^([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+# 浏览器解析链接时忽略首尾的控制字符与空格 并删除其中的制表符、换行
+URL_IGNORED_RE = re.compile(r'[\x00-\x20\x7f]')
+# 正常链接中不会出现的控制字符 &#0;等无效字符引用解码为U+FFFD
+CONTROL_RE = re.compile(r'[\x00-\x08\x0b\x0e-\x1f\x7f\ufffd]')
+WORD_RE = re.compile(r'[a-zA-Z0-9]+')
+
+ProcessedContent = namedtuple('ProcessedContent', ['html', 'toc', 'text', 'word_count', 'reading_time'])
+
+
+def is_safe_url(value, tag):
+    """
+    :param value: href、src的值 字符引用已解码
+    :param tag: 所在标签
+    :return: 是否可保留 相对地址及ALLOWED_SCHEMES中的协议可保留 含控制字符时一律拒绝
+    """
+    if CONTROL_RE.search(value):
+        return False
+    value = URL_IGNORED_RE.sub('', value).lower()
+    match = SCHEME_RE.match(value)
+    if tag == 'iframe':
+        # iframe只允许外部http(s)地址
+        return bool(match) and match.group(1) in ('http', 'https')
+    if not match:
+        return True
+    if tag == 'img' and value.startswith('data:image/'):
+        return True
+    return match.group(1) in ALLOWED_SCHEMES
+
+
+def get_image_size(src):
+    """
+    :param src: 图片地址
+    :return: MEDIA_URL下图片的(宽, 高) 其它图片返回None
+    """
+    if not src.startswith(settings.MEDIA_URL):
+        return None
+    try:
+        with Image.open(default_storage.path(unquote(src[len(settings.MEDIA_URL):]))) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class ContentProcessor(HTMLParser):
+    def __init__(self):
+        super(ContentProcessor, self).__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.toc = []
+        self.stack = []
+        self.skip = 0
+        self.heading = None
+        self.ids = set()
+
+    def clean_attrs(self, tag, attrs):
+        allowed = GLOBAL_ATTRIBUTES | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        for name, value in attrs:
+            value = value or ''
+            if name not in allowed or name in cleaned:
+                continue
+            if name in URL_ATTRIBUTES and not is_safe_url(value, tag):
+                continue
+            if name == 'style' and UNSAFE_STYLE_RE.search(value):
+                continue
+            cleaned[name] = value
+        if tag == 'a' and cleaned.get('target') == '_blank':
+            cleaned['rel'] = 'noopener noreferrer'
+        return cleaned
+
+    def process_img(self, attrs):
+        src = attrs['src']
+        attrs['loading'] = 'lazy'
+        if 'width' not in attrs and 'height' not in attrs:
+            size = get_image_size(src)
+            if size:
+                attrs['width'], attrs['height'] = size
+        name = unquote(src[len(settings.MEDIA_URL):]) if src.startswith(settings.MEDIA_URL) else None
+        srcset = images.get_srcset(name) if name and images.is_source(name) else ''
+        if srcset:
+            attrs['srcset'] = srcset
+            attrs['sizes'] = settings.IMAGE_CONTENT_SIZES
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip += 1
+            return
+        if self.skip or tag not in ALLOWED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        attrs = self.clean_attrs(tag, attrs)
+        if tag == 'img':
+            if not attrs.get('src'):
+                return
+            self.process_img(attrs)
+        if tag in TOC_TAGS and self.heading is None:
+            if not attrs.get('id') or attrs['id'] in self.ids:
+                attrs['id'] = 'toc-{}'.format(len(self.toc) + 1)
+            self.heading = {'level': int(tag[1]), 'id': attrs['id'], 'title': []}
+            self.toc.append(self.heading)
+        if attrs.get('id'):
+            self.ids.add(attrs['id'])
+        self.html.append('<{}{}>'.format(tag, ''.join(
+            ' {}="{}"'.format(name, escape(value)) for name, value in attrs.items())))
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip = max(0, self.skip - 1)
+            return
+        if self.skip or tag not in self.stack:
+            return
+        # 关闭未闭合的标签
+        while self.stack:
+            current = self.stack.pop()
+            self.html.append('</{}>'.format(current))
+            if self.heading is not None and current == 'h{}'.format(self.heading['level']):
+                self.heading['title'] = ' '.join(''.join(self.heading['title']).split())
+                self.heading = None
+            if current == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        self.html.append(escape(data))
+        self.text.append(data)
+        if self.heading is not None:
+            self.heading['title'].append(data)
+
+    def close(self):
+        super(ContentProcessor, self).close()
+        while self.stack:
+            self.handle_endtag(self.stack[-1])
+
+
+def count_words(text):
+    """
+    :param text: 纯文本
+    :return: 字数 中日文按字、其它按单词计算
+    """
+    return len(CJK_RE.findall(text)) + len(WORD_RE.findall(text))
+
+
+def process(content):
+    """
+    :param content: summernote生成的html
+    :return: ProcessedContent
+    """
+    processor = ContentProcessor()
+    processor.feed(content or '')
+    processor.close()
+    text = ' '.join(''.join(processor.text).split())
+    word_count = count_words(text)
+    toc = [entry for entry in processor.toc if entry['title']]
+    return ProcessedContent(
+        html=''.join(processor.html),
+        toc=render_to_string('article/toc.html', {'toc': toc}) if toc else '',
+        text=text,
+        word_count=word_count,
+        reading_time=int(math.ceil(word_count / settings.ARTICLE_READING_SPEED)) if word_count else 0,
+    )
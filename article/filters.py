@@ -1,15 +1,27 @@
-from django_filters import FilterSet
+from django_filters import FilterSet, CharFilter, NumberFilter
 from .models import *
 
 
 class ArticleFilter(FilterSet):
+    # 按分类筛选 包含全部子分类
+    category = NumberFilter(method='filter_category')
+    # 按标签精确筛选
+    tag = CharFilter(field_name='tag_set__name')
+    # 兼容旧链接 ?tags= ?tags__icontains= 与?tag=相同
+    tags = CharFilter(field_name='tag_set__name')
+    tags__icontains = CharFilter(field_name='tag_set__name')
+
     class Meta:
         model = Article
         fields = {
             'author': ['exact'],
-            'category': ['exact'],
             'title': ['exact', 'icontains'],
             'is_public': ['exact'],
-            'tags': ['exact', 'icontains'],
             'column': ['exact'],
         }
+
+    def filter_category(self, queryset, name, value):
+        category = Category.objects.filter(pk=value).only('path').first()
+        if category is None:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=category.path)
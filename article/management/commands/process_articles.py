@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from common import pagecache
+from article.models import Article
+
+
+def process_chunk(rows):
+    """
+    处理一批文章的正文 在子进程中执行 不访问数据库
+    :param rows: [(id, content, summary), ...]
+    :return: [(id, {字段名: 值}), ...]
+    """
+    return [(pk, Article(content=content, summary=summary).get_processed_fields())
+            for pk, content, summary in rows]
+
+
+def write_chunk(results):
+    # 使用update()写回 不修改update_time
+    with transaction.atomic():
+        for pk, fields in results:
+            Article.objects.filter(pk=pk).update(**fields)
+    return len(results)
+
+
+class Command(BaseCommand):
+    help = '处理全部文章的正文 生成过滤后的html、目录、纯文本及阅读时间'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='进程数 为0时在当前进程处理')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='每个进程每次处理的文章数')
+
+    def handle(self, *args, **options):
+        ids = list(Article.objects.order_by('id').values_list('id', flat=True))
+        size = options['chunk_size']
+        chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+        workers = options['workers']
+
+        def read(chunk):
+            return list(Article.objects.filter(id__in=chunk).values_list('id', 'content', 'summary'))
+
+        count = 0
+        if workers:
+            # 主进程读写数据库 子进程只处理正文 每轮最多workers批 限制内存占用
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for i in range(0, len(chunks), workers):
+                    rows = [read(chunk) for chunk in chunks[i:i + workers]]
+                    for results in executor.map(process_chunk, rows):
+                        count += write_chunk(results)
+        else:
+            for chunk in chunks:
+                count += write_chunk(process_chunk(read(chunk)))
+        pagecache.invalidate(pagecache.SITE_TAG)
+        self.stdout.write('已处理{}篇文章'.format(count))
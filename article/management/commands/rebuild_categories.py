@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from article.models import Category
+
+
+class Command(BaseCommand):
+    help = '重新计算全部分类的路径、层级、全名及文章数'
+
+    def handle(self, *args, **options):
+        categories = {category.pk: category for category in Category.objects.all()}
+        children = defaultdict(list)
+        for category in categories.values():
+            children[category.parent_id if category.parent_id in categories else None].append(category)
+
+        # 由根分类开始逐层计算 保证上级分类先于子分类
+        done = set()
+        queue = list(children[None])
+        while queue:
+            category = queue.pop(0)
+            if category.parent_id not in categories:
+                category.parent_id = None
+            category.update_tree()
+            done.add(category.pk)
+            queue.extend(children[category.pk])
+
+        # 上级分类形成环的分类无法由根分类到达 将其改为根分类
+        for pk in set(categories) - done:
+            category = categories[pk]
+            self.stdout.write('分类 {} 的上级分类形成环 已改为根分类'.format(category.name))
+            category.parent = None
+            category.save()
+
+        Category.update_counts()
+        self.stdout.write('已更新{}个分类'.format(len(categories)))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from article.models import Article
+
+
+class Command(BaseCommand):
+    help = '根据评论表重新计算全部文章的评论数'
+
+    def handle(self, *args, **options):
+        count = Article.update_comment_times()
+        self.stdout.write('已更新{}篇文章的评论数'.format(count))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from article.models import Article, Tag
+
+
+class Command(BaseCommand):
+    help = '根据Article.tags重建标签索引及标签文章数'
+
+    def handle(self, *args, **options):
+        count = 0
+        for article in Article.objects.only('id', 'tags').iterator():
+            article.sync_tags(update_counts=False)
+            count += 1
+        Tag.update_counts()
+        self.stdout.write('已同步{}篇文章 共{}个标签'.format(count, Tag.objects.count()))
@@ -1,9 +1,16 @@
+from collections import OrderedDict
+
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from common.utils import get_time_filename
 
+from .content import process as process_html
+
 
 # 分类
 class Category(models.Model):
@@ -17,6 +24,23 @@ class Category(models.Model):
                                blank=True,
                                on_delete=models.SET_NULL,
                                verbose_name='上级分类')
+    # 路径 由根分类到本分类的id 如 00000001/00000005/ 保存时维护
+    path = models.CharField(max_length=190,
+                            db_index=True,
+                            editable=False,
+                            verbose_name='路径')
+    # 层级 根分类为0
+    depth = models.IntegerField(default=0,
+                                editable=False,
+                                verbose_name='层级')
+    # 全名 如 上级分类-->本分类
+    full_name = models.CharField(max_length=255,
+                                 editable=False,
+                                 verbose_name='全名')
+    # 本分类及全部子分类下的公开文章数
+    article_count = models.IntegerField(default=0,
+                                        editable=False,
+                                        verbose_name='文章数')
     # 创建时间
     create_time = models.DateTimeField(auto_now_add=True,
                                        verbose_name='创建时间')
@@ -27,16 +51,137 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = '分类'
         verbose_name = '分类'
-        ordering = ['-create_time']
+        # 按路径排序即为树的先序遍历
+        ordering = ['path']
+
+    @staticmethod
+    def make_path(parent_path, pk):
+        return '{}{:08d}/'.format(parent_path, pk)
+
+    def get_ancestor_ids(self):
+        """
+        :return: 由根分类到本分类的id列表 含本分类
+        """
+        return [int(pk) for pk in self.path.split('/') if pk]
+
+    def get_descendants(self, include_self=True):
+        """
+        :param include_self: 是否包含本分类
+        :return: 全部子分类QuerySet
+        """
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def clean(self):
+        # 上级分类不能为本分类或其子分类
+        if self.pk and self.parent_id:
+            parent = Category.objects.filter(pk=self.parent_id).first()
+            if parent and self.pk in parent.get_ancestor_ids():
+                raise ValidationError({'parent': '上级分类不能为本分类或其子分类'})
+
+    def save(self, *args, **kwargs):
+        super(Category, self).save(*args, **kwargs)
+        self.update_tree()
+
+    def update_tree(self):
+        """
+        根据上级分类重新计算本分类及全部子分类的路径、层级、全名 并更新受影响分类的文章数
+        :return: 无返回
+        """
+        parent = None
+        if self.parent_id:
+            parent = Category.objects.filter(pk=self.parent_id).values('path', 'depth', 'full_name').first()
+        if parent:
+            values = {'path': Category.make_path(parent['path'], self.pk), 'depth': parent['depth'] + 1,
+                      'full_name': '{}-->{}'.format(parent['full_name'], self.name)}
+        else:
+            values = {'path': Category.make_path('', self.pk), 'depth': 0, 'full_name': self.name}
+        old_path = self.path
+        if all(getattr(self, key) == value for key, value in values.items()):
+            return
+        old_ancestors = set(self.get_ancestor_ids())
+
+        Category.objects.filter(pk=self.pk).update(**values)
+        for key, value in values.items():
+            setattr(self, key, value)
+        if old_path:
+            # 子分类按原层级由上到下更新
+            nodes = {self.pk: values}
+            for child in Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).order_by('depth'):
+                parent = nodes[child.parent_id]
+                nodes[child.pk] = {'path': Category.make_path(parent['path'], child.pk),
+                                   'depth': parent['depth'] + 1,
+                                   'full_name': '{}-->{}'.format(parent['full_name'], child.name)}
+                Category.objects.filter(pk=child.pk).update(**nodes[child.pk])
+        Category.update_counts(Category.objects.filter(id__in=old_ancestors | set(self.get_ancestor_ids())))
+
+    @classmethod
+    def update_counts(cls, categories=None):
+        """
+        重新计算分类及其全部子分类下的公开文章数 一条UPDATE完成
+        :param categories: 需要更新的分类QuerySet 默认全部分类
+        :return: 更新的分类数
+        """
+        if categories is None:
+            categories = cls.objects.all()
+        # 按is_public分组 筛选后只有一组 即子查询返回一行文章数
+        count = Article.objects.filter(
+            category__path__startswith=OuterRef('path'), is_public=True, status=0
+        ).order_by().values('is_public').annotate(count=Count('pk')).values('count')
+        return categories.update(article_count=Coalesce(Subquery(count, output_field=models.IntegerField()), 0))
 
     def get_absolute_url(self):
         return reverse('category-detail-view', args=(self.name,))
 
     def __str__(self):
-        if self.parent:
-            return '{}-->{}'.format(self.parent, self.name)
-        else:
-            return self.name
+        return self.full_name or self.name
+
+
+# 标签
+class Tag(models.Model):
+    # 名称
+    name = models.CharField(max_length=40,
+                            unique=True,
+                            verbose_name='名称')
+    # 公开文章数
+    article_count = models.IntegerField(default=0,
+                                        verbose_name='文章数')
+
+    class Meta:
+        verbose_name_plural = '标签'
+        verbose_name = '标签'
+        ordering = ['-article_count']
+
+    @classmethod
+    def update_counts(cls, tags=None):
+        """
+        重新计算标签下的公开文章数 一条UPDATE完成
+        :param tags: 需要更新的标签QuerySet 默认全部标签
+        :return: 更新的标签数
+        """
+        if tags is None:
+            tags = cls.objects.all()
+        count = Article.tag_set.through.objects.filter(
+            tag=OuterRef('pk'), article__is_public=True, article__status=0
+        ).order_by().values('tag').annotate(count=Count('pk')).values('count')
+        return tags.update(article_count=Coalesce(Subquery(count, output_field=models.IntegerField()), 0))
+
+    def __str__(self):
+        return self.name
+
+
+def validate_tags(value):
+    """
+    每个标签不超过Tag.name的长度 否则同步标签索引时写入失败
+    :param value: 英文逗号分隔的标签
+    """
+    max_length = Tag._meta.get_field('name').max_length
+    for tag in (value or '').split(','):
+        if len(tag.strip()) > max_length:
+            raise ValidationError('标签"%(tag)s"超过%(max_length)s个字符',
+                                  params={'tag': tag.strip(), 'max_length': max_length})
 
 
 def article_img_path(instance, filename):
@@ -44,7 +189,24 @@ def article_img_path(instance, filename):
 
 
 # 公开文章Manager
-class PublicManager(models.Manager):
+class ArticleQuerySet(models.QuerySet):
+    # 列表模板(首页、文章列表、全部文章、专栏、后台列表)用到的字段 不包含正文
+    LIST_FIELDS = (
+        'id', 'title', 'summary', 'thumbnail', 'tags', 'view_times', 'comment_times', 'is_top', 'is_public',
+        'status', 'publish_time', 'update_time',
+        'author', 'author__username',
+        'category', 'category__name', 'category__full_name',
+    )
+
+    def for_list(self):
+        """
+        列表投影 只查询列表模板用到的字段 作者、分类在同一查询中连接
+        :return: QuerySet
+        """
+        return self.select_related('author', 'category').only(*self.LIST_FIELDS)
+
+
+class PublicManager(models.Manager.from_queryset(ArticleQuerySet)):
     def get_queryset(self):
         return super(PublicManager, self).get_queryset().filter(is_public=True)
 
@@ -76,18 +238,50 @@ class Article(models.Model):
     tags = models.CharField(max_length=200,
                             null=True,
                             blank=True,
+                            validators=[validate_tags],
                             verbose_name='标签',
                             help_text='用英文逗号分隔')
-    # 摘要
-    summary = models.TextField(verbose_name='摘要')
+    # 标签索引 由tags同步
+    tag_set = models.ManyToManyField(Tag,
+                                     blank=True,
+                                     editable=False,
+                                     verbose_name='标签索引')
+    # 摘要 为空时由正文生成
+    summary = models.TextField(blank=True,
+                               verbose_name='摘要')
     # 正文
     content = models.TextField(verbose_name='正文')
+    # 以下字段在保存时由正文生成 见article.content
+    # 过滤后的正文
+    content_html = models.TextField(blank=True,
+                                    editable=False,
+                                    verbose_name='正文html')
+    # 目录
+    toc = models.TextField(blank=True,
+                           editable=False,
+                           verbose_name='目录')
+    # 纯文本
+    plain_text = models.TextField(blank=True,
+                                  editable=False,
+                                  verbose_name='纯文本')
+    # 字数
+    word_count = models.IntegerField(default=0,
+                                     editable=False,
+                                     verbose_name='字数')
+    # 阅读时间(分钟)
+    reading_time = models.IntegerField(default=0,
+                                       editable=False,
+                                       verbose_name='阅读时间')
     # 查看次数
     view_times = models.IntegerField(default=0,
                                      verbose_name='查看次数')
     # 点赞次数
     zan_times = models.IntegerField(default=0,
                                     verbose_name='点赞次数')
+    # 评论数 由评论的signal维护
+    comment_times = models.IntegerField(default=0,
+                                        editable=False,
+                                        verbose_name='评论数')
     # 置顶
     is_top = models.BooleanField(default=False, verbose_name='置顶')
     # 状态 选项
@@ -112,21 +306,100 @@ class Article(models.Model):
     update_time = models.DateTimeField(auto_now=True,
                                        verbose_name='更新时间')
 
-    objects = models.Manager()
+    objects = ArticleQuerySet.as_manager()
     public = PublicManager()
 
     def get_tags(self):
-        tags_list = []
-        if self.tags:
-            tags_list = self.tags.split(',')
-            while '' in tags_list:
-                tags_list.remove('')
-        return tags_list
+        if not self.tags:
+            return []
+        return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+
+    def sync_tags(self, update_counts=True):
+        """
+        根据tags同步标签索引
+        :param update_counts: 是否重新计算涉及标签的文章数
+        :return: 无返回
+        """
+        names = list(OrderedDict.fromkeys(self.get_tags()))
+        old_ids = set(self.tag_set.values_list('id', flat=True))
+        tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+        for name in names:
+            if name not in tags:
+                tags[name], created = Tag.objects.get_or_create(name=name)
+        self.tag_set.set(tags.values())
+        if update_counts:
+            Tag.update_counts(Tag.objects.filter(id__in=old_ids | {tag.id for tag in tags.values()}))
+
+    @classmethod
+    def update_comment_times(cls, articles=None):
+        """
+        根据评论表重新计算评论数 一条UPDATE完成
+        :param articles: 需要更新的文章QuerySet 默认全部文章
+        :return: 更新的文章数
+        """
+        if articles is None:
+            articles = cls.objects.all()
+        count = Comment.objects.filter(article=OuterRef('pk')).order_by().values(
+            'article').annotate(count=Count('pk')).values('count')
+        return articles.update(comment_times=Coalesce(Subquery(count, output_field=models.IntegerField()), 0))
+
+    def get_processed_fields(self):
+        """
+        :return: 由正文生成的字段 {字段名: 值}
+        """
+        result = process_html(self.content)
+        fields = {
+            'content_html': result.html,
+            'toc': result.toc,
+            'plain_text': result.text,
+            'word_count': result.word_count,
+            'reading_time': result.reading_time,
+        }
+        if not self.summary.strip():
+            fields['summary'] = result.text[:settings.ARTICLE_SUMMARY_LENGTH]
+        return fields
+
+    def process_content(self):
+        """
+        处理正文 更新由正文生成的字段
+        :return: 更新的字段名列表
+        """
+        fields = self.get_processed_fields()
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return list(fields)
+
+    # 普通保存时不写回的计数字段
+    COUNT_FIELDS = ('view_times', 'zan_times', 'comment_times')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            processed = self.process_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + [name for name in processed
+                                                                 if name not in update_fields]
+        # 浏览、点赞、评论数只通过F()表达式原子更新 普通保存时不写回这些字段 避免覆盖并发的修改及计数器的写回
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNT_FIELDS]
+        return super(Article, self).save(*args, **kwargs)
 
     class Meta:
         verbose_name_plural = '博客'
         verbose_name = '博客'
-        ordering = ['-is_top', '-view_times', '-publish_time']
+        # 与列表页的排序一致 未指定排序的查询同样可以使用下方的索引
+        ordering = ['-is_top', '-publish_time']
+        indexes = [
+            # 首页、分类、标签、专栏列表: WHERE is_public AND status ORDER BY is_top, publish_time
+            models.Index(fields=['is_public', 'status', 'is_top', 'publish_time']),
+            # 侧边栏热门文章: WHERE is_public AND status ORDER BY view_times
+            models.Index(fields=['is_public', 'status', 'view_times']),
+            # 全部文章页按以下字段+id游标分页
+            models.Index(fields=['publish_time', 'id']),
+            models.Index(fields=['view_times', 'id']),
+            models.Index(fields=['comment_times', 'id']),
+        ]
 
     def get_absolute_url(self):
         return reverse('article_detail', args=(self.id,))
@@ -166,6 +439,9 @@ class Comment(models.Model):
     class Meta:
         verbose_name = '评论'
         verbose_name_plural = '评论'
+        indexes = [
+            models.Index(fields=['article', 'create_time']),
+        ]
 
     def __str__(self):
         return '{}_{}'.format(self.article.title, self.pk)
@@ -0,0 +1,71 @@
+"""
+全部文章页游标分页
+
+按 排序字段+id 定位上一页最后一篇文章，下一页为 WHERE (field, id) < (value, last_id) 的前N篇，
+配合(field, id)索引每页的开销与翻页深度无关，翻页过程中发布新文章也不会导致重复或遗漏。
+游标经过签名，客户端无法伪造或修改。
+"""
+from collections import namedtuple
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# 允许的排序方式 客户端排序参数: 文章字段
+SORTS = {
+    '-publish_time': 'publish_time',
+    '-view_times': 'view_times',
+    '-comment_count': 'comment_times',
+}
+DEFAULT_SORT = '-publish_time'
+
+CURSOR_SALT = 'article.pagination'
+
+Page = namedtuple('Page', ['object_list', 'cursor', 'is_end'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(sort, article):
+    value = getattr(article, SORTS[sort])
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return signing.dumps([sort, value, article.id], salt=CURSOR_SALT, compress=True)
+
+
+def _decode(sort, cursor):
+    try:
+        cursor_sort, value, last_id = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor('游标无效')
+    if cursor_sort != sort:
+        raise InvalidCursor('游标与排序方式不一致')
+    if SORTS[sort] == 'publish_time':
+        value = parse_datetime(value)
+    return value, last_id
+
+
+def paginate(articles, sort=DEFAULT_SORT, cursor=None, size=10):
+    """
+    游标分页
+    :param articles: 文章QuerySet
+    :param sort: 排序方式 须为SORTS中的键
+    :param cursor: 上一页返回的游标 为空时返回第一页
+    :param size: 每页文章数
+    :return: Page(本页文章列表, 下一页游标, 是否为最后一页)
+    """
+    if sort not in SORTS:
+        raise InvalidCursor('不支持的排序方式')
+    field = SORTS[sort]
+    if cursor:
+        value, last_id = _decode(sort, cursor)
+        # 先以field <= value限定索引扫描范围 再排除同值中已显示的文章
+        articles = articles.filter(**{field + '__lte': value}).filter(
+            Q(**{field + '__lt': value}) | Q(id__lt=last_id))
+    article_list = list(articles.order_by('-' + field, '-id')[:size + 1])
+    is_end = len(article_list) <= size
+    article_list = article_list[:size]
+    next_cursor = _encode(sort, article_list[-1]) if article_list and not is_end else None
+    return Page(article_list, next_cursor, is_end)
@@ -9,8 +9,9 @@ class CategoryForm(forms.ModelForm):
         super(CategoryForm, self).__init__(*args, **kwargs)
         self.fields['name'].widget.attrs.update({'class': 'form-control'})
         self.fields['parent'].widget.attrs.update({'class': 'form-control'})
-        if self.instance:
-            self.fields['parent'].queryset = Category.objects.exclude(id=self.instance.id)
+        if self.instance.pk:
+            # 上级分类不能为本分类或其子分类
+            self.fields['parent'].queryset = Category.objects.exclude(path__startswith=self.instance.path)
 
     class Meta:
         model = Category
@@ -0,0 +1,107 @@
+from django.dispatch import receiver
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from notification.models import Notification
+from notification.dispatch import register, enqueue
+
+from .models import Article, Tag, Comment, Category
+
+
+def update_category_counts(*category_ids):
+    ancestor_ids = set()
+    for category in Category.objects.filter(id__in=[pk for pk in category_ids if pk]).only('path'):
+        ancestor_ids.update(category.get_ancestor_ids())
+    if ancestor_ids:
+        Category.update_counts(Category.objects.filter(id__in=ancestor_ids))
+
+
+@receiver(pre_save, sender=Article)
+def article_pre_save(sender, instance, raw=False, **kwargs):
+    instance._old_category_id = None
+    if not instance._state.adding and not raw:
+        instance._old_category_id = Article.objects.filter(pk=instance.pk).values_list(
+            'category_id', flat=True).first()
+
+
+# 同步标签索引及标签文章数、分类文章数
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.sync_tags()
+        update_category_counts(getattr(instance, '_old_category_id', None), instance.category_id)
+
+
+@receiver(pre_delete, sender=Article)
+def article_pre_delete(sender, instance, **kwargs):
+    instance._tag_ids = list(instance.tag_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    Tag.update_counts(Tag.objects.filter(id__in=getattr(instance, '_tag_ids', [])))
+    update_category_counts(instance.category_id)
+
+
+# 删除分类后 其子分类成为根分类 需重新计算路径
+@receiver(pre_delete, sender=Category)
+def category_pre_delete(sender, instance, **kwargs):
+    instance._child_ids = list(Category.objects.filter(parent=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    for child in Category.objects.filter(id__in=getattr(instance, '_child_ids', [])):
+        child.update_tree()
+    Category.update_counts(Category.objects.filter(id__in=instance.get_ancestor_ids()))
+
+
+def change_comment_times(article_id, delta):
+    if article_id and delta:
+        Article.objects.filter(pk=article_id).update(comment_times=F('comment_times') + delta)
+
+
+# 维护文章评论数 QuerySet.update()/bulk_create()不会触发以下signal 需执行rebuild_comment_times
+@receiver(pre_save, sender=Comment)
+def comment_pre_save(sender, instance, raw=False, **kwargs):
+    instance._old_article_id = None
+    if not instance._state.adding and not raw:
+        instance._old_article_id = Comment.objects.filter(pk=instance.pk).values_list(
+            'article_id', flat=True).first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_article_id', None)
+    if old != instance.article_id:
+        change_comment_times(old, -1)
+        change_comment_times(instance.article_id, 1)
+    if kwargs.get('created') and instance.parent_id:
+        enqueue('comment_reply', instance.id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_post_delete(sender, instance, **kwargs):
+    change_comment_times(instance.article_id, -1)
+
+
+# 回复通知 由notification.dispatch在后台线程中批量生成
+@register('comment_reply')
+def build_reply_notifications(args_list):
+    comments = Comment.objects.filter(id__in=[args[0] for args in args_list], parent__isnull=False).select_related(
+        'user', 'article', 'parent__user')
+    notifications = []
+    for comment in comments:
+        # 生成前评论者或被回复者已被删除
+        if not comment.user_id or not comment.parent.user_id:
+            continue
+        info = '{}回复了你在 {} 的评论'.format(comment.user.username,
+                                          comment.article.title if comment.article else '')
+        # 文章标题较长时截断 避免超出通知标题长度导致整批写入失败
+        notifications.append(Notification(title=info[:Notification._meta.get_field('title').max_length],
+                                          text=comment.text, from_user_id=comment.user_id,
+                                          to_user_id=comment.parent.user_id,
+                                          url='/article/{}/'.format(comment.article_id)))
+    return notifications
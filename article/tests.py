@@ -1,3 +1,284 @@
-from django.test import TestCase
+import re
+import tempfile
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from user.models import User
+from column.models import Column
+from common import counters
+from .content import process
+from .filters import ArticleFilter
+from .forms import ArticleForm
+from .models import Article, Category, Tag
+
+# 查询正文字段的SQL
+CONTENT_RE = re.compile(r'"article_article"\."(content|content_html|plain_text|toc)"')
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ListProjectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.category = Category.objects.create(name='python')
+        cls.articles = [Article.objects.create(author=cls.user, category=cls.category, title='标题{}'.format(i),
+                                               tags='python', summary='摘要{}'.format(i),
+                                               content='<p>{}</p>'.format('正文' * 1000))
+                        for i in range(10)]
+        cls.column = Column.objects.create(name='专栏', summary='专栏')
+        cls.column.article.add(*cls.articles[:5])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def assertNoContentQueries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertEqual(response.status_code, 200, url)
+        queries = [query['sql'] for query in context.captured_queries if CONTENT_RE.search(query['sql'])]
+        self.assertEqual(queries, [], url)
+        return response
+
+    def test_list_pages(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(SITEMAP_ROOT=root):
+            for url in [reverse('index'), reverse('article_index'), reverse('article_all'),
+                        '{}?category={}'.format(reverse('article_index'), self.category.pk),
+                        '{}?tag=python'.format(reverse('article_index')),
+                        reverse('column_detail', args=(self.column.pk,)),
+                        reverse('feed', kwargs={'format': 'rss'}), reverse('sitemap')]:
+                self.assertNoContentQueries('get', url)
+        response = self.assertNoContentQueries('post', reverse('article_all'), {'val': 'all'})
+        self.assertIn('标题9', response.json()['html'])
+
+    def test_list_pages_with_permission(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        for url in [reverse('index'), reverse('article_all'), reverse('admin:article_article_changelist')]:
+            self.assertNoContentQueries('get', url)
+
+    def test_joins_author_and_category(self):
+        with self.assertNumQueries(1):
+            articles = list(Article.public.for_list()[:5])
+            for article in articles:
+                article.author.username, article.category.name
+
+    def test_detail_page_loads_content(self):
+        response = self.client.get(reverse('article_detail', args=(self.articles[0].pk,)))
+        self.assertContains(response, '正文正文')
+
+
+class ContentSanitizerTests(SimpleTestCase):
+    def assertDropped(self, content, value):
+        html = process(content).html
+        self.assertNotIn(value, html.lower(), content)
+        return html
+
+    def test_scripts(self):
+        self.assertDropped('<p>a<script>alert(1)</script></p>', 'alert')
+        self.assertDropped('<p onclick="alert(1)">a</p>', 'onclick')
+
+    def test_href_schemes(self):
+        for href in ['javascript:alert(1)', ' javascript:alert(1)', 'java\tscript:alert(1)', 'JavaScript:alert(1)',
+                     '\x01javascript:alert(1)', '\x00javascript:alert(1)', '\x1fjavascript:alert(1)',
+                     '\x7fjavascript:alert(1)', 'data:text/html,<script>alert(1)</script>', 'vbscript:msgbox(1)']:
+            self.assertDropped('<a href="{}">a</a>'.format(href), 'href')
+
+    def test_character_references(self):
+        for href in ['&#1;javascript:alert(1)', '&#x01;javascript:alert(1)', '&#106;avascript:alert(1)',
+                     '&#x6A;avascript:alert(1)', 'javascript&colon;alert(1)', 'java&#9;script:alert(1)',
+                     '&#0;javascript:alert(1)', 'javas&#x0A;cript:alert(1)']:
+            self.assertDropped('<a href="{}">a</a>'.format(href), 'href')
+
+    def test_safe_urls(self):
+        for href in ['https://example.com/', 'http://example.com/?a=1&amp;b=2', 'mailto:a@example.com', '/article/1/',
+                     '#toc-1', 'page.html']:
+            self.assertIn('href=', process('<a href="{}">a</a>'.format(href)).html, href)
+        self.assertIn('src="data:image/png;base64,AAAA"', process('<img src="data:image/png;base64,AAAA">').html)
+        self.assertDropped('<a href="data:image/png;base64,AAAA">a</a>', 'href')
+
+    def test_iframe(self):
+        html = process('<iframe src="https://player.example.com/1"></iframe>').html
+        self.assertIn('src="https://player.example.com/1"', html)
+        for src in ['//evil.example.com/', '/admin/', 'javascript:alert(1)', '\x01https://example.com/',
+                    'mailto:a@example.com', 'data:text/html,a']:
+            self.assertDropped('<iframe src="{}"></iframe>'.format(src), 'src')
+
+    def test_style(self):
+        for style in ['background: url(https://example.com/a.png)', 'background: URL (x)',
+                      'width: expression(alert(1))',
+                      'background: \\75rl(x)', 'background: u\\72l(x)', 'width: expr/**/ession(alert(1))',
+                      'behavior: url(a.htc)', 'background-image: url(&quot;javascript:alert(1)&quot;)']:
+            self.assertDropped('<p style="{}">a</p>'.format(style), 'style')
+        self.assertIn('style="color: red"', process('<p style="color: red">a</p>').html)
+
+
+class TagValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.category = Category.objects.create(name='python')
+
+    def get_data(self, tags):
+        return {'title': '标题', 'category': self.category.pk, 'author': self.user.pk, 'status': 0, 'tags': tags,
+                'content': '<p>正文</p>', 'summary': '摘要', 'view_times': 0, 'is_public': True,
+                'publish_time': '2018-01-01 00:00:00',
+                # 后台使用日期、时间分开的控件
+                'publish_time_0': '2018-01-01', 'publish_time_1': '00:00:00'}
+
+    def get_forms(self, tags):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        admin_form = site._registry[Article].get_form(request)
+        return [ArticleForm(data=self.get_data(tags)), admin_form(data=self.get_data(tags))]
+
+    def test_tag_too_long(self):
+        for form in self.get_forms('python, {}'.format('a' * 41)):
+            self.assertFalse(form.is_valid())
+            self.assertIn('tags', form.errors)
+
+    def test_tags(self):
+        for form in self.get_forms('python, {}'.format('a' * 40)):
+            self.assertTrue(form.is_valid(), form.errors)
+            article = form.save(commit=False)
+            article.author = self.user
+            article.save()
+        self.assertEqual(Tag.objects.get(name='a' * 40).article_count, 2)
+
+
+class ArticleFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        category = Category.objects.create(name='python')
+        cls.python = Article.objects.create(author=user, category=category, title='标题', tags='python',
+                                            content='<p>正文</p>')
+        cls.django = Article.objects.create(author=user, category=category, title='标题', tags='django, python',
+                                            content='<p>正文</p>')
+
+    def filter(self, **data):
+        return set(ArticleFilter(data, queryset=Article.objects.all()).qs)
+
+    def test_tag(self):
+        # 旧链接的?tags=、?tags__icontains=与?tag=结果相同
+        for name in ['tag', 'tags', 'tags__icontains']:
+            self.assertEqual(self.filter(**{name: 'python'}), {self.python, self.django}, name)
+            self.assertEqual(self.filter(**{name: 'django'}), {self.django}, name)
+            self.assertEqual(self.filter(**{name: 'java'}), set(), name)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, COUNTER_FLUSH_ON_REQUEST=False)
+class CounterSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.article = Article.objects.create(author=cls.user, category=Category.objects.create(name='python'),
+                                             title='标题', tags='python', content='<p>正文</p>')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_save_keeps_flushed_counts(self):
+        # 编辑时加载的文章在计数器写回后保存 不覆盖写回的浏览次数
+        article = Article.objects.get(pk=self.article.pk)
+        for i in range(3):
+            counters.incr(Article, 'view_times', article.pk)
+        for i in range(2):
+            counters.flush(Article, 'view_times')
+        article.title = '新标题'
+        article.save()
+        self.assertEqual(Article.objects.values_list('title', 'view_times').get(pk=article.pk), ('新标题', 3))
+
+    def test_update_forms(self):
+        data = {'title': '新标题', 'category': self.article.category_id, 'status': 0, 'tags': 'python',
+                'content': '<p>正文</p>', 'summary': '摘要', 'is_public': True, 'author': self.user.pk,
+                'publish_time': '2018-01-01 00:00:00', 'publish_time_0': '2018-01-01', 'publish_time_1': '00:00:00'}
+        # 后台表单中浏览次数为只读
+        request = RequestFactory().get('/')
+        request.user = self.user
+        admin_form = site._registry[Article].get_form(request, self.article)
+        self.assertNotIn('view_times', admin_form.base_fields)
+        article = Article.objects.get(pk=self.article.pk)
+        Article.objects.filter(pk=self.article.pk).update(view_times=5)
+        form = admin_form(data=data, instance=article)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.client.force_login(self.user)
+        self.client.post(reverse('article_update', args=(self.article.pk,)), dict(data, title='标题2'))
+        self.assertEqual(Article.objects.values_list('title', 'view_times').get(pk=self.article.pk), ('标题2', 5))
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class CategoryTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password')
+
+    def setUp(self):
+        self.a = Category.objects.create(name='A')
+        self.b = Category.objects.create(name='B', parent=self.a)
+        self.c = Category.objects.create(name='C', parent=self.b)
+        self.d = Category.objects.create(name='D')
+        self.create(self.c)
+        self.create(self.c)
+        self.create(self.c, status=1)
+        self.article = self.create(self.b)
+        self.create(self.b, is_public=False)
+
+    def create(self, category, **kwargs):
+        return Article.objects.create(author=self.user, category=category, title='标题', tags='python',
+                                      content='<p>正文</p>', **kwargs)
+
+    def assertTree(self, expected):
+        """
+        :param expected: {名称: (全名, 层级, 文章数)}
+        """
+        categories = {category.name: category for category in Category.objects.all()}
+        self.assertEqual({name: (category.full_name, category.depth, category.article_count)
+                          for name, category in categories.items()}, expected)
+        for category in categories.values():
+            parent = categories[category.parent.name].path if category.parent else ''
+            self.assertEqual(category.path, Category.make_path(parent, category.pk))
+
+    def test_counts(self):
+        self.assertTree({'A': ('A', 0, 3), 'B': ('A-->B', 1, 3), 'C': ('A-->B-->C', 2, 2), 'D': ('D', 0, 0)})
+        self.article.category = self.d
+        self.article.save()
+        self.assertTree({'A': ('A', 0, 2), 'B': ('A-->B', 1, 2), 'C': ('A-->B-->C', 2, 2), 'D': ('D', 0, 1)})
+        self.article.is_public = False
+        self.article.save()
+        self.assertEqual(Category.objects.get(pk=self.d.pk).article_count, 0)
+        Article.objects.filter(category=self.c, status=0).first().delete()
+        self.assertTree({'A': ('A', 0, 1), 'B': ('A-->B', 1, 1), 'C': ('A-->B-->C', 2, 1), 'D': ('D', 0, 0)})
+
+    def test_move_subtree(self):
+        self.b.parent = self.d
+        self.b.save()
+        self.assertTree({'A': ('A', 0, 0), 'B': ('D-->B', 1, 3), 'C': ('D-->B-->C', 2, 2), 'D': ('D', 0, 3)})
+        # 移动为根分类
+        self.c.refresh_from_db()
+        self.c.parent = None
+        self.c.save()
+        self.assertTree({'A': ('A', 0, 0), 'B': ('D-->B', 1, 1), 'C': ('C', 0, 2), 'D': ('D', 0, 1)})
+        # 改名后子分类的全名随之变化
+        self.d.refresh_from_db()
+        self.d.name = 'E'
+        self.d.save()
+        self.assertTree({'A': ('A', 0, 0), 'B': ('E-->B', 1, 1), 'C': ('C', 0, 2), 'E': ('E', 0, 1)})
+
+    def test_delete_parent(self):
+        # 删除分类后子分类成为根分类
+        self.a.delete()
+        self.assertTree({'B': ('B', 0, 3), 'C': ('B-->C', 1, 2), 'D': ('D', 0, 0)})
+
+    def test_parent_cycle(self):
+        self.a.parent = self.c
+        with self.assertRaises(ValidationError):
+            self.a.full_clean()
@@ -8,6 +8,7 @@ urlpatterns = [
     path('update/<int:pk>/', ArticleUpdateView.as_view(), name='article_update'),
     path('all/', AllView.as_view(), name='article_all'),
     path('comment/<int:pk>/', CommentControl.as_view(), name='article_comments'),
+    path('comment/<int:pk>/list/', CommentListView.as_view(), name='article_comment_list'),
 
     CategoryPopupCRUDViewSet.urls(),
 ]
@@ -1,41 +1,43 @@
 import ast
 import json
-import datetime
 
-from django.db.models import Count
-from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponse, Http404
-from django.template.loader import get_template
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.contrib.auth.context_processors import PermWrapper
 from django.views.generic import View, ListView, DetailView, CreateView, UpdateView
 
-from common.views import BaseMixin
+from common import counters
+from common.views import BaseMixin, PageCacheMixin
+from common.render import render_items, render_item
+from common.dedup import get_dedup
 from common.utils import get_ip
-from notification.models import Notification
 
 from .forms import *
 from .models import *
 from .filters import *
+from .pagination import paginate, InvalidCursor, DEFAULT_SORT
+from .comments import get_comments, get_tree as get_comment_tree, serialize as serialize_comment, \
+    InvalidCursor as InvalidCommentCursor
 
 # logger
 import logging
 
 logger = logging.getLogger("info")
 
-# 缓存
-try:
-    cache = caches['memcache']
-except ImportError as e:
-    cache = caches['default']
 
-
-class ArticleIndexView(BaseMixin, ListView):
+class ArticleIndexView(PageCacheMixin, BaseMixin, ListView):
     template_name = 'article/index.html'
     context_object_name = 'article_list'
     paginate_by = settings.PAGE_NUM
     search_fields = ('name',)
+    query_budget = 15
+
+    def get_page_cache_tags(self):
+        # 按分类筛选的页面只随该分类(含子分类)下的文章变化
+        category = self.request.GET.get('category', '')
+        if category.isdigit():
+            return ['category:{}'.format(category)]
+        return ['articles']
 
 
 # 新建博客
@@ -44,12 +46,11 @@ class ArticleCreateView(PermissionRequiredMixin, BaseMixin, CreateView):
     raise_exception = True
     form_class = ArticleForm
     template_name = 'article/create.html'
+    query_budget = 35
 
     def form_valid(self, form):
-        instance = form.save()
-        instance.author = self.request.user
-        instance.save()
-        self.success_url = reverse('article_detail', kwargs={'pk': instance.id})
+        # 保存一次后跳转至文章详情(get_absolute_url)
+        form.instance.author = self.request.user
         return super(ArticleCreateView, self).form_valid(form)
 
 
@@ -58,81 +59,122 @@ class ArticleUpdateView(PermissionRequiredMixin, BaseMixin, UpdateView):
     permission_required = ('article.change_article',)
     raise_exception = True
     form_class = ArticleForm
-    success_url = '/'
     template_name = 'article/update.html'
-
-    def form_valid(self, form):
-        instance = form.save()
-        self.success_url = reverse('article_detail', kwargs={'pk': instance.id})
-        return super(ArticleUpdateView, self).form_valid(form)
+    list_projection = False
+    query_budget = 35
 
 
 # 博客详情
-class ArticleDetailView(BaseMixin, DetailView):
+class ArticleDetailView(PageCacheMixin, BaseMixin, DetailView):
     template_name = 'article/detail.html'
     context_object_name = 'article'
+    list_projection = False
+    query_budget = 18
+
+    def count_view(self, article_id):
+        # 统计文章的访问访问次数 窗口期内同一ip只计一次
+        if not get_dedup().seen('article', article_id, get_ip(self.request)):
+            counters.incr(Article, 'view_times', article_id)
+
+    def page_cache_hit(self, request):
+        self.count_view(int(self.kwargs['pk']))
+
+    def get_page_cache_tags(self):
+        return ['article:{}'.format(self.object.pk)]
 
     def get(self, request, *args, **kwargs):
-        article = self.get_object()
-        # 统计文章的访问访问次数
-        ip = get_ip(request)
-        # 获取15*60s时间内访问过这篇文章的所有ip
-        visited_ips = cache.get(article.id, [])
-        # 如果ip不存在就把文章的浏览次数+1
-        if ip not in visited_ips:
-            article.view_times += 1
-            article.save()
-            # 更新缓存
-            visited_ips.append(ip)
-            cache.set(article.id, visited_ips, 15 * 60)
-        return super(ArticleDetailView, self).get(request, *args, **kwargs)
-
-
-class AllView(BaseMixin, ListView):
+        self.object = article = self.get_object()
+        self.count_view(article.id)
+        # 加上尚未写回数据库的浏览次数
+        article.view_times += counters.get_pending(Article, 'view_times', article.id)
+        context = self.get_context_data(object=article)
+        return self.render_to_response(context)
+
+    def get_context_data(self, **kwargs):
+        # 评论仅对登录用户显示 首页评论随页面输出 其余通过CommentListView加载
+        if self.request.user.is_authenticated:
+            page = get_comments(self.object, size=settings.COMMENT_PAGE_SIZE)
+            kwargs['comment_list'] = page.object_list
+            kwargs['comment_cursor'] = page.cursor
+        return super(ArticleDetailView, self).get_context_data(**kwargs)
+
+
+class AllView(PageCacheMixin, BaseMixin, ListView):
     template_name = 'article/all.html'
     context_object_name = 'article_list'
-    paginate_by = settings.PAGE_NUM
+    query_budget = 15
+
+    def get_page_cache_tags(self):
+        return ['articles']
 
     def get_context_data(self, **kwargs):
         kwargs['nav_index'] = 'all'
-        kwargs['category_list'] = Category.objects.all()
-        kwargs['PAGE_NUM'] = settings.PAGE_NUM
+        # 分类树 按路径排序 一次查询
+        kwargs['category_list'] = Category.objects.only('id', 'name', 'depth', 'article_count')
         return super(AllView, self).get_context_data(**kwargs)
 
     def get(self, request, *args, **kwargs):
-        self.object_list = self.get_queryset().order_by('-publish_time')
-        context = self.get_context_data()
+        page = paginate(self.get_queryset(), size=settings.PAGE_NUM)
+        self.object_list = page.object_list
+        context = self.get_context_data(cursor=page.cursor, is_end=page.is_end)
         return self.render_to_response(context)
 
     def post(self, request, *args, **kwargs):
         val = self.request.POST.get("val", "")
-        sort = self.request.POST.get("sort", "-publish_time")
-        start = int(self.request.POST.get("start", 0))
-        end = int(self.request.POST.get("end", settings.PAGE_NUM))
-
-        if val == 'all':
-            category_list = Category.objects.all()
-        else:
-            category_list = Category.objects.filter(name=val).all()
-        article_list = self.get_queryset().filter(category__in=category_list).annotate(
-            comment_count=Count('comment_article')).order_by(sort).all()[start:end + 1]
+        sort = self.request.POST.get("sort", DEFAULT_SORT)
+        cursor = self.request.POST.get("cursor", "")
+
+        article_list = self.get_queryset()
+        if val != 'all':
+            # 包含全部子分类
+            category = Category.objects.filter(pk=val).only('path').first() if val.isdigit() else None
+            if category is None:
+                return HttpResponse("分类不存在", status=400)
+            article_list = article_list.filter(category__path__startswith=category.path)
+        try:
+            page = paginate(article_list, sort, cursor, settings.PAGE_NUM)
+        except InvalidCursor as e:
+            return HttpResponse(str(e), status=400)
+
+        html = render_items('article/article_item.html', page.object_list, 'article', request=request)
+
+        _dict = {"html": html, "isend": page.is_end, "cursor": page.cursor}
+        return HttpResponse(
+            json.dumps(_dict),
+            content_type="application/json"
+        )
 
-        is_end = len(article_list) != (end - start + 1)
-        article_list = article_list[0:end - start]
 
-        html = ""
-        for article in article_list:
-            html += get_template('article/article_item.html').render({'article': article,
-                                                                      'perms': PermWrapper(request.user)})
+# 评论分页加载
+class CommentListView(BaseMixin, View):
+    query_budget = 8
 
-        _dict = {"html": html, "isend": is_end}
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponse("请登录！", status=403)
+        try:
+            article = self.get_queryset().get(id=self.kwargs.get('pk', ''))
+        except ObjectDoesNotExist:
+            raise Http404
+        try:
+            page = get_comments(article, request.GET.get('cursor', ''), settings.COMMENT_PAGE_SIZE)
+        except InvalidCommentCursor as e:
+            return HttpResponse(str(e), status=400)
+
+        _dict = {"cursor": page.cursor, "isend": page.is_end}
+        if request.GET.get('format') == 'json':
+            _dict['comments'] = [serialize_comment(comment) for comment in get_comment_tree(page.object_list)]
+        else:
+            _dict['html'] = render_items('article/comment_item.html', page.object_list, 'comment', request=request)
         return HttpResponse(
-            json.dumps(_dict),
+            json.dumps(_dict, ensure_ascii=False),
             content_type="application/json"
         )
 
 
 class CommentControl(BaseMixin, View):
+    query_budget = 10
+
     def post(self, request, *args, **kwargs):
         user = request.user
 
@@ -151,35 +193,14 @@ class CommentControl(BaseMixin, View):
                     parent_id = ast.literal_eval(parent_str)[1]
                     text = text[text.find(':') + 2:]
                     try:
-                        parent = Comment.objects.get(pk=parent_id)
-                        info = '{}回复了你在 {} 的评论'.format(user.username, parent.article.title)
-                        Notification.objects.create(title=info, text=text, from_user=user, to_user=parent.user,
-                                                    url='/article/{}/'.format(pk))
+                        # 回复通知由article.signals在事务提交后交给后台线程生成
+                        parent = Comment.objects.select_related('user').get(pk=parent_id)
                     except Comment.DoesNotExist:
                         return HttpResponse("请勿修改评论代码！", status=403)
 
                 comment = Comment.objects.create(user=user, article=article, text=text, parent=parent)
-
-                comment_code = "<p>评论：{}</p>".format(text)
-                if parent:
-                    comment_code = "<div class=\"comment-quote\">\
-                                         <p>\
-                                             <a>@{}</a>\
-                                             {}\
-                                         </p>\
-                                     </div>".format(parent.user.username, parent.text) + comment_code
                 # 返回当前评论
-                html = "<li>\
-                           <div class=\"comment-tx\">\
-                               <img src='{}' width=\"40\"></img>\
-                           </div>\
-                           <div class=\"comment-content\">\
-                               <a><h1>{}</h1></a>\
-                               {}\
-                               <p>{}</p>\
-                           </div>\
-                       </li>".format(comment.user.get_portrait(), comment.user.username, comment_code,
-                                     datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                html = render_item('article/comment_item.html', comment, 'comment', request=request)
                 return HttpResponse(html)
             else:
                 return HttpResponse("请输入评论内容！", status=403)
@@ -0,0 +1,284 @@
+"""
+端到端性能测试数据
+
+按固定的随机种子生成同样规模与分布的数据，全部使用bulk_create写入，
+计数、标签索引、归档等冗余字段最后由各应用的重建函数一次计算。
+时间以生成当天为基准，保证新闻页等按日期查询的页面有数据。
+
+默认规模(scale = 1)见SIZES，作者、分类、标签数固定，评论数按帕累托分布集中在少数文章上，
+每篇文章中每4条评论有1条为上一条评论的回复。
+"""
+import io
+import math
+import random
+import datetime
+from collections import OrderedDict
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+
+from article.models import Article, Category, Comment, Tag
+from banner.models import Banner
+from column.models import Column
+from link.models import Link
+from navbar.models import NavBar
+from news.models import News
+from news.utils import rebuild_archive
+from notification.models import Notification
+from notification.utils import rebuild_unread_count
+from user.models import User
+
+SIZES = OrderedDict([
+    ('users', 50000),
+    ('authors', 20),
+    ('categories', 60),
+    ('tags', 150),
+    ('articles', 100000),
+    ('comments', 1000000),
+    ('columns', 200),
+    ('news', 20000),
+    ('notifications', 200),
+])
+# 作者、分类、标签数不随规模变化
+FIXED = {'authors', 'categories', 'tags'}
+# 不同正文的数量 各文章从中选取 正文处理只需执行这些次
+BODIES = 200
+BATCH_SIZE = 10000
+PASSWORD = 'benchmark'
+ADMIN_USERNAME = 'admin'
+IMAGE_NAME = 'article/benchmark.jpg'
+MANIFEST_NAME = 'dataset.json'
+
+# 常用汉字 按字频选取
+CHARS = (
+    '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定'
+    '行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些'
+    '然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公'
+    '无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将'
+    '组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金'
+    '增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类'
+)
+WORDS = ['Python', 'Django', 'MySQL', 'Redis', 'Linux', 'Nginx', 'Docker', 'JavaScript', 'HTTP', 'SQL', 'Git', 'API',
+         'Flask', 'Vue', 'React', 'Go', 'Rust', 'Kafka', 'Celery', 'uWSGI']
+CODE = '<pre><code>def {0}(request):\n    articles = Article.public.filter(status=0)\n    return render(request, ' \
+       '"{0}.html", {{"articles": articles}})\n</code></pre>'
+
+
+def get_sizes(scale):
+    """
+    :param scale: 规模 1为默认规模
+    :return: {数据类型: 数量}
+    """
+    return OrderedDict((name, count if name in FIXED else max(1, int(round(count * scale))))
+                       for name, count in SIZES.items())
+
+
+class Generator(object):
+    def __init__(self, scale=1.0, seed=0, stdout=None):
+        self.sizes = get_sizes(scale)
+        self.scale = scale
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.stdout = stdout
+        self.now = datetime.datetime.combine(datetime.date.today(), datetime.time(12))
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    # 文本
+
+    def word(self, low, high):
+        return ''.join(self.random.choice(CHARS) for i in range(self.random.randint(low, high)))
+
+    def sentence(self):
+        text = self.word(8, 30)
+        if self.random.random() < 0.3:
+            # 中英文混排
+            position = self.random.randint(0, len(text))
+            text = '{} {} {}'.format(text[:position], self.random.choice(WORDS), text[position:])
+        return text + self.random.choice('，。。。！？')
+
+    def paragraph(self, low=3, high=6):
+        return ''.join(self.sentence() for i in range(self.random.randint(low, high)))
+
+    def body(self):
+        parts = []
+        for i in range(self.random.randint(2, 6)):
+            parts.append('<h2>{}</h2>'.format(self.word(4, 12)))
+            for j in range(self.random.randint(2, 5)):
+                parts.append('<p>{}</p>'.format(self.paragraph()))
+            if self.random.random() < 0.3:
+                parts.append(CODE.format(self.random.choice(WORDS).lower()))
+            if self.random.random() < 0.2:
+                parts.append('<p><img src="{}{}" alt="{}"></p>'.format(settings.MEDIA_URL, IMAGE_NAME, self.word(2, 6)))
+        return ''.join(parts)
+
+    # 数据
+
+    def generate(self):
+        """
+        :return: 数据说明 {规模, 随机种子, 基准日期, 各类数据的数量}
+        """
+        self.log('数据规模: {}'.format(', '.join('{} {}'.format(*item) for item in self.sizes.items())))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # 生成过程中不需要崩溃保护
+                cursor.execute('PRAGMA synchronous = OFF')
+        with transaction.atomic():
+            self.create_image()
+            self.create_site()
+            self.create_users()
+            self.create_categories()
+            self.create_articles()
+            self.create_tags()
+            self.create_comments()
+            self.create_columns()
+            self.create_news()
+            self.create_notifications()
+            self.log('重新计算计数...')
+            Category.update_counts()
+            Tag.update_counts()
+            Article.update_comment_times()
+            Column.update_stats()
+            rebuild_archive()
+            rebuild_unread_count()
+        return {'scale': self.scale, 'seed': self.seed, 'date': self.now.date().isoformat(), 'sizes': self.sizes}
+
+    def create_image(self):
+        # 缩略图、轮播图及正文共用一张图片
+        size = (1600, 900)
+        image = Image.merge('RGB', [Image.linear_gradient('L').resize(size), Image.radial_gradient('L').resize(size),
+                                    Image.linear_gradient('L').rotate(90).resize(size)])
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=85)
+        default_storage.delete(IMAGE_NAME)
+        default_storage.save(IMAGE_NAME, out)
+
+    def create_site(self):
+        NavBar.objects.bulk_create([NavBar(name=self.word(2, 4), url='/', order=i) for i in range(5)])
+        Link.objects.bulk_create([Link(name=self.word(2, 6), url='https://example.com/{}'.format(i))
+                                  for i in range(10)])
+
+    def create_users(self):
+        self.log('生成用户...')
+        password = make_password(PASSWORD)
+        count = self.sizes['users']
+        for offset in range(0, count, BATCH_SIZE):
+            User.objects.bulk_create([
+                User(username='user{}'.format(i), email='user{}@example.com'.format(i), password=password,
+                     email_active=True, date_joined=self.now - datetime.timedelta(minutes=i))
+                for i in range(offset, min(offset + BATCH_SIZE, count))])
+        self.admin = User.objects.create_superuser(ADMIN_USERNAME, 'admin@example.com', PASSWORD)
+        self.user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        self.author_ids = self.user_ids[:self.sizes['authors']]
+
+    def create_categories(self):
+        # 两级分类 每个一级分类下若干二级分类
+        count = self.sizes['categories']
+        roots = max(1, int(math.sqrt(count)))
+        categories = []
+        for i in range(count):
+            parent = categories[i % roots] if i >= roots else None
+            categories.append(Category.objects.create(name='{}{}'.format(self.word(2, 4), i), parent=parent))
+        self.category_ids = [category.id for category in categories[roots:]] or [categories[0].id]
+
+    def create_articles(self):
+        self.log('生成文章...')
+        self.tag_names = list(OrderedDict.fromkeys(
+            WORDS + [self.word(2, 4) for i in range(self.sizes['tags'])]))[:self.sizes['tags']]
+        bodies = []
+        for i in range(min(BODIES, self.sizes['articles'])):
+            content = self.body()
+            bodies.append(dict(Article(content=content, summary='').get_processed_fields(), content=content))
+        count = self.sizes['articles']
+        for offset in range(0, count, BATCH_SIZE):
+            articles = []
+            for i in range(offset, min(offset + BATCH_SIZE, count)):
+                tags = self.random.sample(self.tag_names, self.random.randint(1, min(4, len(self.tag_names))))
+                articles.append(Article(
+                    author_id=self.random.choice(self.author_ids),
+                    category_id=self.random.choice(self.category_ids),
+                    title=self.word(8, 24),
+                    tags=','.join(tags),
+                    thumbnail=IMAGE_NAME if self.random.random() < 0.3 else '',
+                    view_times=int(self.random.paretovariate(1.2) * 10),
+                    is_top=self.random.random() < 0.001,
+                    is_public=self.random.random() < 0.95,
+                    status=int(self.random.random() < 0.03),
+                    publish_time=self.now - datetime.timedelta(minutes=i * 5),
+                    **self.random.choice(bodies)))
+            Article.objects.bulk_create(articles)
+        self.article_ids = list(Article.objects.order_by('id').values_list('id', flat=True))
+        # 轮播图指向最新的几篇文章
+        Banner.objects.bulk_create([Banner(title=self.word(4, 10), summary=self.sentence(), img=IMAGE_NAME,
+                                           img_xs=IMAGE_NAME, article_id=article_id)
+                                    for article_id in self.article_ids[:3]])
+
+    def create_tags(self):
+        self.log('生成标签索引...')
+        Tag.objects.bulk_create([Tag(name=name) for name in self.tag_names])
+        tags = dict(Tag.objects.values_list('name', 'id'))
+        through = Article.tag_set.through
+        rows = []
+        for article_id, names in Article.objects.order_by('id').values_list('id', 'tags').iterator():
+            rows.extend(through(article_id=article_id, tag_id=tags[name]) for name in names.split(','))
+            if len(rows) >= BATCH_SIZE:
+                through.objects.bulk_create(rows)
+                rows = []
+        through.objects.bulk_create(rows)
+
+    def create_comments(self):
+        self.log('生成评论...')
+        weights = [self.random.paretovariate(1.5) for i in self.article_ids]
+        total = sum(weights)
+        # 指定id 回复指向同一篇文章的上一条评论
+        next_id = (Comment.objects.aggregate(id=Max('id'))['id'] or 0) + 1
+        texts = [self.paragraph(1, 3) for i in range(1000)]
+        comments = []
+        cumulative = assigned = 0
+        for index, article_id in enumerate(self.article_ids):
+            # 按累计权重取整 总数与设定一致
+            cumulative += weights[index]
+            count = int(round(cumulative / total * self.sizes['comments'])) - assigned
+            assigned += count
+            for j in range(count):
+                comments.append(Comment(id=next_id, user_id=self.random.choice(self.user_ids), article_id=article_id,
+                                        text=self.random.choice(texts), parent_id=next_id - 1 if j % 4 == 3 else None))
+                next_id += 1
+            if len(comments) >= BATCH_SIZE:
+                Comment.objects.bulk_create(comments)
+                comments = []
+        Comment.objects.bulk_create(comments)
+
+    def create_columns(self):
+        self.log('生成专栏...')
+        through = Column.article.through
+        for i in range(self.sizes['columns']):
+            column = Column.objects.create(name=self.word(4, 10), summary=self.paragraph(1, 2))
+            through.objects.bulk_create([
+                through(column_id=column.id, article_id=article_id)
+                for article_id in self.random.sample(self.article_ids, min(len(self.article_ids),
+                                                                           self.random.randint(10, 60)))])
+
+    def create_news(self):
+        self.log('生成新闻...')
+        count = self.sizes['news']
+        for offset in range(0, count, BATCH_SIZE):
+            News.objects.bulk_create([
+                News(title=self.word(8, 24), summary=self.paragraph(), source=self.random.choice(WORDS),
+                     url='https://example.com/news/{}'.format(i),
+                     publish_time=self.now - datetime.timedelta(seconds=self.random.randint(0, 365 * 86400)))
+                for i in range(offset, min(offset + BATCH_SIZE, count))])
+
+    def create_notifications(self):
+        Notification.objects.bulk_create([
+            Notification(title=self.word(4, 10), text=self.sentence(), url='/', type='comment_reply',
+                         from_user_id=self.random.choice(self.user_ids), to_user=self.admin,
+                         is_read=int(self.random.random() < 0.5))
+            for i in range(self.sizes['notifications'])])
@@ -0,0 +1,65 @@
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from common.dedup import ListDedup, KeyDedup, SlotDedup, BloomDedup
+
+
+def make_ip(i):
+    return '10.{}.{}.{}'.format(i >> 16 & 255, i >> 8 & 255, i & 255)
+
+
+def cache_bytes(cache):
+    # LocMemCache中保存的是pickle后的数据 统计键与值的总字节数
+    return sum(len(key) + len(value) for key, value in cache._cache.items())
+
+
+class Command(BaseCommand):
+    help = '对比各访客去重实现在不同访客数下的内存占用与单次耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000],
+                            help='单篇文章窗口期内的访客数')
+        parser.add_argument('--samples', type=int, default=200,
+                            help='每种情况测量耗时的请求次数')
+        parser.add_argument('--backends', nargs='+', default=['list', 'key', 'slot', 'bloom'],
+                            choices=['list', 'key', 'slot', 'bloom'])
+
+    def handle(self, *args, **options):
+        backends = {'list': ListDedup, 'key': KeyDedup, 'slot': SlotDedup, 'bloom': BloomDedup}
+        samples = options['samples']
+        self.stdout.write('{:<8}{:>10}{:>14}{:>14}{:>14}{:>10}'.format(
+            'backend', 'visitors', 'memory(KB)', 'new(us)', 'repeat(us)', 'fp rate'))
+        for size in options['sizes']:
+            for name in options['backends']:
+                cache = LocMemCache('benchmark-dedup-{}'.format(name),
+                                    {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': size * 2 + 1000}})
+                cache.clear()
+                dedup = backends[name](cache=cache, window=15 * 60)
+
+                if name == 'list':
+                    # 逐个写入为O(n^2) 直接构造与原实现相同的列表
+                    cache.set(dedup.make_key('article', 1), [make_ip(i) for i in range(size)], None)
+                else:
+                    for i in range(size):
+                        dedup.seen('article', 1, make_ip(i))
+                memory = cache_bytes(cache)
+
+                # 新访客
+                false_positive = 0
+                start = time.perf_counter()
+                for i in range(size, size + samples):
+                    if dedup.seen('article', 1, make_ip(i)):
+                        false_positive += 1
+                new_cost = (time.perf_counter() - start) / samples * 1e6
+
+                # 重复访客
+                start = time.perf_counter()
+                for i in range(samples):
+                    dedup.seen('article', 1, make_ip(i * size // samples))
+                repeat_cost = (time.perf_counter() - start) / samples * 1e6
+
+                self.stdout.write('{:<8}{:>10}{:>14.1f}{:>14.1f}{:>14.1f}{:>10.3f}'.format(
+                    name, size, memory / 1024, new_cost, repeat_cost, false_positive / samples))
+                cache.clear()
@@ -0,0 +1,67 @@
+import time
+import random
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from article.models import Article
+from article.pagination import SORTS, paginate, _encode
+
+
+class Command(BaseCommand):
+    help = '对比全部文章页 偏移分页与游标分页在不同翻页深度下的耗时 测试数据在结束后回滚'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=100000,
+                            help='生成的测试文章数')
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 1000],
+                            help='测量的页码')
+        parser.add_argument('--samples', type=int, default=20,
+                            help='每种情况测量的请求次数')
+        parser.add_argument('--sorts', nargs='+', default=list(SORTS), choices=list(SORTS))
+
+    def handle(self, *args, **options):
+        size = settings.PAGE_NUM
+        samples = options['samples']
+        with transaction.atomic():
+            self.generate(options['articles'])
+            articles = Article.public.filter(status=0)
+            self.stdout.write('{:<16}{:>8}{:>14}{:>14}'.format('sort', 'page', 'offset(ms)', 'keyset(ms)'))
+            for sort in options['sorts']:
+                for page in options['pages']:
+                    start = (page - 1) * size
+                    # 原实现 annotate评论数后按偏移切片
+                    offset_cost = self.measure(samples, lambda: list(
+                        articles.annotate(comment_count=Count('comment_article')).order_by(
+                            sort, '-id')[start:start + size + 1]))
+                    # 游标定位到上一页最后一篇 不计入耗时
+                    cursor = None
+                    if start:
+                        field = SORTS[sort]
+                        last = articles.order_by('-' + field, '-id')[start - 1]
+                        cursor = _encode(sort, last)
+                    keyset_cost = self.measure(samples, lambda: paginate(articles, sort, cursor, size))
+                    self.stdout.write('{:<16}{:>8}{:>14.2f}{:>14.2f}'.format(sort, page, offset_cost, keyset_cost))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def measure(samples, func):
+        start = time.perf_counter()
+        for i in range(samples):
+            func()
+        return (time.perf_counter() - start) / samples * 1000
+
+    def generate(self, count):
+        self.stdout.write('生成{}篇测试文章...'.format(count))
+        now = datetime.datetime.now()
+        random.seed(0)
+        for offset in range(0, count, 1000):
+            # 分批写入 batch_size由数据库后端决定
+            Article.objects.bulk_create([
+                Article(title='benchmark {}'.format(i), summary='summary', content='content',
+                        view_times=random.randint(0, 10000), comment_times=random.randint(0, 100),
+                        publish_time=now - datetime.timedelta(minutes=i))
+                for i in range(offset, min(offset + 1000, count))])
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.context_processors import PermWrapper
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from article.models import Article, Category
+from common.render import render_items
+
+
+def render_loop(articles, request):
+    # 原实现 每篇文章查找一次模板、构造一次PermWrapper 字符串逐个相加
+    html = ""
+    for article in articles:
+        html += get_template('article/article_item.html').render({'article': article,
+                                                                  'perms': PermWrapper(request.user)})
+    return html
+
+
+def render_batch(articles, request):
+    return render_items('article/article_item.html', articles, 'article', request=request)
+
+
+class Command(BaseCommand):
+    help = '对比逐个渲染与批量渲染文章列表片段的耗时 不访问数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10, 100],
+                            help='每次渲染的文章数')
+        parser.add_argument('--samples', type=int, default=50,
+                            help='每种情况测量的渲染次数')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().post('/article/all/')
+        request.user = AnonymousUser()
+        category = Category(id=1, name='benchmark')
+        samples = options['samples']
+        self.stdout.write('{:>8}{:>12}{:>12}{:>10}'.format('items', 'loop(ms)', 'batch(ms)', 'speedup'))
+        for count in options['items']:
+            articles = [Article(id=i + 1, category=category, title='benchmark {}'.format(i),
+                                tags='python,django', summary='summary ' * 20, publish_time=timezone.now())
+                        for i in range(count)]
+            # 两种方式输出一致
+            assert render_loop(articles, request) == render_batch(articles, request)
+            costs = []
+            for func in (render_loop, render_batch):
+                start = time.perf_counter()
+                for i in range(samples):
+                    func(articles, request)
+                costs.append((time.perf_counter() - start) / samples * 1000)
+            self.stdout.write('{:>8}{:>12.2f}{:>12.2f}{:>9.1f}x'.format(count, costs[0], costs[1], costs[0] / costs[1]))
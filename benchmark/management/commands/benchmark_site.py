@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import datetime
+import platform
+import tracemalloc
+from collections import OrderedDict
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from article.models import Article, Category, Tag
+from benchmark.dataset import ADMIN_USERNAME, IMAGE_NAME, MANIFEST_NAME, WORDS
+from column.models import Column
+from common import chrome, images
+from common.querybudget import record_queries
+from news.models import News
+from user.models import User
+
+
+def percentile(values, p):
+    """
+    :param values: 已排序的测量值
+    :param p: 百分位 0~100
+    :return: 最近秩法的百分位数
+    """
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    chrome.bump()
+
+
+class Endpoint(object):
+    """
+    :param name: 结果中的名称
+    :param paths: 路径列表 每次请求依次轮换
+    :param login: 请求的身份 None为匿名用户 'user'为普通用户 'admin'为管理员
+    :param method: 请求方式
+    :param data: 请求参数
+    :param follow_cursor: 使用上一次响应返回的游标 到最后一页后从头开始
+    """
+
+    def __init__(self, name, paths, login=None, method='get', data=None, follow_cursor=False):
+        self.name = name
+        self.paths = paths if isinstance(paths, list) else [paths]
+        self.login = login
+        self.method = method
+        self.data = data or {}
+        self.follow_cursor = follow_cursor
+        self.index = 0
+        self.cursor = ''
+
+    def request(self, client):
+        path = self.paths[self.index % len(self.paths)]
+        self.index += 1
+        data = dict(self.data, cursor=self.cursor) if self.follow_cursor else self.data
+        response = getattr(client, self.method)(path, data)
+        # 读取完整响应 文件响应在此时才读取文件
+        content = response.getvalue()
+        response.close()
+        if response.status_code != 200:
+            raise CommandError('{} {} 返回 {}'.format(self.name, path, response.status_code))
+        if self.follow_cursor:
+            result = json.loads(content.decode())
+            self.cursor = '' if result['isend'] else result['cursor']
+        return response
+
+
+class Command(BaseCommand):
+    help = '使用测试客户端请求各页面 统计耗时分位数、查询数与内存峰值 须使用--settings=benchmark.settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=50,
+                            help='每个页面测量的请求次数')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='每个页面测量前的预热请求次数')
+        parser.add_argument('--cold', action='store_true',
+                            help='每次请求前清空全部缓存 测量缓存全部失效时的耗时')
+        parser.add_argument('--endpoints', nargs='+',
+                            help='只测量指定的页面 默认全部')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='选取文章、新闻等的随机种子')
+        parser.add_argument('--output',
+                            help='结果文件 默认为BENCHMARK_ROOT/results-<时间>.json')
+        parser.add_argument('--baseline',
+                            help='与之对比的结果文件')
+        parser.add_argument('--max-regression', type=float,
+                            help='p95耗时较基线增加超过该百分比时失败 需同时指定--baseline')
+
+    def handle(self, *args, **options):
+        root = getattr(settings, 'BENCHMARK_ROOT', None)
+        if not root:
+            raise CommandError('请使用 --settings=benchmark.settings 运行')
+        manifest_path = os.path.join(root, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise CommandError('未找到测试数据 请先运行generate_dataset')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if options['max_regression'] is not None and not options['baseline']:
+            raise CommandError('--max-regression 需同时指定 --baseline')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline['meta']['dataset'] != manifest or baseline['meta']['cold'] != options['cold']:
+                self.stderr.write('基线的测试数据或缓存状态与本次不同 对比结果仅供参考')
+            baseline = baseline['endpoints']
+
+        endpoints = self.get_endpoints(manifest, random.Random(options['seed']))
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - set(endpoint.name for endpoint in endpoints)
+            if unknown:
+                raise CommandError('未知的页面: {}'.format(', '.join(sorted(unknown))))
+            endpoints = [endpoint for endpoint in endpoints if endpoint.name in options['endpoints']]
+
+        clients = {None: Client(), 'user': Client(), 'admin': Client()}
+        clients['user'].force_login(User.objects.filter(is_superuser=False).order_by('id').first())
+        clients['admin'].force_login(User.objects.get(username=ADMIN_USERNAME))
+        results = OrderedDict()
+        regressions = []
+        self.stdout.write('{:<20}{:>10}{:>10}{:>10}{:>9}{:>12}{:>10}'.format(
+            'endpoint', 'p50(ms)', 'p95(ms)', 'p99(ms)', 'queries', 'peak(KB)', 'vs base'))
+        for endpoint in endpoints:
+            result = self.measure(endpoint, clients[endpoint.login], options['samples'], options['warmup'],
+                                  options['cold'])
+            results[endpoint.name] = result
+            change = ''
+            if baseline and endpoint.name in baseline:
+                base = baseline[endpoint.name]['p95']
+                ratio = (result['p95'] - base) / base * 100 if base else 0
+                change = '{:+.1f}%'.format(ratio)
+                if options['max_regression'] is not None and ratio > options['max_regression']:
+                    regressions.append('{} p95 {:.2f}ms -> {:.2f}ms'.format(endpoint.name, base, result['p95']))
+            self.stdout.write('{:<20}{:>10.2f}{:>10.2f}{:>10.2f}{:>9}{:>12.1f}{:>10}'.format(
+                endpoint.name, result['p50'], result['p95'], result['p99'], result['queries'],
+                result['peak_memory'], change))
+
+        output = options['output'] or os.path.join(
+            root, 'results-{}.json'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+        with open(output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'dataset': manifest,
+                    'time': datetime.datetime.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'platform': sys.platform,
+                    'samples': options['samples'],
+                    'warmup': options['warmup'],
+                    'cold': options['cold'],
+                    'seed': options['seed'],
+                },
+                'endpoints': results,
+            }, f, indent=2)
+        self.stdout.write('结果已保存 {}'.format(output))
+        if regressions:
+            raise CommandError('p95耗时较基线增加超过{}%:\n{}'.format(options['max_regression'], '\n'.join(regressions)))
+
+    def measure(self, endpoint, client, samples, warmup, cold):
+        """
+        :return: {path, samples, p50, p95, p99, mean, queries, queries_max, peak_memory} 耗时单位为ms 内存单位为KB
+        """
+        for i in range(warmup):
+            if cold:
+                clear_caches()
+            endpoint.request(client)
+        times = []
+        queries = []
+        for i in range(samples):
+            if cold:
+                clear_caches()
+            with record_queries() as recorder:
+                start = time.perf_counter()
+                endpoint.request(client)
+                times.append((time.perf_counter() - start) * 1000)
+            queries.append(recorder.count)
+        # 内存单独测量 避免tracemalloc影响耗时
+        peak = 0
+        for i in range(min(samples, 3)):
+            if cold:
+                clear_caches()
+            tracemalloc.start()
+            try:
+                endpoint.request(client)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        times.sort()
+        queries.sort()
+        return OrderedDict([
+            ('path', endpoint.paths[0]),
+            ('samples', samples),
+            ('p50', percentile(times, 50)),
+            ('p95', percentile(times, 95)),
+            ('p99', percentile(times, 99)),
+            ('mean', sum(times) / samples),
+            ('queries', percentile(queries, 50)),
+            ('queries_max', queries[-1]),
+            ('peak_memory', peak / 1024.0),
+        ])
+
+    def get_endpoints(self, manifest, rand):
+        """
+        各页面及其参数 文章、新闻按随机种子选取 评论、专栏选取数据最多的一个
+        """
+        public = Article.public.filter(status=0)
+        articles = rand.sample(list(public.values_list('id', flat=True)), min(100, public.count()))
+        hot = public.order_by('-comment_times').first()
+        news = rand.sample(list(News.objects.values_list('id', flat=True)), min(100, News.objects.count()))
+        category = Category.objects.filter(parent__isnull=True).order_by('-article_count').first()
+        tag = Tag.objects.order_by('-article_count').first()
+        column = Column.objects.order_by('-article_count').first()
+        # 新闻时间以生成数据当天为基准
+        today = datetime.datetime.strptime(manifest['date'], '%Y-%m-%d').date()
+        return [
+            Endpoint('index', '/'),
+            Endpoint('article_index', '/article/'),
+            Endpoint('article_category', '/article/?category={}'.format(category.id)),
+            Endpoint('article_tag', '/article/?tag={}'.format(tag.name)),
+            Endpoint('article_detail', ['/article/{}/'.format(pk) for pk in articles]),
+            Endpoint('article_hot', '/article/{}/'.format(hot.id)),
+            Endpoint('comment_list', '/article/comment/{}/list/'.format(hot.id), login='user', follow_cursor=True),
+            Endpoint('article_all', '/article/all/'),
+            Endpoint('article_all_scroll', '/article/all/', method='post', data={'val': 'all', 'sort': '-publish_time'},
+                     follow_cursor=True),
+            Endpoint('article_all_views', '/article/all/', method='post', data={'val': 'all', 'sort': '-view_times'},
+                     follow_cursor=True),
+            Endpoint('column_index', '/column/'),
+            Endpoint('column_detail', '/column/{}/'.format(column.id)),
+            Endpoint('news_index', '/news/'),
+            Endpoint('news_archive', '/news/archive/'),
+            Endpoint('news_day', '/news/archive/{}/{}/{}/'.format(today.year, today.month, today.day)),
+            Endpoint('news_detail', ['/news/{}/'.format(pk) for pk in news]),
+            Endpoint('search', '/search/?search={}'.format(WORDS[0])),
+            Endpoint('version', '/version/'),
+            Endpoint('rss', '/rss/'),
+            Endpoint('feed_atom', '/feed/atom/'),
+            Endpoint('feed_json', '/feed/json/'),
+            Endpoint('feed_category', '/feed/rss/category/{}/'.format(category.id)),
+            Endpoint('feed_tag', '/feed/rss/tag/{}/'.format(tag.name)),
+            Endpoint('sitemap', '/sitemap.xml'),
+            Endpoint('sitemap_article', '/sitemap-article-1.xml'),
+            Endpoint('image', images.get_url(IMAGE_NAME, 640, 'webp')),
+            Endpoint('login', '/user/login/'),
+            Endpoint('register', '/user/register/'),
+            Endpoint('notification', '/user/notification/', login='admin'),
+            Endpoint('article_create', '/article/create/', login='admin'),
+            Endpoint('article_update', '/article/update/{}/'.format(articles[0]), login='admin'),
+            Endpoint('admin_articles', '/admin/article/article/', login='admin'),
+            Endpoint('admin_comments', '/admin/article/comment/', login='admin'),
+        ]
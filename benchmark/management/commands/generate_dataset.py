@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import shutil
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmark.dataset import Generator, MANIFEST_NAME
+
+
+class Command(BaseCommand):
+    help = '重新创建端到端性能测试数据库并生成测试数据 须使用--settings=benchmark.settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='数据规模 1为10万篇文章、100万条评论 本地调试可使用0.01')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='随机种子 相同的种子与规模生成相同的数据')
+        parser.add_argument('--search-index', action='store_true',
+                            help='同时建立全文搜索索引 全量规模下耗时较长')
+
+    def handle(self, *args, **options):
+        root = getattr(settings, 'BENCHMARK_ROOT', None)
+        if not root:
+            # 会删除数据库 只允许在测试配置下运行
+            raise CommandError('请使用 --settings=benchmark.settings 运行')
+        if options['scale'] <= 0:
+            raise CommandError('--scale 须大于0')
+        os.makedirs(root, exist_ok=True)
+        connection.close()
+        path = settings.DATABASES['default']['NAME']
+        if os.path.exists(path):
+            os.remove(path)
+        # 旧数据生成的站点地图、图片缓存
+        for directory in (settings.SITEMAP_ROOT, settings.IMAGE_CACHE_ROOT):
+            shutil.rmtree(directory, ignore_errors=True)
+        call_command('migrate', run_syncdb=True, verbosity=0)
+
+        start = time.perf_counter()
+        manifest = Generator(options['scale'], options['seed'], self.stdout).generate()
+        if options['search_index']:
+            self.stdout.write('建立搜索索引...')
+            call_command('rebuild_search_index', stdout=self.stdout)
+        manifest['search_index'] = options['search_index']
+        with open(os.path.join(root, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.stdout.write('测试数据已生成 {} 用时{:.1f}s'.format(path, time.perf_counter() - start))
@@ -0,0 +1,45 @@
+"""
+端到端性能测试配置
+
+使用SQLite与进程内缓存，不需要MySQL、memcache：
+    python manage.py generate_dataset --settings=benchmark.settings
+    python manage.py benchmark_site --settings=benchmark.settings
+测试数据库、上传文件、站点地图及测试结果保存在BENCHMARK_ROOT中。
+"""
+from Blog.settings import *
+
+# 性能测试命令只在本配置中注册
+INSTALLED_APPS = INSTALLED_APPS + ['benchmark']
+
+# 测试数据目录
+BENCHMARK_ROOT = os.environ.get('BENCHMARK_ROOT', os.path.join(BASE_DIR, 'benchmark', 'data'))
+
+# 按生产环境运行
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BENCHMARK_ROOT, 'db.sqlite3'),
+    }
+}
+# 直接按模型建表 不依赖各应用的迁移文件
+MIGRATION_MODULES = {app: None for app in [
+    'common', 'user', 'article', 'news', 'banner', 'navbar', 'column', 'link', 'notification', 'search', 'benchmark',
+]}
+
+CACHES['memcache'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark',
+}
+# constance不支持进程内缓存 直接读取数据库
+CONSTANCE_DATABASE_CACHE_BACKEND = None
+
+MEDIA_ROOT = os.path.join(BENCHMARK_ROOT, 'media')
+IMAGE_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'cache', 'images')
+SITEMAP_ROOT = os.path.join(BENCHMARK_ROOT, 'sitemap')
+
+# 查询数由benchmark_site自行统计
+QUERY_BUDGET_ENABLED = False
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
@@ -6,7 +6,7 @@ from .models import *
 
 class ColumnAdmin(SummernoteModelAdmin):
     search_fields = ('name',)
-    list_display = ('id', 'name', 'create_time')
+    list_display = ('id', 'name', 'article_count', 'update_time', 'create_time')
     list_filter = ('create_time',)
     fields = ('name', 'article', 'summary')
     filter_horizontal = ('article',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ColumnConfig(AppConfig):
     name = 'column'
     verbose_name = '专栏'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from column.models import Column
+
+
+class Command(BaseCommand):
+    help = '重新计算全部专栏的文章数及最近更新时间'
+
+    def handle(self, *args, **options):
+        count = Column.update_stats()
+        self.stdout.write('已更新{}个专栏'.format(count))
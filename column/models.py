@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
+from article.models import Article
+
 
 # 专栏
 class Column(models.Model):
@@ -12,6 +16,14 @@ class Column(models.Model):
     # 文章
     article = models.ManyToManyField('article.Article',
                                      verbose_name='文章')
+    # 公开文章数 由signal维护
+    article_count = models.IntegerField(default=0,
+                                        editable=False,
+                                        verbose_name='文章数')
+    # 最近一篇公开文章的发布时间 由signal维护
+    update_time = models.DateTimeField(null=True,
+                                       editable=False,
+                                       verbose_name='最近更新')
     # 创建时间
     create_time = models.DateTimeField(auto_now_add=True,
                                        verbose_name='创建时间')
@@ -20,8 +32,23 @@ class Column(models.Model):
         verbose_name_plural = verbose_name = '专栏'
         ordering = ['-create_time']
 
+    @classmethod
+    def update_stats(cls, columns=None):
+        """
+        重新计算专栏的公开文章数及最近更新时间 一条UPDATE完成
+        :param columns: 需要更新的专栏QuerySet 默认全部专栏
+        :return: 更新的专栏数
+        """
+        if columns is None:
+            columns = cls.objects.all()
+        articles = Article.public.filter(status=0, column=OuterRef('pk')).order_by().values('column')
+        count = articles.annotate(count=Count('pk')).values('count')
+        latest = articles.annotate(latest=Max('publish_time')).values('latest')
+        return columns.update(article_count=Coalesce(Subquery(count, output_field=models.IntegerField()), 0),
+                              update_time=Subquery(latest, output_field=models.DateTimeField()))
+
     def get_absolute_url(self):
-        return reverse('column_detail', args=(self.name,))
+        return reverse('column_detail', args=(self.pk,))
 
     def __str__(self):
         return self.name
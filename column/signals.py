@@ -0,0 +1,38 @@
+from django.dispatch import receiver
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
+
+from article.models import Article
+
+from .models import Column
+
+
+# 维护专栏文章数及最近更新时间
+@receiver(m2m_changed, sender=Column.article.through)
+def column_articles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # 由文章一侧修改 instance为文章 pk_set为专栏id
+        if action == 'pre_clear':
+            instance._column_ids = list(instance.column_set.values_list('id', flat=True))
+        elif action == 'post_clear':
+            Column.update_stats(Column.objects.filter(id__in=getattr(instance, '_column_ids', [])))
+        elif action in ('post_add', 'post_remove'):
+            Column.update_stats(Column.objects.filter(id__in=pk_set))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        Column.update_stats(Column.objects.filter(pk=instance.pk))
+
+
+# 文章的公开状态、发布时间变化或文章被删除时更新所在专栏
+@receiver(post_save, sender=Article)
+def article_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Column.update_stats(Column.objects.filter(article=instance))
+
+
+@receiver(pre_delete, sender=Article)
+def article_pre_delete(sender, instance, **kwargs):
+    instance._column_ids = list(instance.column_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    Column.update_stats(Column.objects.filter(id__in=getattr(instance, '_column_ids', [])))
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from article.models import Article, Category
+from user.models import User
+
+from .models import Column
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class ColumnStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.category = Category.objects.create(name='python')
+        cls.now = timezone.now().replace(microsecond=0)
+
+    def setUp(self):
+        self.column = Column.objects.create(name='专栏', summary='专栏')
+        self.other = Column.objects.create(name='其它专栏', summary='专栏')
+        self.old = self.create(days=2)
+        self.new = self.create(days=1)
+        self.private = self.create(days=0, is_public=False)
+        self.draft = self.create(days=0, status=1)
+
+    def create(self, days, **kwargs):
+        return Article.objects.create(author=self.user, category=self.category, title='标题', tags='python',
+                                      content='<p>正文</p>', publish_time=self.now - timedelta(days=days), **kwargs)
+
+    def assertStats(self, column, count, article=None):
+        column = Column.objects.get(pk=column.pk)
+        self.assertEqual((column.article_count, column.update_time),
+                         (count, article.publish_time if article else None))
+
+    def test_column_side(self):
+        self.column.article.add(self.old, self.new, self.private, self.draft)
+        self.assertStats(self.column, 2, self.new)
+        self.column.article.remove(self.new)
+        self.assertStats(self.column, 1, self.old)
+        self.column.article.set([self.new, self.private])
+        self.assertStats(self.column, 1, self.new)
+        self.column.article.clear()
+        self.assertStats(self.column, 0)
+        self.assertStats(self.other, 0)
+
+    def test_article_side(self):
+        self.new.column_set.add(self.column, self.other)
+        self.old.column_set.add(self.column)
+        self.assertStats(self.column, 2, self.new)
+        self.assertStats(self.other, 1, self.new)
+        self.new.column_set.remove(self.other)
+        self.assertStats(self.other, 0)
+        self.new.column_set.clear()
+        self.assertStats(self.column, 1, self.old)
+
+    def test_article_changed(self):
+        self.column.article.add(self.old, self.new)
+        self.new.is_public = False
+        self.new.save()
+        self.assertStats(self.column, 1, self.old)
+        self.old.publish_time = self.now
+        self.old.save()
+        self.assertStats(self.column, 1, self.old)
+        self.draft.status = 0
+        self.draft.save()
+        self.column.article.add(self.draft)
+        self.assertStats(self.column, 2, self.draft)
+        self.old.delete()
+        self.assertStats(self.column, 1, self.draft)
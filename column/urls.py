@@ -2,5 +2,6 @@ from django.conf.urls import url
 from .views import *
 
 urlpatterns = [
+    url(r'^$', ColumnIndexView.as_view(), name='column_index'),
     url(r'^(?P<pk>\d+)/$', ColumnView.as_view(), name='column_detail'),
 ]
@@ -1,47 +1,51 @@
-from django.db.models import Q
-from common.views import BaseContextMixin
+from common.views import ArticleSearchMixin, SidebarMixin, PageCacheMixin
 from django.views.generic import ListView
 from django.conf import settings
-from django.http import Http404
+from django.shortcuts import get_object_or_404
 
 from article.models import Article
 from article.filters import ArticleFilter
 from .models import *
 
 
-class ColumnView(BaseContextMixin, ListView):
-    queryset = Column.objects.all()
+# 专栏列表
+class ColumnIndexView(SidebarMixin, ListView):
+    template_name = 'column/index.html'
+    context_object_name = 'column_list'
+    paginate_by = settings.PAGE_NUM
+    query_budget = 15
+
+    def get_queryset(self):
+        # 文章数、最近更新时间由signal维护 不需要关联文章表
+        return Column.objects.order_by('-update_time', '-create_time')
+
+
+class ColumnView(PageCacheMixin, ArticleSearchMixin, SidebarMixin, ListView):
     template_name = 'column/column.html'
     paginate_by = settings.PAGE_NUM
+    query_budget = 15
 
-    def get_object(self):
-        pk = self.kwargs.get('pk', '')
-        try:
-            return Column.objects.get(pk=pk)
-        except Column.DoesNotExist:
-            raise Http404
+    def get_page_cache_tags(self):
+        return ['column:{}'.format(self.column.pk)]
 
-    def get_articles(self):
-        if self.request.user.has_perm('article.view_article'):
-            articles = Article.objects.all()
-        else:
-            articles = Article.public.filter(status=0).all()
-        if 'search' in self.request.GET:
-            search = self.request.GET.get('search')
-            articles = articles.filter(
-                Q(title__icontains=search) |
-                Q(summary__icontains=search) |
-                Q(tags__icontains=search)
-            )
-        f = ArticleFilter(self.request.GET, queryset=articles)
-        return f.qs.order_by('-is_top', '-publish_time')
+    def get(self, request, *args, **kwargs):
+        self.column = self.get_object()
+        return super(ColumnView, self).get(request, *args, **kwargs)
+
+    def get_object(self):
+        return get_object_or_404(Column, pk=self.kwargs.get('pk', ''))
 
     def get_context_data(self, **kwargs):
-        kwargs['column'] = self.get_object()
+        kwargs['column'] = self.column
         return super(ColumnView, self).get_context_data(**kwargs)
 
     def get_queryset(self):
-        articles = self.get_articles()
-        article_list = self.get_object().article.filter(id__in=[x.id for x in articles]).all()
-        return article_list
-
+        if self.request.user.has_perm('article.view_article'):
+            articles = Article.objects.all()
+        else:
+            articles = Article.public.filter(status=0).all()
+        # 与专栏-文章关联表连接 一条查询完成
+        articles = ArticleFilter(self.request.GET, queryset=articles.filter(column=self.column).for_list()).qs
+        if self.request.GET.get('search', '').strip():
+            return self.search_articles(articles)
+        return articles.order_by('-is_top', '-publish_time')
@@ -0,0 +1,117 @@
+"""
+站点框架数据快照 网站标题/SEO设置、导航条、友情链接、轮播图
+
+这些数据极少变化，每个进程内保存一份不可变快照，仅通过缓存中的版本号判断是否过期。
+后台保存/删除相关对象或修改constance设置时由common.signals在事务提交后调用bump()更新版本号，
+各进程在下一次请求时重新加载。SITE_CHROME_CHECK_INTERVAL秒内不重复读取版本号。
+"""
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+
+from common.utils import get_cache, get_values
+
+from banner.models import Banner
+from navbar.models import NavBar
+from link.models import Link
+
+cache = get_cache()
+
+VERSION_KEY = 'site_chrome:version'
+# 网站设置按版本号缓存在一个键中 版本号更新后各进程只需读取一次数据库
+CONFIG_KEY = 'site_chrome:config:{}'
+CONFIG_TIMEOUT = 24 * 60 * 60
+LINK_COLORS = ['primary', 'success', 'info', 'warning', 'danger']
+
+SiteChrome = namedtuple('SiteChrome', [
+    'version',
+    'website_title',
+    'website_welcome',
+    'website_seo_keyword',
+    'website_seo_description',
+    'nav_list',
+    'links',
+    'banner_list',
+])
+
+_snapshot = None
+_checked_at = 0
+
+
+def bump():
+    """
+    更新版本号 使各进程的快照失效
+    :return: 新版本号
+    """
+    global _checked_at
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, None)
+    # 本进程立即重新检查
+    _checked_at = 0
+    return version
+
+
+def get_version():
+    """
+    :return: 当前版本号 缓存中不存在时生成新版本号
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def get_config(version):
+    """
+    :param version: 版本号
+    :return: 网站标题、SEO设置 {键名: 值}
+    """
+    key = CONFIG_KEY.format(version)
+    values = cache.get(key)
+    if values is None:
+        values = get_values(settings.WEBSITE_TITLE, settings.WEBSITE_WELCOME, settings.WEBSITE_SEO_KEYWORD,
+                            settings.WEBSITE_SEO_DESCRIPTION)
+        cache.set(key, values, CONFIG_TIMEOUT)
+    return values
+
+
+def load(version):
+    """
+    从数据库加载快照
+    :param version: 版本号
+    :return: SiteChrome
+    """
+    links = tuple(Link.objects.order_by('create_time'))
+    for index, link in enumerate(links):
+        link.color = LINK_COLORS[index % len(LINK_COLORS)]
+    values = get_config(version)
+    return SiteChrome(
+        version=version,
+        website_title=values[settings.WEBSITE_TITLE],
+        website_welcome=values[settings.WEBSITE_WELCOME],
+        website_seo_keyword=values[settings.WEBSITE_SEO_KEYWORD],
+        website_seo_description=values[settings.WEBSITE_SEO_DESCRIPTION],
+        nav_list=tuple(NavBar.objects.all()),
+        links=links,
+        banner_list=tuple(Banner.objects.select_related('article').only(
+            'id', 'title', 'summary', 'img', 'img_xs', 'article__id')),
+    )
+
+
+def get_site_chrome():
+    """
+    :return: 当前进程中的快照 版本号变化时重新加载
+    """
+    global _snapshot, _checked_at
+    now = time.time()
+    if _snapshot is not None and now - _checked_at < settings.SITE_CHROME_CHECK_INTERVAL:
+        return _snapshot
+    version = get_version()
+    if _snapshot is None or _snapshot.version != version:
+        _snapshot = load(version)
+    _checked_at = now
+    return _snapshot
@@ -0,0 +1,153 @@
+"""
+计数器写缓冲
+
+查看次数、点赞次数、下载次数等计数不再逐次 save() 整行，而是先在缓存中累加，
+再由 flush 定期以一条 UPDATE ... SET field = field + CASE ... 批量写回数据库。
+使用 update() 写回，不会触发 auto_now 修改 update_time。
+
+缓存按"代"存放增量：每次 flush 将当前代号加一，并写回两代之前的数据，
+保证写回时该代已停止写入至少一个刷新周期，避免与并发的累加互相覆盖。
+"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Case, When, Value, F, IntegerField
+
+from common.utils import get_cache
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+cache = get_cache()
+
+# 单条UPDATE中最多包含的对象数
+BATCH_SIZE = 500
+
+
+def get_counter_fields():
+    """
+    :return: [(model, field), ...] settings.COUNTER_FIELDS中登记的全部计数字段
+    """
+    fields = []
+    for label, names in getattr(settings, 'COUNTER_FIELDS', {}).items():
+        model = apps.get_model(label)
+        for name in names:
+            fields.append((model, name))
+    return fields
+
+
+def _prefix(model, field):
+    return 'counter:{}:{}'.format(model._meta.label_lower, field)
+
+
+def _check(model, field):
+    names = getattr(settings, 'COUNTER_FIELDS', {}).get(model._meta.label, ())
+    if field not in names:
+        raise ValueError('{}.{} 未在 COUNTER_FIELDS 中登记'.format(model._meta.label, field))
+
+
+def _generation(prefix):
+    return cache.get('{}:gen'.format(prefix), 0)
+
+
+def incr(model, field, pk, delta=1):
+    """
+    计数加delta 仅写入缓存
+    :param model: 模型类
+    :param field: 计数字段名
+    :param pk: 对象主键
+    :param delta: 增量
+    :return: 无返回
+    """
+    _check(model, field)
+    prefix = _prefix(model, field)
+    generation = _generation(prefix)
+    key = '{}:{}:{}'.format(prefix, generation, pk)
+    try:
+        if cache.add(key, delta, None):
+            # 本代中首次计数 登记到本代的待写回列表
+            size_key = '{}:{}:size'.format(prefix, generation)
+            cache.add(size_key, 0, None)
+            slot = cache.incr(size_key)
+            cache.set('{}:{}:slot:{}'.format(prefix, generation, slot), pk, None)
+        else:
+            cache.incr(key, delta)
+    except ValueError:
+        # 缓存不可用 直接写库
+        logger.error(u'[counters]缓存不可用 {} 直接写入数据库'.format(key))
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+    if getattr(settings, 'COUNTER_FLUSH_ON_REQUEST', True):
+        flush_all()
+
+
+def get_pending(model, field, pk):
+    """
+    获取尚未写回数据库的增量 用于页面显示
+    :param model: 模型类
+    :param field: 计数字段名
+    :param pk: 对象主键
+    :return: 未写回的增量
+    """
+    prefix = _prefix(model, field)
+    generation = _generation(prefix)
+    keys = ['{}:{}:{}'.format(prefix, g, pk) for g in (generation, generation - 1)]
+    return sum(cache.get_many(keys).values())
+
+
+def _flush_generation(model, field, prefix, generation):
+    size_key = '{}:{}:size'.format(prefix, generation)
+    size = cache.get(size_key)
+    if not size:
+        return 0
+    slot_keys = ['{}:{}:slot:{}'.format(prefix, generation, i) for i in range(1, size + 1)]
+    count_keys = {'{}:{}:{}'.format(prefix, generation, pk): pk for pk in cache.get_many(slot_keys).values()}
+    deltas = {count_keys[key]: value for key, value in cache.get_many(list(count_keys)).items() if value}
+
+    pks = list(deltas)
+    for i in range(0, len(pks), BATCH_SIZE):
+        batch = pks[i:i + BATCH_SIZE]
+        increment = Case(*[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                         default=Value(0),
+                         output_field=IntegerField())
+        model.objects.filter(pk__in=batch).update(**{field: F(field) + increment})
+
+    cache.delete_many(slot_keys + list(count_keys) + [size_key])
+    return sum(deltas.values())
+
+
+def flush(model, field):
+    """
+    切换到新的一代 并将两代之前的增量批量写回数据库
+    :param model: 模型类
+    :param field: 计数字段名
+    :return: 写回的增量总和
+    """
+    prefix = _prefix(model, field)
+    lock_key = '{}:lock'.format(prefix)
+    if not cache.add(lock_key, 1, 60):
+        return 0
+    try:
+        gen_key = '{}:gen'.format(prefix)
+        cache.add(gen_key, 0, None)
+        generation = cache.incr(gen_key)
+        return _flush_generation(model, field, prefix, generation - 2)
+    finally:
+        cache.delete(lock_key)
+
+
+def flush_all(force=False):
+    """
+    写回全部计数字段 未到COUNTER_FLUSH_INTERVAL时直接返回
+    :param force: 忽略刷新间隔
+    :return: {'app.Model.field': 写回的增量总和}
+    """
+    interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 60)
+    if not force and not cache.add('counter:flushed', time.time(), interval):
+        return {}
+    result = {}
+    for model, field in get_counter_fields():
+        result['{}.{}'.format(model._meta.label, field)] = flush(model, field)
+    return result
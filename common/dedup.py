@@ -0,0 +1,169 @@
+"""
+访客去重
+
+判断同一访客在窗口期(settings.VISITOR_DEDUP_WINDOW)内是否已访问过某对象，
+用于文章浏览次数统计。具体实现由 settings.VISITOR_DEDUP_BACKEND 指定，
+缓存键统一为 dedup:<namespace>:<key>[:...]，不再与其它缓存项冲突。
+"""
+import math
+import time
+import hashlib
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from common.utils import get_cache
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+
+class BaseDedup(object):
+    def __init__(self, cache=None, window=None):
+        self.cache = cache or get_cache()
+        self.window = window or settings.VISITOR_DEDUP_WINDOW
+
+    @staticmethod
+    def make_key(namespace, key, *parts):
+        return ':'.join(['dedup', namespace, str(key)] + [str(part) for part in parts])
+
+    def seen(self, namespace, key, member):
+        """
+        判断member在窗口期内是否访问过 未访问过则记录本次访问
+        :param namespace: 命名空间 如article
+        :param key: 对象标识 如文章id
+        :param member: 访客标识 如ip
+        :return: True 窗口期内已访问过
+        """
+        raise NotImplementedError
+
+
+class ListDedup(BaseDedup):
+    """
+    列表保存窗口期内全部访客 每次查找O(n) 内存随访客数增长
+    为原有实现 仅保留用于对比测试
+    """
+
+    def seen(self, namespace, key, member):
+        cache_key = self.make_key(namespace, key)
+        members = self.cache.get(cache_key, [])
+        if member in members:
+            return True
+        members.append(member)
+        self.cache.set(cache_key, members, self.window)
+        return False
+
+
+class KeyDedup(BaseDedup):
+    """
+    每个访客一个缓存键 使用add原子判断 结果精确
+    内存随访客数增长 由缓存自身的淘汰策略限制
+    """
+
+    def seen(self, namespace, key, member):
+        digest = hashlib.md5(member.encode()).hexdigest()
+        cache_key = self.make_key(namespace, key, digest)
+        if self.cache.add(cache_key, 1, self.window):
+            return False
+        if self.cache.get(cache_key) is None:
+            # add失败且键不存在 缓存不可用 按新访客计数
+            logger.error(u'[dedup]缓存不可用 {}'.format(cache_key))
+            return False
+        return True
+
+
+class SlotDedup(BaseDedup):
+    """
+    分时段的定长哈希表 每个对象每段最多capacity*2个缓存键 内存固定 多进程下结果精确
+    窗口期被分为slices-1段 每段一张表 访客指纹按线性探测使用add原子写入当前段的空位
+    查询时一次取出全部存活的段中该访客可能所在的位置
+    同一访客并发写入时只有一个add成功 其余读到相同的指纹
+    探测probes个位置均被占用(访客数远超capacity)时视为已访问 表现为少计浏览次数
+    """
+
+    def __init__(self, cache=None, window=None, capacity=None, slices=2, probes=16):
+        super(SlotDedup, self).__init__(cache, window)
+        self.size = (capacity or settings.VISITOR_DEDUP_CAPACITY) * 2
+        self.slices = max(2, slices)
+        self.probes = probes
+        self.span = self.window / (self.slices - 1)
+
+    def seen(self, namespace, key, member):
+        digest = hashlib.sha1(member.encode()).digest()
+        fingerprint = digest[:8].hex()
+        start = int.from_bytes(digest[8:16], 'big')
+        positions = [(start + i) % self.size for i in range(self.probes)]
+        current = int(time.time() // self.span)
+        keys = [self.make_key(namespace, key, current - i, p) for i in range(self.slices) for p in positions]
+        values = self.cache.get_many(keys)
+        if fingerprint in values.values():
+            return True
+        timeout = int(self.span * self.slices) + 1
+        for slot_key in keys[:self.probes]:
+            if slot_key in values:
+                continue
+            if self.cache.add(slot_key, fingerprint, timeout):
+                return False
+            value = self.cache.get(slot_key)
+            if value == fingerprint:
+                return True
+            if value is None:
+                logger.error(u'[dedup]缓存不可用 {}'.format(slot_key))
+                return False
+        return True
+
+
+class BloomDedup(BaseDedup):
+    """
+    轮转布隆过滤器 每个对象占用固定内存
+    窗口期被分为slices-1段 每段一个过滤器 查询时检查全部存活的过滤器 仅写入当前段
+    访客数超过capacity后误判率上升 表现为少计浏览次数
+    每个新访客读出并写回整个位数组(约capacity*1.8字节) 多进程同时写入时后写入的覆盖先写入的，
+    被覆盖的访客会再次计数 因此只适合单进程部署 多进程请使用SlotDedup或KeyDedup
+    """
+
+    def __init__(self, cache=None, window=None, capacity=None, error_rate=None, slices=2):
+        super(BloomDedup, self).__init__(cache, window)
+        capacity = capacity or settings.VISITOR_DEDUP_CAPACITY
+        error_rate = error_rate or settings.VISITOR_DEDUP_ERROR_RATE
+        # 位数组长度 m = -n*ln(p)/ln(2)^2 哈希函数个数 k = m/n*ln(2)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.slices = max(2, slices)
+        self.span = self.window / (self.slices - 1)
+
+    def positions(self, member):
+        # 双重哈希 由一次sha1得到k个位置
+        digest = hashlib.sha1(member.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def seen(self, namespace, key, member):
+        current = int(time.time() // self.span)
+        keys = [self.make_key(namespace, key, current - i) for i in range(self.slices)]
+        filters = self.cache.get_many(keys)
+        positions = self.positions(member)
+        for bits in filters.values():
+            if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+                return True
+        bits = bytearray(filters.get(keys[0]) or bytes((self.size + 7) // 8))
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self.cache.set(keys[0], bytes(bits), int(self.span * self.slices) + 1)
+        return False
+
+
+_dedup = None
+
+
+def get_dedup():
+    """
+    :return: settings.VISITOR_DEDUP_BACKEND 指定的去重实例
+    """
+    global _dedup
+    if _dedup is None:
+        _dedup = import_string(settings.VISITOR_DEDUP_BACKEND)()
+    return _dedup
@@ -1,26 +1,116 @@
+"""
+订阅 RSS / Atom / JSON Feed，支持按分类(含子分类)、按标签订阅
+
+生成的内容按 协议+域名+格式+分类/标签 缓存(内容中的链接为绝对地址)，
+文章、分类或网站标题等变化的事务提交后由common.signals调用bump()更新版本号使全部缓存失效。
+响应带有ETag及Last-Modified(最新文章的更新时间)，缓存命中时条件请求直接返回304，不访问数据库。
+"""
+import json
+import time
+import uuid
+import hashlib
+from collections import namedtuple
+
 from django.conf import settings
-from django.urls import reverse_lazy
-from django.utils.feedgenerator import Rss201rev2Feed
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from django.utils.feedgenerator import Rss201rev2Feed, Atom1Feed, SyndicationFeed
 from django.contrib.syndication.views import Feed
 
-from common.utils import get_value
+from common.chrome import get_site_chrome
+from common.querybudget import query_budget
+from common.utils import get_cache
+
+from article.models import Article, Category, Tag
+
+cache = get_cache()
+
+VERSION_KEY = 'feed:version'
+
+FeedFilter = namedtuple('FeedFilter', ['category', 'tag'])
+
 
-from article.models import Article
+class JsonFeed(SyndicationFeed):
+    """
+    JSON Feed 1.0 https://jsonfeed.org/version/1
+    """
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def write(self, outfile, encoding):
+        items = []
+        for item in self.items:
+            data = {
+                'id': item['unique_id'] or item['link'],
+                'url': item['link'],
+                'title': item['title'],
+                'content_html': item['description'],
+                'tags': list(item['categories']),
+            }
+            if item['pubdate']:
+                data['date_published'] = item['pubdate'].isoformat()
+            if item['updateddate']:
+                data['date_modified'] = item['updateddate'].isoformat()
+            if item['author_name']:
+                data['author'] = {'name': item['author_name']}
+            items.append(data)
+        outfile.write(json.dumps({
+            'version': 'https://jsonfeed.org/version/1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': self.feed['description'],
+            'items': items,
+        }, ensure_ascii=False))
 
 
 class BlogFeed(Feed):
     feed_type = Rss201rev2Feed
-    link = reverse_lazy('index')
-    feed_url = reverse_lazy('rss')
+    format = 'rss'
+
+    def get_object(self, request, category=None, tag=None):
+        # 分类或标签不存在时抛出ObjectDoesNotExist 返回404
+        return FeedFilter(Category.objects.get(pk=category) if category else None,
+                          Tag.objects.get(name=tag) if tag else None)
 
-    def title(self):
-        return get_value(settings.WEBSITE_TITLE)
+    def title(self, obj):
+        title = get_site_chrome().website_title
+        if obj.category:
+            return '{} - {}'.format(title, obj.category.name)
+        if obj.tag:
+            return '{} - {}'.format(title, obj.tag.name)
+        return title
 
     def description(self):
-        return get_value(settings.WEBSITE_SEO_DESCRIPTION)
+        return get_site_chrome().website_seo_description
+
+    def link(self, obj):
+        if obj.category:
+            return '{}?{}'.format(reverse('article_index'), urlencode({'category': obj.category.pk}))
+        if obj.tag:
+            return '{}?{}'.format(reverse('article_index'), urlencode({'tag': obj.tag.name}))
+        return reverse('index')
 
-    def items(self):
-        return Article.objects.order_by('-pk')[:10]
+    def feed_url(self, obj):
+        if obj.category:
+            return reverse('feed_category', kwargs={'format': self.format, 'category': obj.category.pk})
+        if obj.tag:
+            return reverse('feed_tag', kwargs={'format': self.format, 'tag': obj.tag.name})
+        return reverse('feed', kwargs={'format': self.format})
+
+    def items(self, obj):
+        articles = Article.public.filter(status=0)
+        if obj.category:
+            articles = articles.filter(category__path__startswith=obj.category.path)
+        if obj.tag:
+            articles = articles.filter(tag_set=obj.tag)
+        articles = list(articles.select_related('author').only(
+            'id', 'title', 'summary', 'tags', 'publish_time', 'update_time', 'author__username'
+        ).order_by('-publish_time')[:settings.FEED_SIZE])
+        # 最新的更新时间 作为Last-Modified
+        self.last_modified = max((article.update_time for article in articles), default=None)
+        return articles
 
     def item_title(self, item):
         return item.title
@@ -29,9 +119,88 @@ class BlogFeed(Feed):
         return item.summary
 
     def item_link(self, item):
-        return reverse_lazy('article_detail', kwargs={'pk': item.id})
+        return reverse('article_detail', kwargs={'pk': item.id})
+
+    def item_pubdate(self, item):
+        return item.publish_time
+
+    def item_updateddate(self, item):
+        return item.update_time
+
+    def item_categories(self, item):
+        return item.get_tags()
+
+    def item_author_name(self, item):
+        return item.author.username if item.author else None
 
     def feed_copyright(self):
-        return "Copyright &copy; 2015-2017 " + get_value(settings.WEBSITE_TITLE)
+        return "Copyright &copy; 2015-2017 " + get_site_chrome().website_title
+
+
+class AtomBlogFeed(BlogFeed):
+    feed_type = Atom1Feed
+    format = 'atom'
+    subtitle = BlogFeed.description
+
+
+class JsonBlogFeed(BlogFeed):
+    feed_type = JsonFeed
+    format = 'json'
+
+
+FEEDS = {
+    'rss': BlogFeed,
+    'atom': AtomBlogFeed,
+    'json': JsonBlogFeed,
+}
+
+
+def bump():
+    """
+    更新版本号 使全部订阅缓存失效
+    :return: 新版本号
+    """
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def _build(request, format, category, tag):
+    feed = FEEDS[format]()
+    response = feed(request, category=category, tag=tag)
+    # 没有文章时使用当前时间
+    latest = getattr(feed, 'last_modified', None)
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'last_modified': int(time.mktime(latest.timetuple())) if latest else int(time.time()),
+        'etag': '"{}"'.format(hashlib.md5(response.content).hexdigest()),
+    }
+
 
+@query_budget(8)
+def feed_view(request, format='rss', category=None, tag=None):
+    """
+    订阅 按版本号缓存生成的内容 支持条件请求
+    :param request: request
+    :param format: rss / atom / json
+    :param category: 分类id
+    :param tag: 标签名
+    :return: response
+    """
+    version = cache.get(VERSION_KEY) or bump()
+    # 链接中的协议与域名取自请求
+    site = hashlib.md5('{}://{}'.format(request.scheme, request.get_host()).encode()).hexdigest()
+    key = 'feed:{}:{}:{}:{}:{}'.format(version, site, format, category or '',
+                                       hashlib.md5(tag.encode()).hexdigest() if tag else '')
+    entry = cache.get(key)
+    if entry is None:
+        entry = _build(request, format, category, tag)
+        cache.set(key, entry, settings.FEED_CACHE_TIMEOUT)
 
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
@@ -0,0 +1,216 @@
+"""
+响应式图片
+
+IMAGE_SOURCE_DIRS 中的文章缩略图、轮播图、summernote上传的图片及头像按 IMAGE_WIDTHS 中的宽度生成缩小版本，
+格式为 webp 或与原图相同(orig)，首次请求 /image/<宽度>/<格式>/<原图内容的hash>/<文件名> 时生成，
+保存在 IMAGE_CACHE_ROOT/<文件名的sha1>/<原图内容的hash>/<宽度>.<扩展名>，之后直接读取文件。
+原图内容变化时链接随之变化，浏览器可长期缓存；旧链接重定向到新链接，旧的缩小版本在生成新版本时删除。
+原图被django_cleanup删除时由common.signals删除整个目录。原图宽度小于目标宽度时不放大。
+
+模板中使用 {% load images %} {% srcset article.thumbnail 'webp' %} 输出srcset，
+正文中的图片在保存时由article.content添加srcset。
+也可使用 python manage.py build_images 在进程池中预先生成。
+"""
+import io
+import os
+import shutil
+import hashlib
+import posixpath
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from common.utils import write_file_atomic, get_cache
+
+cache = get_cache()
+
+# 可生成缩小版本的原图格式
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+FORMATS = ('webp', 'orig')
+CONTENT_TYPES = {
+    '.webp': 'image/webp',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+}
+PIL_FORMATS = {
+    '.webp': 'WEBP',
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+}
+
+
+class ImageError(ValueError):
+    pass
+
+
+def _target_ext(name, fmt):
+    if fmt == 'webp':
+        return '.webp'
+    ext = os.path.splitext(name)[1].lower()
+    # gif、bmp等缩小后保存为png
+    return ext if ext in PIL_FORMATS else '.png'
+
+
+def get_cache_dir(name):
+    """
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :return: 该图片缩小版本所在的目录
+    """
+    return os.path.join(settings.IMAGE_CACHE_ROOT, hashlib.sha1(name.encode()).hexdigest())
+
+
+def get_target_path(name, digest, width, fmt):
+    return os.path.join(get_cache_dir(name), digest, '{}{}'.format(width, _target_ext(name, fmt)))
+
+
+def get_content_type(path):
+    return CONTENT_TYPES[os.path.splitext(path)[1]]
+
+
+def generate(source, target, width, quality):
+    """
+    生成缩小版本 不访问数据库与settings 可在进程池中执行
+    :param source: 原图路径
+    :param target: 输出路径 扩展名决定格式
+    :param width: 最大宽度
+    :param quality: 压缩质量
+    :return: 输出路径
+    """
+    pil_format = PIL_FORMATS[os.path.splitext(target)[1]]
+    out = io.BytesIO()
+    try:
+        image = Image.open(source)
+        image.load()
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA')
+        image.save(out, pil_format, quality=quality, optimize=True)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        # 无法识别、已截断或像素数过大的图片
+        raise ImageError('无法处理图片 {}'.format(e))
+    write_file_atomic(target, out.getvalue())
+    return target
+
+
+def is_source(name):
+    """
+    :param name: 在MEDIA_ROOT中的文件名
+    :return: 是否可生成缩小版本 须为IMAGE_SOURCE_DIRS下SOURCE_EXTENSIONS格式的文件
+    """
+    name = posixpath.normpath(name)
+    return (os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS and not name.startswith('../')
+            and name.startswith(tuple(settings.IMAGE_SOURCE_DIRS)))
+
+
+def get_source_path(name):
+    """
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :return: 原图路径
+    """
+    if not is_source(name):
+        raise ImageError('不支持的图片')
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation:
+        raise ImageError('文件名无效')
+    if os.path.abspath(path).startswith(os.path.abspath(settings.IMAGE_CACHE_ROOT) + os.sep):
+        raise ImageError('文件名无效')
+    return path
+
+
+def get_source_hash(name):
+    """
+    原图内容的hash 按文件修改时间与大小缓存 文件变化后重新计算
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :return: 12位十六进制字符串
+    """
+    source = get_source_path(name)
+    try:
+        stat = os.stat(source)
+    except OSError:
+        raise ImageError('图片不存在')
+    key = 'image:hash:{}'.format(hashlib.sha1(name.encode()).hexdigest())
+    version = (stat.st_mtime_ns, stat.st_size)
+    value = cache.get(key)
+    if value and value[0] == version:
+        return value[1]
+    digest = hashlib.sha1()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    digest = digest.hexdigest()[:12]
+    cache.set(key, (version, digest), None)
+    return digest
+
+
+def _remove_old(name, digest):
+    # 删除原图旧内容生成的缩小版本
+    root = get_cache_dir(name)
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return
+    for entry in entries:
+        if entry != digest:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def get_derivative(name, width, fmt):
+    """
+    获取缩小版本 不存在时生成
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :param width: 宽度 须在IMAGE_WIDTHS中
+    :param fmt: webp/orig
+    :return: (缩小版本的路径, 原图内容的hash)
+    """
+    if width not in settings.IMAGE_WIDTHS or fmt not in FORMATS:
+        raise ImageError('不支持的尺寸或格式')
+    digest = get_source_hash(name)
+    target = get_target_path(name, digest, width, fmt)
+    if not os.path.isfile(target):
+        _remove_old(name, digest)
+        generate(get_source_path(name), target, width, settings.IMAGE_QUALITY)
+    return target, digest
+
+
+def get_url(name, width, fmt='orig', digest=None):
+    """
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :param width: 宽度
+    :param fmt: webp/orig
+    :param digest: 原图内容的hash 默认读取当前内容
+    :return: 缩小版本的链接
+    """
+    digest = digest or get_source_hash(name)
+    return reverse('image', kwargs={'width': width, 'format': fmt, 'digest': digest, 'name': name})
+
+
+def get_srcset(name, fmt='orig'):
+    """
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :param fmt: webp/orig
+    :return: srcset属性值 原图不存在时返回空字符串
+    """
+    try:
+        digest = get_source_hash(name)
+    except ImageError:
+        return ''
+    return ', '.join('{} {}w'.format(get_url(name, width, fmt, digest), width) for width in settings.IMAGE_WIDTHS)
+
+
+def invalidate(name):
+    """
+    删除图片的全部缩小版本
+    :param name: 原图在MEDIA_ROOT中的文件名
+    :return: 无返回
+    """
+    shutil.rmtree(get_cache_dir(name), ignore_errors=True)
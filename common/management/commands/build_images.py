@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_summernote.utils import get_attachment_model
+
+from common import images
+from article.models import Article
+from banner.models import Banner
+
+
+def get_image_names():
+    """
+    :return: 文章缩略图、轮播图及summernote上传图片的文件名
+    """
+    names = set(Article.objects.exclude(thumbnail='').values_list('thumbnail', flat=True))
+    for field in ('img', 'img_xs'):
+        names.update(Banner.objects.exclude(**{field: ''}).values_list(field, flat=True))
+    names.update(get_attachment_model().objects.values_list('file', flat=True))
+    return sorted(name for name in names if name and images.is_source(name))
+
+
+class Command(BaseCommand):
+    help = '在进程池中预先生成全部响应式图片'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='进程数')
+        parser.add_argument('--force', action='store_true',
+                            help='重新生成已存在的图片')
+
+    def handle(self, *args, **options):
+        tasks = []
+        for name in get_image_names():
+            try:
+                source = images.get_source_path(name)
+                digest = images.get_source_hash(name)
+            except images.ImageError:
+                continue
+            for width in settings.IMAGE_WIDTHS:
+                for fmt in images.FORMATS:
+                    target = images.get_target_path(name, digest, width, fmt)
+                    if options['force'] or not os.path.isfile(target):
+                        tasks.append((source, target, width, settings.IMAGE_QUALITY))
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(images.generate, *task): task[0] for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write('{}: {}'.format(futures[future], e))
+        self.stdout.write('已生成{}张图片 失败{}张'.format(len(tasks) - failed, failed))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common import sitemaps
+
+
+class Command(BaseCommand):
+    help = '重新生成全部站点地图文件'
+
+    def add_arguments(self, parser):
+        domain, protocol = sitemaps.get_site()
+        parser.add_argument('--domain', default=domain,
+                            help='站点地图中使用的域名 默认为SITEMAP_DOMAIN或DOMAIN')
+        parser.add_argument('--protocol', default=protocol, choices=['http', 'https'],
+                            help='默认为SITE_PROTOCOL')
+
+    def handle(self, *args, **options):
+        if not options['domain']:
+            raise CommandError('请通过--domain、SITEMAP_DOMAIN或DOMAIN指定域名')
+        for section in sitemaps.sitemaps:
+            sitemaps.invalidate(section)
+        path = sitemaps.build_index(options['domain'], options['protocol'])
+        self.stdout.write('站点地图已生成 {}'.format(path))
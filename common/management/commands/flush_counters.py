@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.counters import flush_all
+
+
+class Command(BaseCommand):
+    help = '将缓存中的计数增量批量写回数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='常驻运行 每隔interval秒写回一次')
+        parser.add_argument('--interval', type=int, default=settings.COUNTER_FLUSH_INTERVAL,
+                            help='写回间隔(秒)')
+
+    def handle(self, *args, **options):
+        while True:
+            for name, total in flush_all(force=True).items():
+                if total:
+                    self.stdout.write('{}: +{}'.format(name, total))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,98 @@
+"""
+匿名用户整页缓存
+
+匿名用户看到的页面与访客无关，按 路径+规范化后的查询参数 缓存渲染后的html。
+每个页面登记所依赖的标签(如 article:12、articles、column:3、category:5、news:7、site)，
+缓存时记录各标签当时的版本号，读取时版本号不一致即视为失效。
+内容变化时由common.signals在事务提交后调用invalidate()更新相关标签的版本号，只使依赖这些标签的页面失效。
+
+侧边栏(热门文章、最新评论、标签云)及浏览次数不参与依赖追踪，最多滞后PAGE_CACHE_TIMEOUT秒。
+"""
+import uuid
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from common.utils import get_cache
+
+cache = get_cache()
+
+# 全部页面都依赖的标签 导航条、友情链接、轮播图、网站设置、分类变化时失效
+SITE_TAG = 'site'
+
+
+def _tag_key(tag):
+    return 'page:tag:{}'.format(tag)
+
+
+def make_key(request):
+    """
+    :param request: request
+    :return: 缓存键 查询参数按名称排序并去掉空值
+    """
+    query = urlencode(sorted((key, value) for key, values in request.GET.lists() for value in values if value))
+    return 'page:{}'.format(hashlib.md5('{}?{}'.format(request.path, query).encode()).hexdigest())
+
+
+def is_cacheable(request):
+    """
+    :param request: request
+    :return: 是否可以使用整页缓存 仅限匿名用户的GET请求
+    """
+    return bool(settings.PAGE_CACHE_TIMEOUT) and request.method == 'GET' and \
+        not request.user.is_authenticated
+
+
+def get_response(request):
+    """
+    :param request: request
+    :return: 缓存的response 未命中或已失效时返回None
+    """
+    entry = cache.get(make_key(request))
+    if entry is None:
+        return None
+    versions = cache.get_many([_tag_key(tag) for tag in entry['tags']])
+    if any(versions.get(_tag_key(tag)) != version for tag, version in entry['tags'].items()):
+        return None
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def set_response(request, response, tags):
+    """
+    缓存response
+    :param request: request
+    :param response: 已渲染的response
+    :param tags: 页面依赖的标签
+    :return: 无返回
+    """
+    if response.status_code != 200 or response.streaming:
+        return
+    tags = {SITE_TAG} | set(tags)
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for tag in tags:
+        if _tag_key(tag) not in versions:
+            version = uuid.uuid4().hex
+            if not cache.add(_tag_key(tag), version, None):
+                version = cache.get(_tag_key(tag))
+            versions[_tag_key(tag)] = version
+    cache.set(make_key(request), {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'tags': {tag: versions[_tag_key(tag)] for tag in tags},
+    }, settings.PAGE_CACHE_TIMEOUT)
+    response['X-Page-Cache'] = 'miss'
+
+
+def invalidate(*tags):
+    """
+    使依赖指定标签的页面失效
+    :param tags: 标签
+    :return: 无返回
+    """
+    if tags:
+        cache.set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
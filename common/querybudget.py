@@ -0,0 +1,150 @@
+"""
+查询预算
+
+QueryBudgetMiddleware 记录每个请求的查询数、数据库耗时及每种查询(忽略参数)的执行次数，
+查询数超过视图声明的预算，或同一查询执行超过 QUERY_DUPLICATE_LIMIT 次(通常为N+1)时记录日志，
+QUERY_BUDGET_RAISE = True 时抛出 QueryBudgetExceeded，测试中开启。
+
+类视图以 query_budget 属性声明预算，函数视图使用 @query_budget(n) 装饰器，
+未声明的视图使用 QUERY_BUDGET_DEFAULT。测试中也可直接使用 record_queries() 检查一段代码。
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+IN_RE = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_fingerprint(sql):
+    """
+    :param sql: 带占位符的SQL
+    :return: 查询的形状 IN列表长度、SQL中直接写入的数字不同时视为同一查询
+    """
+    return SPACE_RE.sub(' ', NUMBER_RE.sub('N', IN_RE.sub('IN (...)', sql))).strip()
+
+
+class QueryRecorder(object):
+    """
+    作为 connection.execute_wrapper 使用 记录经过的全部查询
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[get_fingerprint(sql)] += 1
+
+    def get_duplicates(self, limit):
+        """
+        :param limit: 同一查询允许的执行次数
+        :return: [(查询, 执行次数), ...] 超过limit次的查询
+        """
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > limit]
+
+    def check(self, budget, limit, label=''):
+        """
+        :param budget: 查询数上限 为None时不检查
+        :param limit: 同一查询允许的执行次数
+        :param label: 日志及异常中显示的名称
+        :return: 问题列表 无问题时为空
+        """
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append('{}执行了{}次查询 超出预算{}次'.format(label, self.count, budget))
+        for sql, count in self.get_duplicates(limit):
+            problems.append('{}重复执行{}次: {}'.format(label, count, sql))
+        return problems
+
+
+@contextmanager
+def record_queries(budget=None, limit=None, label=''):
+    """
+    记录代码块中的查询 指定budget或limit时超出即抛出QueryBudgetExceeded
+    :param budget: 查询数上限
+    :param limit: 同一查询允许的执行次数
+    :param label: 异常中显示的名称
+    :return: QueryRecorder
+    """
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+    if budget is not None or limit is not None:
+        problems = recorder.check(budget, settings.QUERY_DUPLICATE_LIMIT if limit is None else limit, label)
+        if problems:
+            raise QueryBudgetExceeded('\n'.join(problems))
+
+
+def query_budget(count):
+    """
+    为函数视图声明查询预算
+    :param count: 查询数上限
+    """
+    def decorator(view):
+        view.query_budget = count
+        return view
+    return decorator
+
+
+def get_view_budget(view):
+    """
+    :param view: 视图函数 类视图为as_view()的返回值
+    :return: 声明的查询预算 未声明时为QUERY_BUDGET_DEFAULT
+    """
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view, 'view_class', None), 'query_budget', None)
+    return settings.QUERY_BUDGET_DEFAULT if budget is None else budget
+
+
+class QueryBudgetMiddleware(object):
+    """
+    须放在MIDDLEWARE的最前面 会话、用户等中间件的查询一并计入
+    统计结果保存在response.query_stats 查询数与耗时同时写入响应头X-Query-Count、X-Query-Time
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        response.query_stats = recorder
+        label = '[{} {}]'.format(request.method, request.path)
+        problems = recorder.check(getattr(request, 'query_budget', settings.QUERY_BUDGET_DEFAULT),
+                                  settings.QUERY_DUPLICATE_LIMIT, label)
+        if problems:
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded('\n'.join(problems))
+            for problem in problems:
+                logger.warning(u'[querybudget]{}'.format(problem))
+        response['X-Query-Count'] = recorder.count
+        response['X-Query-Time'] = '{:.1f}ms'.format(recorder.time * 1000)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_view_budget(view_func)
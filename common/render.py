@@ -0,0 +1,42 @@
+"""
+批量渲染局部模板
+
+AJAX接口返回的html片段由同一个局部模板重复渲染而成。模板只查找一次，
+公共上下文(含context processor结果，如perms、user)只构造一次，
+每个对象仅压入一层 {item_name: 对象} 后渲染，最后一次性拼接。
+"""
+from django.template.context import make_context
+from django.template.loader import get_template
+
+
+def render_items(template_name, items, item_name, context=None, request=None):
+    """
+    使用同一模板渲染多个对象
+    :param template_name: 局部模板名
+    :param items: 对象列表
+    :param item_name: 模板中对象的变量名
+    :param context: 公共上下文
+    :param request: request 传入时执行context processor
+    :return: 拼接后的html
+    """
+    template = get_template(template_name).template
+    context = make_context(context, request)
+    parts = []
+    with context.bind_template(template):
+        for item in items:
+            with context.push({item_name: item}):
+                parts.append(template.render(context))
+    return ''.join(parts)
+
+
+def render_item(template_name, item, item_name, context=None, request=None):
+    """
+    渲染单个对象
+    :param template_name: 局部模板名
+    :param item: 对象
+    :param item_name: 模板中对象的变量名
+    :param context: 公共上下文
+    :param request: request
+    :return: html
+    """
+    return render_items(template_name, [item], item_name, context, request)
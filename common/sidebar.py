@@ -0,0 +1,94 @@
+"""
+侧边栏 热门文章、最新评论、标签云 (友情链接见common.chrome)
+
+按 匿名用户(public) / 拥有article.view_article权限(all) 两种可见范围分别缓存，
+由common.signals在Article、Comment变化的事务提交后使对应的块失效。
+浏览次数经计数器批量写回时不会触发signal，热门文章依靠SIDEBAR_CACHE_TIMEOUT刷新。
+"""
+from django.conf import settings
+
+from common.utils import get_cache
+
+from article.models import Article, Comment, Tag
+
+cache = get_cache()
+
+VARIANTS = ('public', 'all')
+
+
+def get_variant(user):
+    """
+    :param user: 当前用户
+    :return: 用户可见范围
+    """
+    return 'all' if user.has_perm('article.view_article') else 'public'
+
+
+def visible_articles(variant):
+    if variant == 'all':
+        return Article.objects.all()
+    return Article.public.filter(status=0)
+
+
+def _hot_article_list(variant):
+    return list(visible_articles(variant).only('id', 'title', 'tags', 'view_times').order_by('-view_times')[:10])
+
+
+def _latest_comment_list(variant):
+    comments = Comment.objects.select_related('user', 'article').only(
+        'id', 'text', 'user__username', 'user__portrait', 'article__id')
+    if variant == 'all':
+        comments = comments.filter(article__isnull=False)
+    else:
+        comments = comments.filter(article__is_public=True, article__status=0)
+    return list(comments.order_by('-id')[:6])
+
+
+def _tags(variant):
+    # 按标签下的公开文章数排序 [[标签名, 文章数], ...]
+    return [list(tag) for tag in Tag.objects.filter(article_count__gt=0).values_list(
+        'name', 'article_count')[:settings.TAG_CLOUD_SIZE]]
+
+
+BLOCKS = {
+    'hot_article_list': _hot_article_list,
+    'latest_comment_list': _latest_comment_list,
+    'tags': _tags,
+}
+
+
+def _key(name, variant):
+    return 'sidebar:{}:{}'.format(name, variant)
+
+
+def get_block(name, variant):
+    """
+    :param name: 块名称
+    :param variant: 可见范围
+    :return: 块数据 缓存未命中时重新计算
+    """
+    value = cache.get(_key(name, variant))
+    if value is None:
+        value = BLOCKS[name](variant)
+        cache.set(_key(name, variant), value, settings.SIDEBAR_CACHE_TIMEOUT)
+    return value
+
+
+def get_sidebar(user):
+    """
+    :param user: 当前用户
+    :return: 侧边栏全部块 缓存命中时仅一次缓存读取
+    """
+    variant = get_variant(user)
+    cached = cache.get_many([_key(name, variant) for name in BLOCKS])
+    return {name: cached[_key(name, variant)] if _key(name, variant) in cached else get_block(name, variant)
+            for name in BLOCKS}
+
+
+def invalidate(*names):
+    """
+    使指定块在全部可见范围下失效
+    :param names: 块名称
+    :return: 无返回
+    """
+    cache.delete_many([_key(name, variant) for name in names for variant in VARIANTS])
@@ -0,0 +1,125 @@
+from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from constance.signals import config_updated
+from django_cleanup.signals import cleanup_pre_delete
+
+from common import sidebar, chrome, sitemaps, feeds, pagecache, images
+
+from article.models import Article, Comment, Category
+from news.models import News
+from column.models import Column
+from banner.models import Banner
+from navbar.models import NavBar
+from link.models import Link
+
+
+def on_commit(func, *args):
+    """
+    事务提交后再使缓存失效 提交前其它进程读到的仍是旧数据，若此时失效会按旧数据以新版本重建缓存
+    不在事务中时立即执行
+    """
+    transaction.on_commit(lambda: func(*args))
+
+
+# 侧边栏缓存失效
+@receiver([post_save, post_delete], sender=Article)
+def article_changed(sender, **kwargs):
+    on_commit(sidebar.invalidate, 'hot_article_list', 'latest_comment_list', 'tags')
+
+
+# 订阅缓存失效 分类改名、移动后订阅标题及内容随之变化
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Category)
+def feed_changed(sender, **kwargs):
+    on_commit(feeds.bump)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, **kwargs):
+    on_commit(sidebar.invalidate, 'latest_comment_list')
+
+
+# 站点框架数据快照失效
+@receiver([post_save, post_delete], sender=NavBar)
+@receiver([post_save, post_delete], sender=Link)
+@receiver([post_save, post_delete], sender=Banner)
+@receiver(config_updated)
+def site_chrome_changed(sender, **kwargs):
+    on_commit(chrome.bump)
+    on_commit(pagecache.invalidate, pagecache.SITE_TAG)
+    # 订阅的标题、描述取自网站设置
+    on_commit(feeds.bump)
+
+
+# 站点地图失效
+@receiver([post_save, post_delete], sender=Article)
+def article_sitemap_changed(sender, instance, **kwargs):
+    on_commit(sitemaps.invalidate, 'article', instance.pk)
+    # 专栏的lastmod取自其中文章的发布时间
+    on_commit(sitemaps.invalidate, 'column')
+
+
+@receiver([post_save, post_delete], sender=News)
+def news_sitemap_changed(sender, instance, **kwargs):
+    on_commit(sitemaps.invalidate, 'news', instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Column)
+def column_sitemap_changed(sender, instance, **kwargs):
+    on_commit(sitemaps.invalidate, 'column', instance.pk)
+
+
+# 整页缓存失效
+@receiver([post_save, post_delete], sender=Article)
+def article_page_changed(sender, instance, signal, **kwargs):
+    tags = ['article:{}'.format(instance.pk), 'articles']
+    # 新旧分类及其全部上级分类的列表页
+    category_ids = {pk for pk in (getattr(instance, '_old_category_id', None), instance.category_id) if pk}
+    for category in Category.objects.filter(id__in=category_ids).only('path'):
+        tags += ['category:{}'.format(pk) for pk in category.get_ancestor_ids()]
+    # 所在专栏 删除文章时关联已被删除 使用column.signals在pre_delete中记录的专栏id
+    if signal is post_delete:
+        column_ids = getattr(instance, '_column_ids', [])
+    else:
+        column_ids = instance.column_set.values_list('id', flat=True)
+    tags += ['column:{}'.format(pk) for pk in column_ids]
+    on_commit(pagecache.invalidate, *tags)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_page_changed(sender, instance, **kwargs):
+    if instance.article_id:
+        on_commit(pagecache.invalidate, 'article:{}'.format(instance.article_id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_page_changed(sender, **kwargs):
+    # 分类名称出现在全部文章页面中
+    on_commit(pagecache.invalidate, pagecache.SITE_TAG)
+
+
+@receiver([post_save, post_delete], sender=Column)
+def column_page_changed(sender, instance, **kwargs):
+    on_commit(pagecache.invalidate, 'column:{}'.format(instance.pk))
+
+
+@receiver(m2m_changed, sender=Column.article.through)
+def column_articles_page_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        # 由文章一侧清空时pk_set为空 使用column.signals在pre_clear中记录的专栏id
+        column_ids = (pk_set or getattr(instance, '_column_ids', [])) if reverse else [instance.pk]
+        on_commit(pagecache.invalidate, *['column:{}'.format(pk) for pk in column_ids])
+
+
+@receiver([post_save, post_delete], sender=News)
+def news_page_changed(sender, instance, **kwargs):
+    on_commit(pagecache.invalidate, 'news:{}'.format(instance.pk))
+
+
+# django_cleanup删除图片时 删除其缩小版本
+@receiver(cleanup_pre_delete)
+def file_deleted(sender, file, **kwargs):
+    if file.name:
+        images.invalidate(file.name)
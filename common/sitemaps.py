@@ -1,5 +1,22 @@
+"""
+站点地图
+
+各部分按Sitemap.limit(默认5万条)分页，只查询id与更新时间，以更新时间作为lastmod。
+生成的xml写入settings.SITEMAP_ROOT，请求时直接读取文件，不访问数据库。
+内容变化时由common.signals在事务提交后调用invalidate()删除受影响的分页及索引，下次请求时重新生成。
+文件中的链接只使用配置的域名(SITEMAP_DOMAIN或DOMAIN)与SITE_PROTOCOL，不使用请求中的Host，
+否则首个以其它域名访问的请求将决定文件中的全部链接。
+"""
+import os
+import time
+import tempfile
+from datetime import datetime
+from collections import namedtuple
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
-from django.urls import reverse_lazy
+from django.template.loader import render_to_string
+from django.urls import reverse
 
 from article.models import Article
 from news.models import News
@@ -11,45 +28,68 @@ class StaticViewSitemap(Sitemap):
     changefreq = 'weekly'
 
     def items(self):
-        return ['index', 'article_index', 'article_all', 'news_index', 'user_login', 'user_register',
-                'user_forget_pwd', 'version', 'rss']
+        return ['index', 'article_index', 'article_all', 'news_index', 'column_index', 'user_login',
+                'user_register', 'user_forget_pwd', 'version', 'rss']
 
     def location(self, item):
-        return reverse_lazy(item)
+        return reverse(item)
 
 
-class ArticleSitemap(Sitemap):
+class ModelSitemap(Sitemap):
     priority = 0.5
     changefreq = 'weekly'
+    url_name = None
+
+    def get_queryset(self):
+        raise NotImplementedError
 
     def items(self):
-        return Article.objects.filter(is_public=True).all().order_by('-id')
+        return self.get_queryset().values('id', 'update_time').order_by('id')
 
     def location(self, item):
-        return reverse_lazy('article_detail', kwargs={'pk': item.id})
+        return reverse(self.url_name, kwargs={'pk': item['id']})
 
+    def lastmod(self, item):
+        return item['update_time']
 
-class NewsSitemap(Sitemap):
-    priority = 0.5
-    changefreq = 'weekly'
+    def get_page(self, pk):
+        """
+        :param pk: 对象id
+        :return: 该对象所在或将要插入的页码
+        """
+        return self.get_queryset().filter(id__lt=pk).count() // self.limit + 1
 
-    def items(self):
-        return News.objects.all().order_by('-id')
 
-    def location(self, item):
-        return reverse_lazy('news_detail', kwargs={'pk': item.id})
+class ArticleSitemap(ModelSitemap):
+    url_name = 'article_detail'
 
+    def get_queryset(self):
+        return Article.public.filter(status=0)
 
-class ColumnSitemap(Sitemap):
-    priority = 0.5
-    changefreq = 'weekly'
+
+class NewsSitemap(ModelSitemap):
+    url_name = 'news_detail'
+
+    def get_queryset(self):
+        return News.objects.all()
+
+
+class ColumnSitemap(ModelSitemap):
+    url_name = 'column_detail'
+
+    def get_queryset(self):
+        return Column.objects.all()
 
     def items(self):
-        return Column.objects.all().order_by('-id')
+        # 专栏没有文章时update_time为空 使用创建时间
+        return self.get_queryset().values('id', 'update_time', 'create_time').order_by('id')
+
+    def lastmod(self, item):
+        return item['update_time'] or item['create_time']
 
-    def location(self, item):
-        return reverse_lazy('column_detail', kwargs={'pk': item.id})
 
+# Sitemap.get_urls只需要site.domain
+Site = namedtuple('Site', ['domain'])
 
 sitemaps = {
     'static': StaticViewSitemap,
@@ -57,3 +97,119 @@ sitemaps = {
     'news': NewsSitemap,
     'column': ColumnSitemap,
 }
+
+INDEX_FILENAME = 'sitemap.xml'
+
+
+def _filename(section, page):
+    return 'sitemap-{}-{}.xml'.format(section, page)
+
+
+def _path(filename):
+    return os.path.join(settings.SITEMAP_ROOT, filename)
+
+
+def _write(filename, content, lastmod=None):
+    # 先写入临时文件再替换 避免并发请求读到不完整的文件
+    os.makedirs(settings.SITEMAP_ROOT, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=settings.SITEMAP_ROOT, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.chmod(tmp, 0o644)
+    if lastmod is not None:
+        # 文件修改时间记录本页最新的lastmod 供索引使用
+        timestamp = time.mktime(lastmod.timetuple())
+        os.utime(tmp, (timestamp, timestamp))
+    os.replace(tmp, _path(filename))
+
+
+def get_site():
+    """
+    :return: (域名, 协议) 域名优先使用settings.SITEMAP_DOMAIN 其次为settings.DOMAIN
+    """
+    return settings.SITEMAP_DOMAIN or settings.DOMAIN, settings.SITE_PROTOCOL
+
+
+def build_section(section, page, domain, protocol='http'):
+    """
+    生成一页站点地图并写入文件
+    :param section: 部分名称
+    :param page: 页码
+    :param domain: 域名
+    :param protocol: 协议
+    :return: 文件路径
+    """
+    sitemap = sitemaps[section]()
+    urls = sitemap.get_urls(page=page, site=Site(domain), protocol=protocol)
+    content = render_to_string('sitemap.xml', {'urlset': urls})
+    _write(_filename(section, page), content, getattr(sitemap, 'latest_lastmod', None))
+    return _path(_filename(section, page))
+
+
+def build_index(domain, protocol='http'):
+    """
+    生成索引 缺少的分页一并生成
+    :param domain: 域名
+    :param protocol: 协议
+    :return: 文件路径
+    """
+    entries = []
+    for section, cls in sitemaps.items():
+        sitemap = cls()
+        for page in range(1, sitemap.paginator.num_pages + 1):
+            path = _path(_filename(section, page))
+            if not os.path.exists(path):
+                build_section(section, page, domain, protocol)
+            lastmod = datetime.fromtimestamp(os.path.getmtime(path)) if hasattr(sitemap, 'lastmod') else None
+            location = '{}://{}{}'.format(protocol, domain, reverse('sitemap_section', kwargs={
+                'section': section, 'page': page}))
+            entries.append((location, lastmod))
+    _write(INDEX_FILENAME, render_to_string('common/sitemap_index.xml', {'entries': entries}))
+    return _path(INDEX_FILENAME)
+
+
+def get_index_path():
+    """
+    :return: 索引文件路径 不存在时生成
+    """
+    path = _path(INDEX_FILENAME)
+    if not os.path.exists(path):
+        path = build_index(*get_site())
+    return path
+
+
+def get_section_path(section, page):
+    """
+    :param section: 部分名称
+    :param page: 页码
+    :return: 分页文件路径 不存在时生成
+    """
+    path = _path(_filename(section, page))
+    if not os.path.exists(path):
+        path = build_section(section, page, *get_site())
+    return path
+
+
+def _remove(filename):
+    try:
+        os.remove(_path(filename))
+    except FileNotFoundError:
+        pass
+
+
+def invalidate(section, pk=None):
+    """
+    删除受影响的分页及索引
+    :param section: 部分名称
+    :param pk: 变化的对象id 其所在页及之后各页(增删对象会使后续各页的内容移动)失效 为空时整个部分失效
+    :return: 无返回
+    """
+    first_page = sitemaps[section]().get_page(pk) if pk else 1
+    if os.path.isdir(settings.SITEMAP_ROOT):
+        prefix = 'sitemap-{}-'.format(section)
+        for filename in os.listdir(settings.SITEMAP_ROOT):
+            if filename.startswith(prefix) and filename.endswith('.xml'):
+                page = filename[len(prefix):-len('.xml')]
+                if page.isdigit() and int(page) >= first_page:
+                    _remove(filename)
+    _remove(INDEX_FILENAME)
@@ -0,0 +1,18 @@
+from django import template
+
+from common import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, fmt='orig'):
+    """
+    :param image: ImageField/FileField的值
+    :param fmt: webp/orig
+    :return: srcset属性值 图片为空或不可生成缩小版本时返回空字符串
+    """
+    if not image or not images.is_source(image.name):
+        return ''
+    return images.get_srcset(image.name, fmt)
+
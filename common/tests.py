@@ -0,0 +1,743 @@
+"""
+QueryPlanTests 查询计划回归测试
+请求热点页面，对其中涉及HOT_TABLES的每条SELECT执行EXPLAIN(SQLite为EXPLAIN QUERY PLAN)，
+出现全表扫描时失败。索引或查询写法变化导致退化为全表扫描时由此发现。
+使用MySQL运行测试时按EXPLAIN结果中的type = ALL判断。
+
+PaginationTests 游标分页
+伪造、篡改或与排序方式不一致的游标被拒绝；排序字段相同的文章按id排序，逐页翻完不重复、不遗漏。
+
+QueryBudgetTests 查询预算测试
+开启QUERY_BUDGET_RAISE后请求各视图，查询数超出视图声明的预算或出现N+1时失败。
+
+CounterTests 计数器写缓冲
+累加的计数先计入未写回的增量，flush两次后写回数据库，写回过程中的累加不丢失也不重复计入。
+
+DedupTests 访客去重
+多个线程同时调用seen()时同一访客只计一次，不同访客均被计入；缓存不可用时按新访客计入。
+
+InvalidationTests 缓存失效
+模型变化在事务提交后才使缓存失效，提交前其它进程不会按旧数据以新版本重建缓存。
+
+ImageTests 响应式图片
+只有IMAGE_SOURCE_DIRS下的图片可生成缩小版本，无法处理的图片返回404。
+
+PageCacheTests 整页缓存
+匿名用户的GET请求命中缓存，登录用户不使用缓存；文章保存后只有依赖它的页面失效。
+"""
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from PIL import Image
+
+from constance.backends.database.models import Constance
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from article.models import Article, Category, Comment
+from banner.models import Banner
+from link.models import Link
+from article.pagination import SORTS, InvalidCursor, _encode, paginate
+from column.models import Column
+from common import chrome, counters, feeds, images, sidebar, sitemaps
+from common.dedup import KeyDedup, SlotDedup, get_dedup
+from common.querybudget import QueryBudgetExceeded, record_queries
+from common.utils import put_value
+from news.models import News, NewsArchive
+from notification.models import Notification
+from user import outbox
+from user.models import User, EmailVerify
+
+# 数据量随时间增长的表 其余为分类、标签等小表
+HOT_TABLES = {
+    'article_article', 'article_comment', 'column_column_article', 'notification_notification',
+    'user_emailverify', 'user_outboxemail', 'news_news',
+}
+# SQLite中不带USING的SCAN为全表扫描
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+# 按主键顺序扫描并在LIMIT处停止 SQLite同样显示为SCAN
+ROWID_ORDER_RE = re.compile(r'ORDER BY "(\w+)"\."id" (?:ASC|DESC)\s+LIMIT')
+
+
+def get_full_scans(sql):
+    """
+    :param sql: 已代入参数的SQL
+    :return: 该SQL全表扫描的表名列表
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            tables = [match.group(1) for match in (SQLITE_SCAN_RE.match(row[-1]) for row in cursor.fetchall())
+                      if match]
+            rowid_order = ROWID_ORDER_RE.search(sql)
+            return [table for table in tables if not (rowid_order and rowid_order.group(1) == table)]
+        cursor.execute('EXPLAIN ' + sql)
+        columns = [column[0].lower() for column in cursor.description]
+        return [row['table'] for row in (dict(zip(columns, row)) for row in cursor.fetchall())
+                if row['type'] == 'ALL']
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, NOTIFICATION_ASYNC=False, EMAIL_OUTBOX_SEND_ON_COMMIT=False)
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', 'author@example.com', 'password')
+        cls.category = Category.objects.create(name='python')
+        now = timezone.now()
+        Article.objects.bulk_create([
+            Article(author=cls.user, category=cls.category, title='标题{}'.format(i), tags='python',
+                    summary='摘要', content='<p>正文</p>', is_public=i % 10 != 0, status=int(i % 7 == 0),
+                    view_times=i * 3 % 17, publish_time=now - timedelta(hours=i))
+            for i in range(50)])
+        cls.article = Article.public.filter(status=0).order_by('-publish_time').first()
+        Comment.objects.bulk_create([Comment(user=cls.user, article=cls.article, text='评论{}'.format(i))
+                                     for i in range(5)])
+        cls.column = Column.objects.create(name='专栏', summary='专栏')
+        cls.column.article.add(*Article.objects.all()[:10])
+        Notification.objects.bulk_create([Notification(from_user=cls.user, to_user=cls.user, title='通知',
+                                                        text='通知', url='/') for i in range(5)])
+        News.objects.bulk_create([News(title='新闻{}'.format(i), summary='新闻', source='来源',
+                                       publish_time=now - timedelta(hours=i)) for i in range(5)])
+        cls.verify = EmailVerify.objects.create(owner=cls.user, category=0)
+        cls.verify.update()
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def assertNoFullScan(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any('"{}"'.format(table) in sql or '`{}`'.format(table) in sql
+                                                       for table in HOT_TABLES):
+                continue
+            scans = [table for table in get_full_scans(sql) if table in HOT_TABLES]
+            self.assertEqual(scans, [], sql)
+
+    def get(self, url, data=None):
+        response = self.client.get(url, data or {})
+        self.assertEqual(response.status_code, 200, url)
+
+    def test_list_pages(self):
+        # 站点地图生成到临时目录 不写入BASE_DIR/sitemap 也不会读到已生成的文件而跳过查询
+        with tempfile.TemporaryDirectory() as root, self.settings(SITEMAP_ROOT=root):
+            for url in [reverse('index'), reverse('article_index'), reverse('article_all'),
+                        '{}?category={}'.format(reverse('article_index'), self.category.pk),
+                        '{}?tag=python'.format(reverse('article_index')),
+                        reverse('column_detail', args=(self.column.pk,)),
+                        reverse('feed', kwargs={'format': 'rss'}), reverse('news_index'),
+                        reverse('sitemap'), reverse('sitemap_section', kwargs={'section': 'article', 'page': 1})]:
+                self.assertNoFullScan(self.get, url)
+
+    def test_all_pages(self):
+        article = Article.public.filter(status=0).first()
+        for sort in SORTS:
+            for val in ['all', str(self.category.pk)]:
+                self.assertNoFullScan(self.client.post, reverse('article_all'),
+                                      {'val': val, 'sort': sort, 'cursor': _encode(sort, article)})
+
+    def test_detail_page(self):
+        self.client.force_login(self.user)
+        self.assertNoFullScan(self.get, reverse('article_detail', args=(self.article.pk,)))
+        self.assertNoFullScan(self.get, reverse('article_comment_list', args=(self.article.pk,)))
+
+    def test_user_pages(self):
+        self.assertNoFullScan(self.get, reverse('user_login'), {'active_code': self.verify.verify_code})
+        self.assertNoFullScan(self.client.get, reverse('user_reset_pwd', args=(self.verify.verify_code,)))
+        self.client.force_login(self.user)
+        self.assertNoFullScan(self.get, reverse('user_notification'))
+
+    def test_outbox(self):
+        outbox.enqueue('主题', '内容', ['to@example.com'])
+        self.assertNoFullScan(outbox.claim, 10)
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        category = Category.objects.create(name='python')
+        now = timezone.now()
+        # 排序字段只有少数几个取值 同值的文章跨越多页
+        Article.objects.bulk_create([
+            Article(author=user, category=category, title='标题{}'.format(i), tags='python', content='<p>正文</p>',
+                    view_times=i % 3, comment_times=i % 2, publish_time=now - timedelta(hours=i % 4))
+            for i in range(23)])
+
+    def walk(self, sort, size=4):
+        ids = []
+        cursor = None
+        while True:
+            page = paginate(Article.objects.all(), sort, cursor, size)
+            ids.extend(article.id for article in page.object_list)
+            if page.is_end:
+                self.assertIsNone(page.cursor)
+                return ids
+            cursor = page.cursor
+
+    def test_ties(self):
+        for sort, field in SORTS.items():
+            expected = list(Article.objects.order_by('-' + field, '-id').values_list('id', flat=True))
+            for size in [1, 4, 5, 23, 50]:
+                ids = self.walk(sort, size)
+                self.assertEqual(len(ids), len(set(ids)), sort)
+                self.assertEqual(ids, expected, sort)
+
+    def test_new_article(self):
+        # 翻页过程中发布的新文章排在前面 不影响后续页
+        first = paginate(Article.objects.all(), '-publish_time', size=5)
+        old = Article.objects.first()
+        article = Article.objects.create(author=old.author, category=old.category, title='新文章', tags='python',
+                                         content='<p>正文</p>', publish_time=timezone.now() + timedelta(minutes=1))
+        ids = [item.id for item in first.object_list]
+        cursor = first.cursor
+        while cursor:
+            page = paginate(Article.objects.all(), '-publish_time', cursor, 5)
+            ids.extend(item.id for item in page.object_list)
+            cursor = page.cursor
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), sorted(Article.objects.exclude(pk=article.pk).values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        article = Article.objects.first()
+        cursor = _encode('-view_times', article)
+        value, last_id = article.view_times, article.id
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for sort, cursor in [
+            ('-view_times', tampered),
+            ('-view_times', 'cursor'),
+            # 其它排序方式的游标
+            ('-publish_time', cursor),
+            ('-comment_count', cursor),
+            # 未使用本模块的salt签名
+            ('-view_times', signing.dumps(['-view_times', value, last_id], compress=True)),
+            ('-view_times', signing.dumps(['-view_times', value], salt='article.pagination')),
+        ]:
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                paginate(Article.objects.all(), sort, cursor)
+        with self.assertRaises(InvalidCursor):
+            paginate(Article.objects.all(), 'title')
+
+    def test_invalid_cursor_view(self):
+        response = self.client.post(reverse('article_all'), {'val': 'all', 'sort': '-publish_time',
+                                                              'cursor': _encode('-view_times', Article.objects.first())})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True,
+                   NOTIFICATION_ASYNC=False, EMAIL_OUTBOX_SEND_ON_COMMIT=False)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.users = [User.objects.create_user('user{}'.format(i), 'user{}@example.com'.format(i), 'password')
+                     for i in range(3)]
+        parent = Category.objects.create(name='python')
+        cls.category = Category.objects.create(name='django', parent=parent)
+        cls.articles = [Article.objects.create(author=cls.users[i % 3], category=cls.category,
+                                               title='标题{}'.format(i), tags='python,django',
+                                               content='<h2>标题</h2><p>{}</p>'.format('正文' * 100))
+                        for i in range(12)]
+        cls.article = cls.articles[-1]
+        # 不同用户的评论与回复 侧边栏、评论列表中的用户及文章须一次查出
+        comment = None
+        for i in range(6):
+            for article in cls.articles[:3]:
+                comment = Comment.objects.create(user=cls.users[i % 3], article=article, text='评论{}'.format(i),
+                                                 parent=comment if i % 2 else None)
+        cls.column = Column.objects.create(name='专栏', summary='专栏')
+        cls.column.article.add(*cls.articles[:6])
+        for i in range(3):
+            Banner.objects.create(title='轮播{}'.format(i), img='banner/{}.jpg'.format(i), article=cls.articles[i])
+        cls.news = [News.objects.create(title='新闻{}'.format(i), summary='新闻', source='来源') for i in range(5)]
+        cls.archive = NewsArchive.objects.first()
+        cls.notifications = [Notification.objects.create(from_user=cls.users[0], to_user=cls.users[1],
+                                                         title='回复', text='回复', url='/') for i in range(5)]
+        cls.verify = EmailVerify.objects.create(owner=cls.users[0], category=1)
+        cls.verify.update()
+
+    def request(self, method, url, data=None, status=200):
+        # 预算按缓存全部失效时计算
+        for cache in caches.all():
+            cache.clear()
+        chrome.bump()
+        response = getattr(self.client, method)(url, data or {})
+        self.assertEqual(response.status_code, status, url)
+        return response
+
+    def test_common_views(self):
+        for user in [None, self.users[0], self.admin]:
+            if user:
+                self.client.force_login(user)
+            self.request('get', reverse('index'))
+            self.request('get', reverse('version'))
+            self.request('get', reverse('feed', kwargs={'format': 'rss'}))
+            self.request('get', reverse('feed_category', kwargs={'format': 'atom', 'category': self.category.pk}))
+            self.request('get', '/not-found/', status=404)
+        # 站点地图文件不存在时生成
+        with tempfile.TemporaryDirectory() as root, self.settings(SITEMAP_ROOT=root):
+            self.request('get', reverse('sitemap_section', kwargs={'section': 'article', 'page': 1}))
+            self.request('get', reverse('sitemap'))
+
+    def test_article_views(self):
+        for user in [None, self.users[0], self.admin]:
+            if user:
+                self.client.force_login(user)
+            self.request('get', reverse('article_index'))
+            self.request('get', reverse('article_index'), {'category': self.category.pk})
+            self.request('get', reverse('article_index'), {'tag': 'django'})
+            self.request('get', reverse('article_all'))
+            self.request('post', reverse('article_all'), {'val': self.category.pk, 'sort': '-view_times'})
+            for article in self.articles[:3]:
+                self.request('get', reverse('article_detail', args=(article.pk,)))
+        self.request('get', reverse('article_comment_list', args=(self.articles[0].pk,)))
+        self.request('post', reverse('article_comments', args=(self.article.pk,)), {'comment': '评论'})
+        self.request('get', reverse('article_create'))
+        self.request('get', reverse('article_update', args=(self.article.pk,)))
+        data = {'title': '新文章', 'category': self.category.pk, 'status': 0, 'tags': 'python,flask',
+                'is_public': 'on', 'content': '<p>正文</p>', 'publish_time': '2018-01-01 00:00:00'}
+        response = self.request('post', reverse('article_create'), data, status=302)
+        self.assertEqual(response.url, Article.objects.get(title='新文章').get_absolute_url())
+        response = self.request('post', reverse('article_update', args=(self.article.pk,)), data, status=302)
+        self.assertEqual(response.url, self.article.get_absolute_url())
+
+    def test_column_views(self):
+        for user in [None, self.users[0]]:
+            if user:
+                self.client.force_login(user)
+            self.request('get', reverse('column_index'))
+            self.request('get', reverse('column_detail', args=(self.column.pk,)))
+
+    def test_news_views(self):
+        date = self.archive.date
+        for user in [None, self.users[0]]:
+            if user:
+                self.client.force_login(user)
+            self.request('get', reverse('news_index'))
+            self.request('get', reverse('news_archive'))
+            self.request('get', reverse('news_archive_month', kwargs={'year': date.year, 'month': date.month}))
+            self.request('get', reverse('news_archive_day', kwargs={'year': date.year, 'month': date.month,
+                                                                    'day': date.day}))
+            self.request('get', reverse('news_detail', args=(self.news[0].pk,)))
+
+    def test_user_views(self):
+        self.request('get', reverse('user_login'))
+        self.request('get', reverse('user_register'))
+        self.request('get', reverse('user_forget_pwd'))
+        self.request('get', reverse('user_reset_pwd', args=(self.verify.verify_code,)))
+        self.client.force_login(self.users[1])
+        self.request('get', reverse('user_change_pwd'))
+        self.request('get', reverse('user_portrait'))
+        self.request('get', reverse('user_notification'))
+        self.request('post', reverse('user_notification'), {'notification_id': self.notifications[0].pk})
+        self.request('get', reverse('user_logout'), status=302)
+
+    def test_record_queries(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with record_queries(budget=1):
+                list(Article.objects.all()[:1])
+                list(Comment.objects.all()[:1])
+        # 逐篇查询作者 同一查询重复执行
+        with self.assertRaises(QueryBudgetExceeded):
+            with record_queries(limit=2):
+                for article in Article.objects.all()[:5]:
+                    article.author.username
+        with record_queries(budget=1, limit=2) as recorder:
+            for article in Article.objects.select_related('author')[:5]:
+                article.author.username
+        self.assertEqual(recorder.count, 1)
+
+
+class ImageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name,
+                                     IMAGE_CACHE_ROOT=os.path.join(self.media.name, 'cache', 'images'))
+        override.enable()
+        self.addCleanup(override.disable)
+        for cache in caches.all():
+            cache.clear()
+
+    def save(self, name, content=None, size=(800, 400)):
+        if content is None:
+            out = io.BytesIO()
+            Image.new('RGB', size, (200, 100, 50)).save(out, 'JPEG')
+            content = out.getvalue()
+        path = os.path.join(self.media.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return name
+
+    def get(self, name, width=320, fmt='webp'):
+        try:
+            return self.client.get(images.get_url(name, width, fmt))
+        except images.ImageError:
+            # 不可生成缩小版本的文件 直接请求任意hash的链接
+            return self.client.get(reverse('image', kwargs={'width': width, 'format': fmt, 'digest': '0' * 12,
+                                                            'name': name}))
+
+    def test_source_dirs(self):
+        for name in ['article/a.jpg', 'banner/a.jpg', 'summer_note/a.jpg', 'user/portrait/a.jpg']:
+            self.save(name)
+            response = self.get(name)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (320, 160))
+        for name in ['attachment/a.jpg', 'article/../attachment/a.jpg', 'cache/images/a.jpg', 'a.jpg',
+                     'article/a.txt']:
+            self.save(os.path.normpath(name))
+            self.assertFalse(images.is_source(name), name)
+            self.assertEqual(self.get(name).status_code, 404, name)
+
+    def test_source_changed(self):
+        # 原图内容变化后链接变化 旧链接重定向到新链接 旧的缩小版本被删除
+        self.save('article/a.jpg')
+        old_url = images.get_url('article/a.jpg', 320, 'webp')
+        response = self.client.get(old_url)
+        self.assertEqual(response['Cache-Control'], 'public, max-age={}'.format(settings.IMAGE_CACHE_MAX_AGE))
+        old_dir = os.path.dirname(images.get_derivative('article/a.jpg', 320, 'webp')[0])
+        self.save('article/a.jpg', size=(640, 640))
+        url = images.get_url('article/a.jpg', 320, 'webp')
+        self.assertNotEqual(url, old_url)
+        self.assertIn(url.split('/')[4], images.get_srcset('article/a.jpg', 'webp'))
+        self.assertRedirects(self.client.get(old_url), url, fetch_redirect_response=False)
+        self.assertRedirects(self.client.get('/image/320/webp/article/a.jpg'), url, fetch_redirect_response=False)
+        response = self.client.get(url)
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (320, 320))
+        self.assertFalse(os.path.exists(old_dir))
+
+    def test_invalid_images(self):
+        out = io.BytesIO()
+        Image.new('RGB', (800, 400)).save(out, 'PNG')
+        self.save('article/truncated.png', out.getvalue()[:len(out.getvalue()) // 2])
+        self.save('article/text.jpg', b'not an image')
+        self.save('article/empty.gif', b'')
+        for name in ['article/truncated.png', 'article/text.jpg', 'article/empty.gif']:
+            self.assertEqual(self.get(name).status_code, 404, name)
+            self.assertEqual(self.get(name, fmt='orig').status_code, 404, name)
+
+    def test_decompression_bomb(self):
+        self.save('article/bomb.jpg')
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            self.assertEqual(self.get('article/bomb.jpg').status_code, 404)
+        self.assertEqual(self.get('article/bomb.jpg').status_code, 200)
+
+
+@override_settings(COUNTER_FLUSH_ON_REQUEST=False)
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        category = Category.objects.create(name='python')
+        Article.objects.bulk_create([Article(author=user, category=category, title='标题{}'.format(i), tags='python',
+                                             content='<p>正文</p>', view_times=10) for i in range(5)])
+        cls.pks = list(Article.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def get_saved(self, pk):
+        return Article.objects.values_list('view_times', flat=True).get(pk=pk)
+
+    def get_total(self, pk):
+        # 页面显示的值 数据库中的值加上未写回的增量
+        return self.get_saved(pk) + counters.get_pending(Article, 'view_times', pk)
+
+    def test_flush(self):
+        pk = self.pks[0]
+        for i in range(3):
+            counters.incr(Article, 'view_times', pk)
+        self.assertEqual(counters.get_pending(Article, 'view_times', pk), 3)
+        self.assertEqual(self.get_saved(pk), 10)
+        # 第一次flush切换代 本代数据在下一次flush时写回
+        self.assertEqual(counters.flush(Article, 'view_times'), 0)
+        self.assertEqual((self.get_saved(pk), self.get_total(pk)), (10, 13))
+        counters.incr(Article, 'view_times', pk, 5)
+        self.assertEqual(counters.flush(Article, 'view_times'), 3)
+        self.assertEqual((self.get_saved(pk), self.get_total(pk)), (13, 18))
+        self.assertEqual(counters.flush(Article, 'view_times'), 5)
+        self.assertEqual((self.get_saved(pk), self.get_total(pk)), (18, 18))
+        self.assertEqual(counters.get_pending(Article, 'view_times', pk), 0)
+
+    def test_batches(self):
+        for delta, pk in enumerate(self.pks, 1):
+            counters.incr(Article, 'view_times', pk, delta)
+        counters.flush(Article, 'view_times')
+        with mock.patch.object(counters, 'BATCH_SIZE', 2), CaptureQueriesContext(connection) as context:
+            self.assertEqual(counters.flush(Article, 'view_times'), 15)
+        self.assertEqual(len([query for query in context.captured_queries if query['sql'].startswith('UPDATE')]), 3)
+        self.assertEqual([self.get_saved(pk) for pk in self.pks], [11, 12, 13, 14, 15])
+
+    def test_flush_between_incr(self):
+        # 读取代号后、写入增量前发生flush 增量写入上一代 仍计入未写回的增量并在之后写回
+        pk = self.pks[0]
+        generation = counters._generation
+
+        def flush_after_read(prefix):
+            value = generation(prefix)
+            counters.flush(Article, 'view_times')
+            return value
+
+        counters.incr(Article, 'view_times', pk)
+        with mock.patch.object(counters, '_generation', flush_after_read):
+            counters.incr(Article, 'view_times', pk)
+        self.assertEqual(self.get_total(pk), 12)
+        counters.flush(Article, 'view_times')
+        self.assertEqual(self.get_total(pk), 12)
+        counters.flush(Article, 'view_times')
+        self.assertEqual((self.get_saved(pk), self.get_total(pk)), (12, 12))
+
+    def test_concurrent_flush(self):
+        # 多个线程累加的同时不断flush 全部写回后数据库中的值等于累加总数
+        def visit(index):
+            for i in range(200):
+                counters.incr(Article, 'view_times', self.pks[(index + i) % len(self.pks)])
+
+        threads = [threading.Thread(target=visit, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        flushed = 0
+        while any(thread.is_alive() for thread in threads):
+            flushed += counters.flush(Article, 'view_times')
+            time.sleep(0.005)
+        flushed += counters.flush(Article, 'view_times') + counters.flush(Article, 'view_times')
+        self.assertEqual(flushed, 800)
+        self.assertEqual(sum(self.get_saved(pk) for pk in self.pks), 50 + 800)
+        self.assertEqual([counters.get_pending(Article, 'view_times', pk) for pk in self.pks], [0] * len(self.pks))
+
+
+class DedupTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('dedup-tests', {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 10000}})
+        self.cache.clear()
+        self.backends = [KeyDedup(cache=self.cache, window=60), SlotDedup(cache=self.cache, window=60, capacity=100)]
+
+    def run_threads(self, dedup, members):
+        # 全部线程就绪后同时调用seen()
+        barrier = threading.Barrier(len(members))
+        results = [None] * len(members)
+
+        def visit(index):
+            barrier.wait()
+            results[index] = dedup.seen('article', 1, members[index])
+
+        threads = [threading.Thread(target=visit, args=(i,)) for i in range(len(members))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_default_backend(self):
+        self.assertIsInstance(get_dedup(), SlotDedup)
+
+    def test_concurrent_same_visitor(self):
+        for dedup in self.backends:
+            for i in range(20):
+                results = self.run_threads(dedup, ['10.0.0.{}'.format(i)] * 8)
+                self.assertEqual(results.count(False), 1, (dedup, results))
+
+    def test_concurrent_new_visitors(self):
+        members = ['10.0.1.{}'.format(i) for i in range(32)]
+        for dedup in self.backends:
+            self.assertEqual(self.run_threads(dedup, members), [False] * len(members), dedup)
+            self.assertTrue(all(dedup.seen('article', 1, member) for member in members), dedup)
+            self.assertFalse(dedup.seen('article', 2, members[0]), dedup)
+
+    def test_slot_memory(self):
+        # 访客数远超capacity时缓存键数不超过表的大小 容量内的访客均被计入
+        # 固定在同一时段内 跨越时段时会新建一张表
+        dedup = SlotDedup(cache=self.cache, window=60, capacity=50)
+        with mock.patch('common.dedup.time.time', return_value=1000.0):
+            results = [dedup.seen('article', 1, '10.0.{}.{}'.format(i >> 8, i & 255)) for i in range(1000)]
+            self.assertEqual(results[:50], [False] * 50)
+            self.assertLessEqual(len(self.cache._cache), dedup.size)
+            self.assertTrue(all(dedup.seen('article', 1, '10.0.0.{}'.format(i)) for i in range(50)))
+
+    def test_slot_window(self):
+        dedup = SlotDedup(cache=self.cache, window=60)
+        with mock.patch('common.dedup.time.time', return_value=1000.0):
+            self.assertFalse(dedup.seen('article', 1, '10.0.0.1'))
+        # 下一时段仍可查到上一时段的访客
+        with mock.patch('common.dedup.time.time', return_value=1000.0 + 60):
+            self.assertTrue(dedup.seen('article', 1, '10.0.0.1'))
+        with mock.patch('common.dedup.time.time', return_value=1000.0 + 180):
+            self.assertFalse(dedup.seen('article', 1, '10.0.0.1'))
+
+    def test_cache_unavailable(self):
+        # 缓存不可用时add与get均失败 访客按未访问计数并记录日志
+        for dedup in self.backends:
+            with mock.patch.object(self.cache, 'add', return_value=0), \
+                    mock.patch.object(self.cache, 'get', return_value=None), \
+                    mock.patch.object(self.cache, 'get_many', return_value={}), \
+                    self.assertLogs('info', 'ERROR'):
+                self.assertEqual([dedup.seen('article', 1, '10.0.2.{}'.format(i)) for i in range(3)],
+                                 [False] * 3)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0, NOTIFICATION_ASYNC=False, EMAIL_OUTBOX_SEND_ON_COMMIT=False)
+class InvalidationTests(TransactionTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_site_chrome(self):
+        version = chrome.get_version()
+        with transaction.atomic():
+            Link.objects.create(name='link', url='https://example.com/')
+            self.assertEqual(chrome.get_version(), version)
+        self.assertNotEqual(chrome.get_version(), version)
+        self.assertEqual([link.name for link in chrome.get_site_chrome().links], ['link'])
+
+    def test_site_config(self):
+        # 未保存过的设置项为默认值 读取时不写入数据库
+        chrome.bump()
+        title = chrome.get_site_chrome().website_title
+        self.assertEqual(title, settings.CONSTANCE_CONFIG[settings.WEBSITE_TITLE][0])
+        self.assertFalse(Constance.objects.exists())
+        # 其它进程按同一版本号加载时不再读取设置表
+        with mock.patch('common.chrome._snapshot', None), CaptureQueriesContext(connection) as context:
+            self.assertEqual(chrome.get_site_chrome().website_title, title)
+        self.assertFalse([query for query in context.captured_queries if 'constance_config' in query['sql']])
+        # 修改设置后更新版本号 重新读取
+        put_value(settings.WEBSITE_TITLE, '新标题')
+        self.assertEqual(chrome.get_site_chrome().website_title, '新标题')
+        self.assertEqual(chrome.get_site_chrome().website_welcome,
+                         settings.CONSTANCE_CONFIG[settings.WEBSITE_WELCOME][0])
+
+    def test_feed(self):
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        category = Category.objects.create(name='python')
+        Article.objects.create(author=user, category=category, title='标题', tags='python', content='<p>正文</p>')
+        # 链接为绝对地址 不同域名分别缓存
+        for host, other in [('a.example.com', 'b.example.com'), ('b.example.com', 'a.example.com')]:
+            content = self.client.get(reverse('feed', kwargs={'format': 'rss'}), HTTP_HOST=host).content.decode()
+            self.assertIn('http://{}/'.format(host), content)
+            self.assertNotIn(other, content)
+        # 文章及网站设置变化在事务提交后使订阅失效
+        for create in [lambda: Link.objects.create(name='link', url='https://example.com/'),
+                       lambda: Article.objects.create(author=user, category=category, title='标题2', tags='python',
+                                                      content='<p>正文</p>')]:
+            version = feeds.cache.get(feeds.VERSION_KEY)
+            with transaction.atomic():
+                create()
+                self.assertEqual(feeds.cache.get(feeds.VERSION_KEY), version)
+            self.assertNotEqual(feeds.cache.get(feeds.VERSION_KEY), version)
+
+    def test_sidebar(self):
+        self.assertEqual(sidebar.get_block('latest_comment_list', 'public'), [])
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        with transaction.atomic():
+            article = Article.objects.create(author=user, category=Category.objects.create(name='python'),
+                                             title='标题', tags='python', content='<p>正文</p>')
+            Comment.objects.create(user=user, article=article, text='评论')
+            self.assertEqual(sidebar.get_block('latest_comment_list', 'public'), [])
+        self.assertEqual([comment.text for comment in sidebar.get_block('latest_comment_list', 'public')], ['评论'])
+
+    def test_sitemap(self):
+        user = User.objects.create_user('author', 'author@example.com', 'password')
+        category = Category.objects.create(name='python')
+        with tempfile.TemporaryDirectory() as root, override_settings(SITEMAP_ROOT=root, DOMAIN='www.example.com',
+                                                                       SITE_PROTOCOL='https'):
+            # 链接只使用配置的域名 与首个请求的Host无关
+            response = self.client.get(reverse('sitemap'), HTTP_HOST='evil.example.org')
+            self.assertIn(b'https://www.example.com/sitemap-article-1.xml', b''.join(response.streaming_content))
+            self.assertTrue(os.path.exists(os.path.join(root, 'sitemap.xml')))
+            with transaction.atomic():
+                article = Article.objects.create(author=user, category=category, title='标题', tags='python',
+                                                 content='<p>正文</p>')
+                self.assertTrue(os.path.exists(os.path.join(root, 'sitemap.xml')))
+            self.assertFalse(os.path.exists(os.path.join(root, 'sitemap.xml')))
+            response = self.client.get(reverse('sitemap_section', kwargs={'section': 'article', 'page': 1}),
+                                       HTTP_HOST='evil.example.org')
+            content = b''.join(response.streaming_content).decode()
+            self.assertIn('https://www.example.com{}'.format(reverse('article_detail', args=(article.pk,))), content)
+            self.assertNotIn('evil', content)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=300, COUNTER_FLUSH_ON_REQUEST=False, NOTIFICATION_ASYNC=False,
+                   EMAIL_OUTBOX_SEND_ON_COMMIT=False)
+class PageCacheTests(TransactionTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('author', 'author@example.com', 'password')
+        self.parent = Category.objects.create(name='python')
+        self.category = Category.objects.create(name='django', parent=self.parent)
+        self.other = Category.objects.create(name='go')
+        self.article = Article.objects.create(author=self.user, category=self.category, title='标题', tags='python',
+                                              content='<p>正文</p>')
+        self.column = Column.objects.create(name='专栏', summary='专栏')
+        self.column.article.add(self.article)
+        self.other_column = Column.objects.create(name='其它专栏', summary='专栏')
+
+    def get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, url)
+        return response.get('X-Page-Cache')
+
+    def test_anonymous(self):
+        url = reverse('article_detail', args=(self.article.pk,))
+        self.assertEqual(self.get(url), 'miss')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(url), 'hit')
+
+    def test_logged_in(self):
+        url = reverse('article_detail', args=(self.article.pk,))
+        self.assertEqual(self.get(url), 'miss')
+        self.client.force_login(self.user)
+        self.assertIsNone(self.get(url))
+        self.assertIsNone(self.get(url))
+
+    def test_query_order(self):
+        url = reverse('article_index')
+        self.assertEqual(self.get('{}?category={}&tag=python'.format(url, self.category.pk)), 'miss')
+        # 参数顺序不同、空参数视为同一页面
+        self.assertEqual(self.get('{}?tag=python&category={}'.format(url, self.category.pk)), 'hit')
+        self.assertEqual(self.get('{}?tag=python&search=&category={}'.format(url, self.category.pk)), 'hit')
+        self.assertEqual(self.get('{}?tag=go&category={}'.format(url, self.category.pk)), 'miss')
+
+    def test_article_saved(self):
+        url = reverse('article_index')
+        purged = [reverse('article_detail', args=(self.article.pk,)), url, reverse('article_all'),
+                  '{}?category={}'.format(url, self.category.pk), '{}?category={}'.format(url, self.parent.pk),
+                  reverse('column_detail', args=(self.column.pk,))]
+        kept = ['{}?category={}'.format(url, self.other.pk), reverse('column_detail', args=(self.other_column.pk,))]
+        for page in purged + kept:
+            self.get(page)
+        with transaction.atomic():
+            self.article.title = '新标题'
+            self.article.save()
+            # 提交前仍使用缓存
+            for page in purged + kept:
+                self.assertEqual(self.get(page), 'hit', page)
+        for page in purged:
+            self.assertEqual(self.get(page), 'miss', page)
+        for page in kept:
+            self.assertEqual(self.get(page), 'hit', page)
+
+    def test_count_view(self):
+        url = reverse('article_detail', args=(self.article.pk,))
+        self.assertEqual(self.get(url, REMOTE_ADDR='10.0.0.1'), 'miss')
+        self.assertEqual(self.get(url, REMOTE_ADDR='10.0.0.2'), 'hit')
+        self.assertEqual(self.get(url, REMOTE_ADDR='10.0.0.2'), 'hit')
+        self.assertEqual(counters.get_pending(Article, 'view_times', self.article.pk), 2)
@@ -1,8 +1,16 @@
 import os
+import tempfile
 from constance import LazyConfig
 from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
 from django.core.exceptions import ValidationError
 
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
 config = LazyConfig()
 
 
@@ -25,6 +33,33 @@ def get_value(key):
     return getattr(config, key)
 
 
+def get_values(*keys):
+    """
+    一次查询获取多个数据库设置项值 直接读取constance数据库后端的设置表
+    :param keys: 键名
+    :return: {键名: 值} 未保存过的设置项为默认值 不写入数据库
+    """
+    from constance.backends.database.models import Constance
+
+    prefix = getattr(settings, 'CONSTANCE_DATABASE_PREFIX', '')
+    values = dict(Constance.objects.filter(key__in=[prefix + key for key in keys]).values_list('key', 'value'))
+    return {key: settings.CONSTANCE_CONFIG[key][0] if values.get(prefix + key) is None else values[prefix + key]
+            for key in keys}
+
+
+def get_cache():
+    """
+    获取缓存 优先使用memcache 不可用时退回默认缓存
+    :return: 缓存实例
+    """
+    try:
+        return caches['memcache']
+    except (ImportError, InvalidCacheBackendError) as e:
+        # 默认缓存为进程内缓存 多进程部署时各进程之间不共享
+        logger.warning(u'[get_cache]memcache不可用 使用默认缓存 {}'.format(e))
+        return caches['default']
+
+
 def get_time_filename(filename):
     """
     将文件名修改为 年月日-时分秒-毫秒 格式
@@ -75,3 +110,24 @@ def sizeof_fmt(num, suffix='B'):
             return "%3.1f%s%s" % (num, unit, suffix)
         num /= 1024.0
     return "%.1f%s%s" % (num, 'Yi', suffix)
+
+
+def write_file_atomic(path, content):
+    """
+    先写入同目录下的临时文件再替换 读取方不会读到不完整的文件
+    :param path: 文件路径
+    :param content: bytes
+    :return: 无返回
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
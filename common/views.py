@@ -1,18 +1,21 @@
-from django.db.models import Q
 from django.conf import settings
 from django.shortcuts import render
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.core.paginator import EmptyPage
 from django.views.generic import TemplateView, ListView
 from django.views.generic.base import ContextMixin
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.middleware.csrf import get_token
 
-from common.utils import get_value
+from common.chrome import get_site_chrome
+from common.sidebar import get_sidebar
+from common import sitemaps, pagecache, images
+from common.querybudget import query_budget
+from search.utils import search_queryset
 
-from article.models import Article, Comment
+from article.models import Article
 from article.filters import ArticleFilter
-from banner.models import Banner
-from navbar.models import NavBar
-from link.models import Link
 
 # logger
 import logging
@@ -23,19 +26,20 @@ logger = logging.getLogger("info")
 class BaseContextMixin(ContextMixin):
     def get_context_data(self, *args, **kwargs):
         try:
+            site_chrome = get_site_chrome()
             # 网站标题等内容
-            kwargs['website_title'] = get_value(settings.WEBSITE_TITLE)
-            kwargs['website_welcome'] = get_value(settings.WEBSITE_WELCOME)
+            kwargs['website_title'] = site_chrome.website_title
+            kwargs['website_welcome'] = site_chrome.website_welcome
             # SEO
-            kwargs['website_seo_keyword'] = get_value(settings.WEBSITE_SEO_KEYWORD)
-            kwargs['website_seo_description'] = get_value(settings.WEBSITE_SEO_DESCRIPTION)
+            kwargs['website_seo_keyword'] = site_chrome.website_seo_keyword
+            kwargs['website_seo_description'] = site_chrome.website_seo_description
             # 导航条
-            kwargs['nav_list'] = NavBar.objects.all()
+            kwargs['nav_list'] = site_chrome.nav_list
             if hasattr(self, 'request') and hasattr(self.request, 'user'):
                 # 用户未读消息数
                 user = self.request.user
                 if user.is_authenticated:
-                    kwargs['notification_count'] = user.to_user_notification_set.filter(is_read=0).count()
+                    kwargs['notification_count'] = user.unread_notification_count
                 # 搜索框默认输入选项
                 kwargs['search'] = self.request.GET.get('search', '')
         except Exception as e:
@@ -43,64 +47,150 @@ class BaseContextMixin(ContextMixin):
         return super(BaseContextMixin, self).get_context_data(**kwargs)
 
 
-class BaseMixin(BaseContextMixin):
+class SidebarMixin(BaseContextMixin):
+    def get_context_data(self, *args, **kwargs):
+        try:
+            # 热门文章、最新评论、动态标签云
+            kwargs.update(get_sidebar(self.request.user))
+            # 友情链接
+            kwargs['links'] = get_site_chrome().links
+        except Exception as e:
+            logger.error(u'[SidebarMixin]加载侧边栏出错 {}'.format(e))
+        return super(SidebarMixin, self).get_context_data(**kwargs)
+
+
+class PageCacheMixin(object):
+    """
+    匿名用户整页缓存 见common.pagecache
+    """
+
+    def get_page_cache_tags(self):
+        """
+        :return: 页面依赖的标签 在视图执行后调用
+        """
+        return []
+
+    def page_cache_hit(self, request):
+        # 命中缓存时仍需执行的逻辑 如统计浏览次数
+        pass
+
+    def dispatch(self, request, *args, **kwargs):
+        if not pagecache.is_cacheable(request):
+            return super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+        response = pagecache.get_response(request)
+        if response is not None:
+            # 与ensure_csrf_cookie相同 保证AJAX请求可以取得CSRF cookie
+            get_token(request)
+            self.page_cache_hit(request)
+            return response
+        response = super(PageCacheMixin, self).dispatch(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        pagecache.set_response(request, response, self.get_page_cache_tags())
+        return response
+
+
+class ArticleSearchMixin(ContextMixin):
+    search_hits = None
+
+    def search_articles(self, articles):
+        """
+        全文搜索 结果按相关度排序
+        :param articles: 文章QuerySet
+        :return: 命中的文章QuerySet
+        """
+        search = self.request.GET.get('search', '').strip()
+        if not search:
+            return articles
+        public_only = not self.request.user.has_perm('article.view_article')
+        articles, self.search_hits = search_queryset(articles, search, public_only=public_only)
+        return articles
+
+    def get_context_data(self, **kwargs):
+        context = super(ArticleSearchMixin, self).get_context_data(**kwargs)
+        # 搜索结果显示命中位置附近的摘要
+        if self.search_hits:
+            for article in context.get('article_list') or []:
+                hit = self.search_hits.get(article.id)
+                article.search_snippet = hit.snippet if hit else None
+        return context
+
+
+class BaseMixin(ArticleSearchMixin, SidebarMixin):
+    # 只查询列表模板用到的字段 需要正文的视图设为False
+    list_projection = True
+
     def get_queryset(self):
         articles = Article.public.filter(status=0).all()
 
+        if hasattr(self, 'request') and self.request.user.has_perm('article.view_article'):
+            articles = Article.objects.all()
+        if self.list_projection:
+            articles = articles.for_list()
         if hasattr(self, 'request'):
-            if self.request.user.has_perm('article.view_article'):
-                articles = Article.objects.all()
-            if 'search' in self.request.GET:
-                search = self.request.GET.get('search')
-                articles = articles.filter(
-                    Q(title__icontains=search) |
-                    Q(summary__icontains=search) |
-                    Q(tags__icontains=search)
-                )
             articles = ArticleFilter(self.request.GET, queryset=articles).qs
+            if self.request.GET.get('search', '').strip():
+                return self.search_articles(articles)
         return articles.order_by('-is_top', '-publish_time')
 
-    def get_context_data(self, *args, **kwargs):
-        try:
-            articles = self.get_queryset()
-            # 热门文章
-            kwargs['hot_article_list'] = articles.order_by("-view_times")[:10]
-            # 最新评论
-            kwargs['latest_comment_list'] = Comment.objects.filter(article__in=articles).order_by("-id")[0:6]
-            # 友情链接
-            kwargs['links'] = Link.objects.order_by('create_time').all()
-            # 动态标签云
-            tags = []
-            for article in kwargs['hot_article_list']:
-                tags.extend(article.get_tags())
-            kwargs['tags'] = list(set(tags))
-            colors = ['primary', 'success', 'info', 'warning', 'danger']
-            for index, link in enumerate(kwargs['links']):
-                link.color = colors[index % len(colors)]
-        except Exception as e:
-            logger.error(u'[BaseMixin]加载基本信息出错 {}'.format(e))
-        return super(BaseMixin, self).get_context_data(**kwargs)
-
     @method_decorator(ensure_csrf_cookie)
     def dispatch(self, *args, **kwargs):
         # 使用ensure_csrf_cookie确保CSRF cookie在html内无表单时在浏览器中依旧被设置
         return super(BaseMixin, self).dispatch(*args, **kwargs)
 
 
-class IndexView(BaseMixin, ListView):
+class IndexView(PageCacheMixin, BaseMixin, ListView):
     template_name = 'index.html'
     context_object_name = 'article_list'
     paginate_by = settings.PAGE_NUM
+    query_budget = 15
+
+    def get_page_cache_tags(self):
+        return ['articles']
 
     def get_context_data(self, **kwargs):
         kwargs['nav_index'] = 'index'
         # 轮播
-        kwargs['banner_list'] = Banner.objects.all()
+        kwargs['banner_list'] = get_site_chrome().banner_list
         return super(IndexView, self).get_context_data(**kwargs)
 
 
 class VersionView(BaseContextMixin, TemplateView):
     template_name = 'common/version.html'
+    query_budget = 10
+
+
+# 站点地图索引 读取已生成的文件 不存在时生成
+@query_budget(12)
+def sitemap_index(request):
+    return FileResponse(open(sitemaps.get_index_path(), 'rb'), content_type='application/xml')
+
+
+# 站点地图分页
+@query_budget(5)
+def sitemap_section(request, section, page):
+    if section not in sitemaps.sitemaps:
+        raise Http404
+    try:
+        path = sitemaps.get_section_path(section, int(page))
+    except EmptyPage:
+        raise Http404
+    return FileResponse(open(path, 'rb'), content_type='application/xml')
+
+
+# 响应式图片 首次请求时生成
+@query_budget(0)
+def image_view(request, width, format, name, digest=None):
+    try:
+        path, current = images.get_derivative(name, int(width), format)
+    except images.ImageError:
+        raise Http404
+    if digest != current:
+        # 原图内容已变化 重定向到新链接
+        return HttpResponseRedirect(images.get_url(name, width, format, current))
+    response = FileResponse(open(path, 'rb'), content_type=images.get_content_type(path))
+    response['Cache-Control'] = 'public, max-age={}'.format(settings.IMAGE_CACHE_MAX_AGE)
+    return response
 
 
 # 400页面
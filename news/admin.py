@@ -1,10 +1,18 @@
 from django.contrib import admin
 from django_summernote.admin import SummernoteModelAdmin
-from .models import News
+from .models import News, NewsArchive
 
 
 class NewsAdmin(SummernoteModelAdmin):
     search_fields = ('title', 'summary')
     list_filter = ('source', 'create_time')
     list_display = ('title', 'source', 'url', 'create_time')
+
+
+class NewsArchiveAdmin(admin.ModelAdmin):
+    list_display = ('date', 'count')
+    readonly_fields = ('date', 'count')
+
+
 admin.site.register(News, NewsAdmin)
+admin.site.register(NewsArchive, NewsArchiveAdmin)
@@ -5,3 +5,5 @@ class NewsConfig(AppConfig):
     name = 'news'
     verbose_name = '新闻'
 
+    def ready(self):
+        from . import signals
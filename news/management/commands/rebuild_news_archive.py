@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from news.utils import rebuild_archive
+
+
+class Command(BaseCommand):
+    help = '根据新闻表重新计算每天的新闻数'
+
+    def handle(self, *args, **options):
+        count = rebuild_archive()
+        self.stdout.write('已归档{}天的新闻'.format(count))
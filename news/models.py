@@ -18,6 +18,7 @@ class News(models.Model):
                           verbose_name='源地址')
     # 发布时间
     publish_time = models.DateTimeField(default=datetime.now,
+                                        db_index=True,
                                         verbose_name='发布时间')
     # 创建时间
     create_time = models.DateTimeField(auto_now_add=True,
@@ -36,3 +37,21 @@ class News(models.Model):
 
     def __str__(self):
         return self.title
+
+
+# 新闻归档 每天的新闻数 由signal维护
+class NewsArchive(models.Model):
+    # 日期
+    date = models.DateField(unique=True,
+                            verbose_name='日期')
+    # 新闻数
+    count = models.IntegerField(default=0,
+                                verbose_name='新闻数')
+
+    class Meta:
+        verbose_name_plural = '新闻归档'
+        verbose_name = '新闻归档'
+        ordering = ['-date']
+
+    def __str__(self):
+        return '{} {}'.format(self.date, self.count)
@@ -0,0 +1,29 @@
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .models import News
+from .utils import change_archive_count
+
+
+# 维护新闻归档 QuerySet.update()/bulk_create()不会触发以下signal 需执行rebuild_news_archive
+@receiver(pre_save, sender=News)
+def news_pre_save(sender, instance, raw=False, **kwargs):
+    instance._old_date = None
+    if not instance._state.adding and not raw:
+        old = News.objects.filter(pk=instance.pk).values_list('publish_time', flat=True).first()
+        instance._old_date = old.date() if old else None
+
+
+@receiver(post_save, sender=News)
+def news_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old, new = getattr(instance, '_old_date', None), instance.publish_time.date()
+    if old != new:
+        change_archive_count(old, -1)
+        change_archive_count(new, 1)
+
+
+@receiver(post_delete, sender=News)
+def news_post_delete(sender, instance, **kwargs):
+    change_archive_count(instance.publish_time.date(), -1)
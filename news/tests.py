@@ -1,3 +1,20 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class NewsRangeTests(TestCase):
+    def test_timeline_out_of_range(self):
+        for query in ['start=1000000', 'start=1000000&end=1000010', 'start=-5&end=99999999999999999999',
+                      'start=abc', 'end=' + '9' * 30]:
+            response = self.client.get('{}?{}'.format(reverse('news_index'), query))
+            self.assertEqual(response.status_code, 200, query)
+
+    def test_archive_out_of_range(self):
+        for kwargs in [{'year': 9999, 'month': 12}, {'year': 9999, 'month': 12, 'day': 31}, {'year': 2017, 'month': 13},
+                       {'year': 2017, 'month': 2, 'day': 30}]:
+            name = 'news_archive_day' if 'day' in kwargs else 'news_archive_month'
+            response = self.client.get(reverse(name, kwargs=kwargs))
+            self.assertEqual(response.status_code, 404, kwargs)
+        response = self.client.get(reverse('news_archive_month', kwargs={'year': 9999, 'month': 11}))
+        self.assertEqual(response.status_code, 200)
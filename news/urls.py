@@ -5,4 +5,8 @@ from .views import *
 urlpatterns = [
     url(r'^$', NewsView.as_view(), name='news_index'),
     url(r'^(?P<pk>\d+)/$', NewsDetailView.as_view(), name='news_detail'),
+    url(r'^archive/$', NewsArchiveView.as_view(), name='news_archive'),
+    url(r'^archive/(?P<year>\d{4})/(?P<month>\d{1,2})/$', NewsView.as_view(), name='news_archive_month'),
+    url(r'^archive/(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})/$', NewsView.as_view(),
+        name='news_archive_day'),
 ]
@@ -0,0 +1,28 @@
+from django.db.models import F, Count
+from django.db.models.functions import TruncDate
+
+from .models import News, NewsArchive
+
+
+def change_archive_count(date, delta):
+    """
+    原子修改某天的新闻数
+    :param date: 日期
+    :param delta: 增量 可为负数
+    :return: 无返回
+    """
+    if date and delta:
+        NewsArchive.objects.get_or_create(date=date)
+        NewsArchive.objects.filter(date=date).update(count=F('count') + delta)
+
+
+def rebuild_archive():
+    """
+    根据新闻表重新计算每天的新闻数
+    :return: 归档的天数
+    """
+    counts = News.objects.annotate(date=TruncDate('publish_time')).order_by().values(
+        'date').annotate(count=Count('pk')).values_list('date', 'count')
+    NewsArchive.objects.all().delete()
+    NewsArchive.objects.bulk_create([NewsArchive(date=date, count=count) for date, count in counts])
+    return NewsArchive.objects.count()
@@ -1,47 +1,88 @@
-from datetime import timedelta
+import calendar
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from collections import OrderedDict
 
+from django.conf import settings
+from django.http import Http404
 from django.views.generic import TemplateView, DetailView
-from common.views import BaseContextMixin
+from common.views import BaseContextMixin, PageCacheMixin
 from .models import *
 
 # logger
 import logging
 logger = logging.getLogger("info")
 
+# 时间线最早可查看的天数 超出后timedelta溢出
+MAX_START_DAY = 100 * 365
+
 
 class NewsView(BaseContextMixin, TemplateView):
     template_name = 'news/news.html'
+    query_budget = 10
+
+    def get_range(self):
+        """
+        :return: (起始时间, 结束时间) 左闭右开
+        """
+        year, month, day = self.kwargs.get('year'), self.kwargs.get('month'), self.kwargs.get('day')
+        if year:
+            # 归档 某月或某天
+            try:
+                if day:
+                    start = datetime(int(year), int(month), int(day))
+                    return start, start + timedelta(1)
+                start = datetime(int(year), int(month), 1)
+                return start, start + timedelta(calendar.monthrange(start.year, start.month)[1])
+            except (ValueError, OverflowError):
+                # 9999年12月等超出datetime范围
+                raise Http404
+
+        # 获取开始和终止的日期 相对今天的天数 范围不超过NEWS_TIMELINE_MAX_DAYS天
+        try:
+            start_day = min(max(int(self.request.GET.get("start", 0)), 0), MAX_START_DAY)
+            end_day = int(self.request.GET.get("end", 6))
+        except (ValueError, OverflowError):
+            start_day, end_day = 0, 6
+        end_day = min(max(end_day, start_day), start_day + settings.NEWS_TIMELINE_MAX_DAYS - 1)
+        self.active = start_day // 7
+        today = datetime.combine(date.today(), time.min)
+        return today - timedelta(end_day), today - timedelta(start_day - 1)
 
     def get_context_data(self, **kwargs):
-        timeblocks = []
-
-        # 获取开始和终止的日期
-        start_day = self.request.GET.get("start", "0")
-        end_day = self.request.GET.get("end", "6")
-        start_day = int(start_day)
-        end_day = int(end_day)
-
-        start_date = datetime.now()
-
-        # 获取url中时间断的资讯
-        for x in range(start_day, end_day + 1):
-            date = start_date - timedelta(x)
-            news_list = News.objects.filter(
-                publish_time__year=date.year,
-                publish_time__month=date.month,
-                publish_time__day=date.day
-            )
-            if news_list:
-                timeblocks.append(news_list)
+        self.active = None
+        start, end = self.get_range()
+
+        # 一次范围查询 按天分组
+        news_list = News.objects.filter(publish_time__gte=start, publish_time__lt=end).only(
+            'id', 'title', 'source', 'publish_time').order_by('-publish_time', '-id')
+        timeblocks = [list(news) for day, news in groupby(news_list, key=lambda news: news.publish_time.date())]
 
         kwargs['timeblocks'] = timeblocks
-        kwargs['active'] = start_day / 7  # li中那个显示active
+        kwargs['active'] = self.active  # li中那个显示active
 
         return super(NewsView, self).get_context_data(**kwargs)
 
 
-class NewsDetailView(BaseContextMixin, DetailView):
+class NewsArchiveView(BaseContextMixin, TemplateView):
+    template_name = 'news/archive.html'
+    query_budget = 10
+
+    def get_context_data(self, **kwargs):
+        # 按月分组 [(月份第一天, 当月新闻数, [NewsArchive, ...]), ...]
+        months = OrderedDict()
+        for archive in NewsArchive.objects.filter(count__gt=0).order_by('-date'):
+            months.setdefault(archive.date.replace(day=1), []).append(archive)
+        kwargs['archive_list'] = [(month, sum(day.count for day in days), days) for month, days in months.items()]
+        return super(NewsArchiveView, self).get_context_data(**kwargs)
+
+
+class NewsDetailView(PageCacheMixin, BaseContextMixin, DetailView):
     queryset = News.objects.all()
     slug_field = 'id'
     context_object_name = 'news'
     template_name = 'news/news_detail.html'
+    query_budget = 10
+
+    def get_page_cache_tags(self):
+        return ['news:{}'.format(self.object.pk)]
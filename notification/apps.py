@@ -5,3 +5,5 @@ class NotificationConfig(AppConfig):
     name = 'notification'
     verbose_name = '通知'
 
+    def ready(self):
+        from . import signals
@@ -0,0 +1,171 @@
+"""
+通知异步分发
+
+产生通知的请求只调用 enqueue(kind, *args)，事务提交后将任务放入进程内队列，
+由后台线程按 NOTIFICATION_BATCH_SIZE 条或 NOTIFICATION_BATCH_WAIT 秒凑成一批，
+调用 register() 登记的生成函数构造通知，再在一个事务中以一次 bulk_create 写入并更新未读消息数。
+bulk_create 不会触发 notification.signals，未读消息数在此处自行维护。
+整批写入失败时按 NOTIFICATION_RETRY_DELAYS 重试，仍失败时逐个任务写入，只丢弃无法写入的任务。
+
+队列只存在于进程内存中，进程被强制结束时尚未写入的通知会丢失；
+队列已满或 NOTIFICATION_ASYNC = False 时在当前线程中直接写入。
+"""
+import atexit
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+
+from .models import Notification
+from .utils import change_unread_count
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+_builders = {}
+_queue = queue.Queue(maxsize=settings.NOTIFICATION_QUEUE_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def register(kind):
+    """
+    登记通知生成函数 生成函数接收同类任务的参数列表 返回未保存的Notification列表
+    :param kind: 通知类型
+    :return: 装饰器
+    """
+
+    def decorator(func):
+        _builders[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(kind, *args):
+    """
+    当前事务提交后生成通知 事务回滚时丢弃
+    :param kind: 通知类型 需已登记生成函数
+    :param args: 传给生成函数的参数
+    :return: 无返回
+    """
+    if kind not in _builders:
+        raise ValueError('通知类型 {} 未登记'.format(kind))
+    transaction.on_commit(lambda: _put((kind, args)))
+
+
+def _put(task):
+    if not settings.NOTIFICATION_ASYNC:
+        process([task])
+        return
+    _start_worker()
+    try:
+        _queue.put_nowait(task)
+    except queue.Full:
+        logger.error(u'[notification]队列已满 直接写入 {}'.format(task))
+        process([task])
+
+
+def process(tasks):
+    """
+    生成并批量写入一批通知
+    :param tasks: [(kind, args), ...]
+    :return: 写入的通知数
+    """
+    grouped = defaultdict(list)
+    for kind, args in tasks:
+        grouped[kind].append(args)
+    notifications = []
+    for kind, args_list in grouped.items():
+        notifications.extend(_builders[kind](args_list))
+    if not notifications:
+        return 0
+    unread = Counter(notification.to_user_id for notification in notifications if not notification.is_read)
+    # 通知与未读消息数同时写入或同时回滚
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=settings.NOTIFICATION_BATCH_SIZE)
+        for user_id, count in unread.items():
+            change_unread_count(user_id, count)
+    return len(notifications)
+
+
+def write(tasks):
+    """
+    写入一批通知 失败时重试 仍失败时逐个任务写入
+    :param tasks: [(kind, args), ...]
+    :return: 写入的通知数
+    """
+    for delay in settings.NOTIFICATION_RETRY_DELAYS:
+        try:
+            return process(tasks)
+        except Exception as e:
+            logger.warning(u'[notification]写入通知失败 {}秒后重试 {}'.format(delay, e))
+            time.sleep(delay)
+            close_old_connections()
+    try:
+        return process(tasks)
+    except Exception:
+        if len(tasks) == 1:
+            logger.exception(u'[notification]写入通知失败 丢弃任务 {}'.format(tasks[0]))
+            return 0
+        logger.exception(u'[notification]写入通知失败 逐个写入{}个任务'.format(len(tasks)))
+    count = 0
+    for task in tasks:
+        try:
+            count += process([task])
+        except Exception:
+            logger.exception(u'[notification]写入通知失败 丢弃任务 {}'.format(task))
+    return count
+
+
+def _next_batch():
+    tasks = [_queue.get()]
+    deadline = time.time() + settings.NOTIFICATION_BATCH_WAIT
+    while len(tasks) < settings.NOTIFICATION_BATCH_SIZE:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            tasks.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return tasks
+
+
+def _run():
+    while True:
+        tasks = _next_batch()
+        try:
+            close_old_connections()
+            write(tasks)
+        finally:
+            for _ in tasks:
+                _queue.task_done()
+
+
+def _start_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='notification-dispatch', daemon=True)
+            _worker.start()
+
+
+def flush():
+    """
+    等待队列中的任务全部写入
+    :return: 无返回
+    """
+    if _worker is not None and _worker.is_alive():
+        _queue.join()
+
+
+# 进程正常退出前写入剩余通知
+atexit.register(flush)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from notification.utils import rebuild_unread_count
+
+
+class Command(BaseCommand):
+    help = '根据通知表重新计算全部用户的未读消息数'
+
+    def handle(self, *args, **options):
+        count = rebuild_unread_count()
+        self.stdout.write('已更新{}个用户的未读消息数'.format(count))
@@ -50,6 +50,12 @@ class Notification(models.Model):
         verbose_name = '通知'
         verbose_name_plural = '通知'
         ordering = ['-create_time']
+        indexes = [
+            # 统计未读消息数
+            models.Index(fields=['to_user', 'is_read']),
+            # 消息通知页按时间倒序
+            models.Index(fields=['to_user', 'create_time']),
+        ]
 
 
 
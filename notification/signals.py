@@ -0,0 +1,29 @@
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .models import Notification
+from .utils import change_unread_count
+
+
+# 维护用户未读消息数 QuerySet.update()/bulk_create()不会触发以下signal 需自行调用change_unread_count
+@receiver(pre_save, sender=Notification)
+def notification_pre_save(sender, instance, **kwargs):
+    instance._unread_owner = None
+    if not instance._state.adding:
+        old = Notification.objects.filter(pk=instance.pk).values('to_user_id', 'is_read').first()
+        if old and not old['is_read']:
+            instance._unread_owner = old['to_user_id']
+
+
+@receiver(post_save, sender=Notification)
+def notification_post_save(sender, instance, **kwargs):
+    owner = instance.to_user_id if not instance.is_read else None
+    if owner != instance._unread_owner:
+        change_unread_count(instance._unread_owner, -1)
+        change_unread_count(owner, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_post_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        change_unread_count(instance.to_user_id, -1)
@@ -1,3 +1,196 @@
-from django.test import TestCase
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from article.models import Article, Category, Comment
+from user.models import User
+
+from . import dispatch
+from .models import Notification
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password')
+
+    def create(self, to_user=None, **kwargs):
+        return Notification.objects.create(title='通知', text='内容', url='/url/', to_user=to_user or self.user,
+                                           **kwargs)
+
+    def assertUnread(self, user_count, other_count=0):
+        counts = dict(User.objects.values_list('id', 'unread_notification_count'))
+        self.assertEqual((counts[self.user.pk], counts[self.other.pk]), (user_count, other_count))
+
+    def test_create(self):
+        self.create()
+        self.create()
+        self.create(is_read=1)
+        self.assertUnread(2)
+
+    def test_mark_read(self):
+        notification = self.create()
+        self.create()
+        notification.is_read = 1
+        notification.save()
+        self.assertUnread(1)
+        # 重复标记为已读不再减少
+        notification.save()
+        self.assertUnread(1)
+        notification.is_read = 0
+        notification.save()
+        self.assertUnread(2)
+        # 改为发给其他用户
+        notification.to_user = self.other
+        notification.save()
+        self.assertUnread(1, 1)
+
+    def test_delete(self):
+        unread = self.create()
+        read = self.create(is_read=1)
+        self.create()
+        read.delete()
+        self.assertUnread(2)
+        unread.delete()
+        self.assertUnread(1)
+
+    def test_view_mark_read(self):
+        notification = self.create()
+        self.create()
+        others = self.create(to_user=self.other)
+        self.client.force_login(self.user)
+        for i in range(2):
+            response = self.client.post(reverse('user_notification'), {'notification_id': notification.pk})
+            self.assertEqual(json.loads(response.content.decode()), {'url': '/url/'})
+            self.assertUnread(1, 1)
+        # 不能标记其他用户的通知
+        response = self.client.post(reverse('user_notification'), {'notification_id': others.pk})
+        self.assertEqual(json.loads(response.content.decode()), {'url': '#'})
+        self.assertEqual(Notification.objects.get(pk=others.pk).is_read, 0)
+        self.assertUnread(1, 1)
+
+    def test_rebuild(self):
+        self.create()
+        self.create()
+        self.create(is_read=1)
+        self.create(to_user=self.other, is_read=1)
+        # update()不会触发signal 未读消息数与通知表不一致
+        Notification.objects.filter(to_user=self.user).update(is_read=0)
+        User.objects.filter(pk=self.other.pk).update(unread_notification_count=5)
+        self.assertUnread(2, 5)
+        out = io.StringIO()
+        call_command('rebuild_unread_count', stdout=out)
+        self.assertUnread(3, 0)
+        self.assertIn('已更新2个用户', out.getvalue())
+
+
+def build_test_notifications(args_list):
+    # 参数为None的任务无法生成通知
+    notifications = []
+    for user_id, title in args_list:
+        if title is None:
+            raise ValueError('无效的任务')
+        notifications.append(Notification(title=title, text='内容', to_user_id=user_id))
+    return notifications
+
+
+@override_settings(NOTIFICATION_RETRY_DELAYS=[0, 0])
+class DispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+    def setUp(self):
+        patcher = mock.patch.dict(dispatch._builders, {'test': build_test_notifications})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_unread_count(self):
+        return User.objects.values_list('unread_notification_count', flat=True).get(pk=self.user.pk)
+
+    def test_process(self):
+        tasks = [('test', (self.user.pk, '通知{}'.format(i))) for i in range(3)]
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(dispatch.process(tasks), 3)
+        # 一条INSERT写入全部通知 一条UPDATE更新未读消息数
+        self.assertEqual([query['sql'].split()[0] for query in context.captured_queries
+                          if 'SAVEPOINT' not in query['sql']], ['INSERT', 'UPDATE'])
+        self.assertEqual(Notification.objects.filter(to_user=self.user).count(), 3)
+        self.assertEqual(self.get_unread_count(), 3)
+
+    def test_process_atomic(self):
+        # 更新未读消息数失败时通知一并回滚
+        with mock.patch('notification.dispatch.change_unread_count', side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                dispatch.process([('test', (self.user.pk, '通知'))])
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.get_unread_count(), 0)
+
+    def test_write_retry(self):
+        # 首次写入时数据库被锁 重试后写入
+        process = dispatch.process
+        failures = [OperationalError('locked')]
+
+        def flaky(tasks):
+            if failures:
+                raise failures.pop()
+            return process(tasks)
+
+        with mock.patch('notification.dispatch.process', flaky), self.assertLogs('info', 'WARNING'):
+            self.assertEqual(dispatch.write([('test', (self.user.pk, '通知'))]), 1)
+        self.assertEqual(self.get_unread_count(), 1)
+
+    def test_write_bad_task(self):
+        # 一个任务出错时其余任务逐个写入 只丢弃出错的任务
+        tasks = [('test', (self.user.pk, '通知1')), ('test', (self.user.pk, None)), ('test', (self.user.pk, '通知2'))]
+        with self.assertLogs('info', 'ERROR') as logs:
+            self.assertEqual(dispatch.write(tasks), 2)
+        self.assertIn('丢弃任务', logs.output[-1])
+        self.assertEqual(sorted(Notification.objects.values_list('title', flat=True)), ['通知1', '通知2'])
+        self.assertEqual(self.get_unread_count(), 2)
+
+
+@override_settings(NOTIFICATION_ASYNC=True, NOTIFICATION_BATCH_WAIT=0.05, PAGE_CACHE_TIMEOUT=0)
+class EnqueueTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'password')
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.article = Article.objects.create(author=self.author, category=Category.objects.create(name='python'),
+                                              title='标题' * 60, tags='python', content='<p>正文</p>')
+        self.comment = Comment.objects.create(user=self.author, article=self.article, text='评论')
+
+    def reply(self):
+        return Comment.objects.create(user=self.user, article=self.article, parent=self.comment, text='回复')
+
+    def test_reply_on_commit(self):
+        with transaction.atomic():
+            self.reply()
+            dispatch.flush()
+            self.assertFalse(Notification.objects.exists())
+        dispatch.flush()
+        notification = Notification.objects.get()
+        self.assertEqual((notification.from_user_id, notification.to_user_id), (self.user.pk, self.author.pk))
+        # 文章标题过长时截断
+        self.assertEqual(len(notification.title), 100)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_notification_count, 1)
+
+    def test_rollback_discards(self):
+        try:
+            with transaction.atomic():
+                self.reply()
+                raise ValueError
+        except ValueError:
+            pass
+        dispatch.flush()
+        self.assertFalse(Notification.objects.exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_notification_count, 0)
@@ -0,0 +1,30 @@
+from django.db.models import F, Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+from django.contrib.auth import get_user_model
+
+from .models import Notification
+
+
+def change_unread_count(user_id, delta):
+    """
+    原子修改用户未读消息数
+    :param user_id: 用户id
+    :param delta: 增量 可为负数
+    :return: 无返回
+    """
+    if user_id and delta:
+        get_user_model().objects.filter(pk=user_id).update(
+            unread_notification_count=F('unread_notification_count') + delta)
+
+
+def rebuild_unread_count(users=None):
+    """
+    根据通知表重新计算未读消息数 一条UPDATE完成
+    :param users: 需要重新计算的用户QuerySet 默认全部用户
+    :return: 更新的用户数
+    """
+    if users is None:
+        users = get_user_model().objects.all()
+    unread = Notification.objects.filter(to_user=OuterRef('pk'), is_read=0).order_by().values(
+        'to_user').annotate(count=Count('pk')).values('count')
+    return users.update(unread_notification_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0))
@@ -0,0 +1,96 @@
+"""
+搜索后端
+
+后端由settings.SEARCH_BACKEND指定 需实现index/remove/clear/search。
+"""
+from collections import namedtuple, Counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from search.text import tokenize, query_terms, make_snippet
+
+# 搜索结果
+Hit = namedtuple('Hit', ['kind', 'object_id', 'title', 'score', 'snippet'])
+
+# 字段权重 标题中的词按3次计算
+FIELD_WEIGHTS = {
+    'title': 3,
+    'tags': 2,
+    'summary': 1,
+    'content': 1,
+}
+
+# BM25参数
+K1 = 1.2
+B = 0.75
+
+
+class BaseBackend(object):
+    def index(self, kind, object_id, is_public, title, fields):
+        """
+        新增或更新文档
+        :param kind: 类型
+        :param object_id: 对象id
+        :param is_public: 对未授权用户可见
+        :param title: 标题
+        :param fields: {字段名: 纯文本}
+        :return: 无返回
+        """
+        raise NotImplementedError
+
+    def remove(self, kind, object_id):
+        raise NotImplementedError
+
+    def clear(self, kind=None):
+        raise NotImplementedError
+
+    def search(self, query, kind, public_only=True, limit=None):
+        """
+        :param query: 搜索内容
+        :param kind: 类型
+        :param public_only: 仅搜索公开文档
+        :param limit: 最多返回的结果数
+        :return: [Hit, ...] 按相关度降序
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_text(fields):
+        return ' '.join(value for value in fields.values() if value)
+
+    @staticmethod
+    def get_frequencies(fields):
+        frequencies = Counter()
+        for name, value in fields.items():
+            weight = FIELD_WEIGHTS[name]
+            for term in tokenize(value):
+                frequencies[term] += weight
+        return frequencies
+
+    @staticmethod
+    def make_hit(kind, object_id, title, score, text, terms):
+        return Hit(kind, object_id, title, score, make_snippet(text, terms))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SEARCH_BACKEND)()
+    return _backend
+
+
+def search(query, kind, public_only=True, limit=None):
+    """
+    :param query: 搜索内容
+    :param kind: 类型 article/news/column
+    :param public_only: 仅搜索公开文档
+    :param limit: 最多返回的结果数 默认SEARCH_RESULT_LIMIT
+    :return: [Hit, ...] 按相关度降序
+    """
+    if not query_terms(query):
+        return []
+    return get_backend().search(query, kind, public_only, limit or settings.SEARCH_RESULT_LIMIT)
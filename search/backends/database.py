@@ -0,0 +1,82 @@
+"""
+数据库倒排索引 纯Python计算BM25 可用于MySQL/SQLite
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Avg
+
+from search.models import Document, Posting
+from search.text import query_terms
+
+from . import BaseBackend, K1, B
+
+
+class DatabaseBackend(BaseBackend):
+    def index(self, kind, object_id, is_public, title, fields):
+        frequencies = self.get_frequencies(fields)
+        with transaction.atomic():
+            document, created = Document.objects.update_or_create(
+                kind=kind, object_id=object_id,
+                defaults={
+                    'is_public': is_public,
+                    'title': title[:200],
+                    'text': self.get_text(fields),
+                    'length': sum(frequencies.values()),
+                })
+            if not created:
+                Posting.objects.filter(document=document).delete()
+            Posting.objects.bulk_create([Posting(term=term, document=document, frequency=frequency)
+                                         for term, frequency in frequencies.items()], batch_size=500)
+
+    def remove(self, kind, object_id):
+        Document.objects.filter(kind=kind, object_id=object_id).delete()
+
+    def clear(self, kind=None):
+        documents = Document.objects.all()
+        if kind:
+            documents = documents.filter(kind=kind)
+        Posting.objects.filter(document__in=documents).delete()
+        documents.delete()
+
+    def search(self, query, kind, public_only=True, limit=None):
+        terms = query_terms(query)
+        documents = Document.objects.filter(kind=kind)
+        if public_only:
+            documents = documents.filter(is_public=True)
+        stats = documents.aggregate(total=Count('id'), average=Avg('length'))
+        if not stats['total']:
+            return []
+
+        # 命中全部查询词的文档
+        postings = Posting.objects.filter(term__in=terms, document__in=documents).values_list(
+            'document_id', 'document__length', 'term', 'frequency')
+        matched = defaultdict(dict)
+        lengths = {}
+        for document_id, length, term, frequency in postings:
+            matched[document_id][term] = frequency
+            lengths[document_id] = length
+        document_frequency = defaultdict(int)
+        for frequencies in matched.values():
+            for term in frequencies:
+                document_frequency[term] += 1
+
+        scores = {}
+        for document_id, frequencies in matched.items():
+            if len(frequencies) < len(terms):
+                continue
+            norm = K1 * (1 - B + B * lengths[document_id] / (stats['average'] or 1))
+            score = 0
+            for term, frequency in frequencies.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (stats['total'] - df + 0.5) / (df + 0.5))
+                score += idf * frequency * (K1 + 1) / (frequency + norm)
+            scores[document_id] = score
+
+        ranked = sorted(scores, key=lambda document_id: -scores[document_id])[:limit]
+        rows = Document.objects.filter(id__in=ranked).values('id', 'object_id', 'title', 'text')
+        rows = {row['id']: row for row in rows}
+        return [self.make_hit(kind, rows[document_id]['object_id'], rows[document_id]['title'],
+                              scores[document_id], rows[document_id]['text'], terms)
+                for document_id in ranked]
@@ -0,0 +1,66 @@
+"""
+SQLite FTS5 索引 保存在独立的SQLite文件中(settings.SEARCH_SQLITE_PATH)
+
+文本先按search.text.tokenize切分后以空格连接写入，FTS5只负责倒排与bm25排序。
+"""
+import sqlite3
+
+from django.conf import settings
+
+from search.text import tokenize, query_terms
+
+from . import BaseBackend, FIELD_WEIGHTS
+
+COLUMNS = ['title', 'tags', 'summary', 'content']
+
+
+class SqliteFtsBackend(BaseBackend):
+    def __init__(self, path=None):
+        self.path = path or settings.SEARCH_SQLITE_PATH
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5('
+            'kind UNINDEXED, object_id UNINDEXED, is_public UNINDEXED, title_text UNINDEXED, text UNINDEXED, '
+            '{})'.format(', '.join(COLUMNS)))
+        return connection
+
+    def index(self, kind, object_id, is_public, title, fields):
+        connection = self.connect()
+        with connection:
+            connection.execute('DELETE FROM documents WHERE kind = ? AND object_id = ?', (kind, object_id))
+            connection.execute(
+                'INSERT INTO documents VALUES (?, ?, ?, ?, ?, {})'.format(', '.join('?' * len(COLUMNS))),
+                [kind, object_id, int(is_public), title, self.get_text(fields)] +
+                [' '.join(tokenize(fields.get(column, ''))) for column in COLUMNS])
+        connection.close()
+
+    def remove(self, kind, object_id):
+        connection = self.connect()
+        with connection:
+            connection.execute('DELETE FROM documents WHERE kind = ? AND object_id = ?', (kind, object_id))
+        connection.close()
+
+    def clear(self, kind=None):
+        connection = self.connect()
+        with connection:
+            if kind:
+                connection.execute('DELETE FROM documents WHERE kind = ?', (kind,))
+            else:
+                connection.execute('DELETE FROM documents')
+        connection.close()
+
+    def search(self, query, kind, public_only=True, limit=None):
+        terms = query_terms(query)
+        # bm25()按列顺序设置权重 未索引的列权重为0 结果越小越相关
+        weights = ', '.join(['0'] * 5 + [str(FIELD_WEIGHTS[column]) for column in COLUMNS])
+        sql = ('SELECT object_id, title_text, text, bm25(documents, {}) AS rank FROM documents '
+               'WHERE documents MATCH ? AND kind = ?{} ORDER BY rank LIMIT ?').format(
+            weights, ' AND is_public = 1' if public_only else '')
+        # 未索引的列不参与MATCH 多个词之间为AND
+        match = ' '.join('"{}"'.format(term) for term in terms)
+        connection = self.connect()
+        rows = connection.execute(sql, (match, kind, limit or -1)).fetchall()
+        connection.close()
+        return [self.make_hit(kind, object_id, title, -rank, text, terms) for object_id, title, text, rank in rows]
@@ -0,0 +1,110 @@
+"""
+可搜索的模型
+
+每个模型对应一个SearchIndex，说明要索引的字段、可见性以及结果链接。
+"""
+from django.urls import reverse
+
+from article.models import Article
+from news.models import News
+from column.models import Column
+
+from .text import html_to_text
+
+
+class SearchIndex(object):
+    kind = None
+    model = None
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def get_title(self, obj):
+        return str(obj)
+
+    def get_fields(self, obj):
+        """
+        :return: {字段名: 纯文本} 字段名需在FIELD_WEIGHTS中
+        """
+        raise NotImplementedError
+
+    def is_public(self, obj):
+        return True
+
+    def get_url(self, object_id):
+        raise NotImplementedError
+
+
+class ArticleIndex(SearchIndex):
+    kind = 'article'
+    model = Article
+
+    def get_queryset(self):
+        return Article.objects.only('id', 'title', 'tags', 'summary', 'content', 'plain_text', 'is_public', 'status')
+
+    def get_title(self, obj):
+        return obj.title
+
+    def get_fields(self, obj):
+        return {
+            'title': obj.title,
+            'tags': ' '.join(obj.get_tags()),
+            'summary': html_to_text(obj.summary),
+            # 未执行process_articles的文章没有纯文本
+            'content': obj.plain_text or html_to_text(obj.content),
+        }
+
+    def is_public(self, obj):
+        return obj.is_public and obj.status == 0
+
+    def get_url(self, object_id):
+        return reverse('article_detail', kwargs={'pk': object_id})
+
+
+class NewsIndex(SearchIndex):
+    kind = 'news'
+    model = News
+
+    def get_title(self, obj):
+        return obj.title
+
+    def get_fields(self, obj):
+        return {
+            'title': obj.title,
+            'tags': obj.source,
+            'summary': html_to_text(obj.summary),
+        }
+
+    def get_url(self, object_id):
+        return reverse('news_detail', kwargs={'pk': object_id})
+
+
+class ColumnIndex(SearchIndex):
+    kind = 'column'
+    model = Column
+
+    def get_title(self, obj):
+        return obj.name
+
+    def get_fields(self, obj):
+        return {
+            'title': obj.name,
+            'summary': html_to_text(obj.summary),
+        }
+
+    def get_url(self, object_id):
+        return reverse('column_detail', kwargs={'pk': object_id})
+
+
+INDEXES = {index.kind: index for index in (ArticleIndex(), NewsIndex(), ColumnIndex())}
+
+
+def get_index(model):
+    """
+    :param model: 模型类
+    :return: 对应的SearchIndex 未注册时返回None
+    """
+    for index in INDEXES.values():
+        if index.model is model:
+            return index
+    return None
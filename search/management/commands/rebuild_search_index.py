@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from search.backends import get_backend
+from search.indexes import INDEXES
+
+
+class Command(BaseCommand):
+    help = '重建搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', nargs='+', choices=list(INDEXES), default=list(INDEXES),
+                            help='需要重建的类型')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        for kind in options['kind']:
+            index = INDEXES[kind]
+            backend.clear(kind)
+            count = 0
+            for obj in index.get_queryset().iterator():
+                backend.index(kind, obj.pk, index.is_public(obj), index.get_title(obj), index.get_fields(obj))
+                count += 1
+            self.stdout.write('{}: 已索引{}条'.format(kind, count))
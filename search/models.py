@@ -0,0 +1,49 @@
+from django.db import models
+
+
+# 索引文档
+class Document(models.Model):
+    # 类型 article/news/column
+    kind = models.CharField(max_length=20,
+                            verbose_name='类型')
+    # 对象id
+    object_id = models.IntegerField(verbose_name='对象id')
+    # 对未授权用户可见
+    is_public = models.BooleanField(default=True,
+                                    verbose_name='公开')
+    # 标题
+    title = models.CharField(max_length=200,
+                             verbose_name='标题')
+    # 纯文本 用于生成摘要
+    text = models.TextField(verbose_name='纯文本')
+    # 加权后的词数
+    length = models.IntegerField(default=0,
+                                 verbose_name='长度')
+    # 更新时间
+    update_time = models.DateTimeField(auto_now=True,
+                                       verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '索引文档'
+        verbose_name_plural = '索引文档'
+        unique_together = ('kind', 'object_id')
+
+
+# 倒排索引
+class Posting(models.Model):
+    # 词
+    term = models.CharField(max_length=40,
+                            verbose_name='词')
+    # 文档
+    document = models.ForeignKey(Document,
+                                 on_delete=models.CASCADE,
+                                 verbose_name='文档')
+    # 加权后的词频
+    frequency = models.IntegerField(verbose_name='词频')
+
+    class Meta:
+        verbose_name = '倒排索引'
+        verbose_name_plural = '倒排索引'
+        indexes = [
+            models.Index(fields=['term', 'document']),
+        ]
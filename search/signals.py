@@ -0,0 +1,18 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from .indexes import get_index
+from .utils import index_object, remove_object
+
+
+# 增量维护搜索索引
+@receiver(post_save)
+def object_saved(sender, instance, raw=False, **kwargs):
+    if not raw and get_index(sender):
+        index_object(instance)
+
+
+@receiver(post_delete)
+def object_deleted(sender, instance, **kwargs):
+    if get_index(sender):
+        remove_object(instance)
@@ -0,0 +1,122 @@
+"""
+TokenizeTests 分词
+中日文按bigram切分并保留单字，其它文字按单词切分。
+
+DatabaseBackendTests / SqliteFtsBackendTests 搜索后端
+文章保存、删除时更新索引，按相关度排序，未公开或草稿文章只对有权限的用户可见。
+"""
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from article.models import Article, Category
+from user.models import User
+
+from . import backends
+from .text import tokenize, query_terms, make_snippet
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_cjk(self):
+        self.assertEqual(tokenize('Python入门教程'), ['python', '入门', '门教', '教程', '入', '门', '教', '程'])
+        # 查询时连续中文只取bigram 单字查询保留单字
+        self.assertEqual(query_terms('入门教程 入门'), ['入门', '门教', '教程'])
+        self.assertEqual(query_terms('词'), ['词'])
+
+    def test_other_scripts(self):
+        self.assertEqual(tokenize('Café au lait'), ['café', 'au', 'lait'])
+        # 分解形式的重音字母与组合形式相同
+        self.assertEqual(tokenize('Café'), ['café'])
+        self.assertEqual(tokenize('한국어 검색'), ['한국어', '검색'])
+        self.assertEqual(tokenize('Полнотекстовый поиск'), ['полнотекстовый', 'поиск'])
+        self.assertEqual(tokenize('foo_bar ｆｕｌｌ'), ['foo', 'bar', 'full'])
+
+    def test_snippet(self):
+        snippet = make_snippet('前文' * 100 + '中文<分词>', ['分词'], size=20)
+        self.assertIn('<em class="search-highlight">分词</em>', snippet)
+        self.assertIn('&lt;', snippet)
+        self.assertTrue(snippet.startswith('...'))
+
+
+class BackendTestsMixin(object):
+    backend = None
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        override = override_settings(SEARCH_BACKEND=self.backend,
+                                     SEARCH_SQLITE_PATH=os.path.join(self.root.name, 'search.sqlite3'))
+        override.enable()
+        self.addCleanup(override.disable)
+        backends._backend = None
+        self.addCleanup(setattr, backends, '_backend', None)
+
+        self.user = User.objects.create_user('author', 'author@example.com', 'password')
+        self.category = Category.objects.create(name='python')
+
+    def create(self, title, content='<p>正文</p>', **kwargs):
+        # 摘要为空时由正文生成 指定摘要使词频只来自正文
+        return Article.objects.create(author=self.user, category=self.category, title=title, tags='python',
+                                      summary='摘要', content=content, **kwargs)
+
+    def search(self, query, public_only=True):
+        return [hit.object_id for hit in backends.search(query, 'article', public_only)]
+
+    def test_cjk(self):
+        article = self.create('分词', '<p>中文全文检索</p>')
+        self.assertEqual(self.search('全文检索'), [article.id])
+        self.assertEqual(self.search('文全'), [article.id])
+        self.assertEqual(self.search('检'), [article.id])
+        self.assertEqual(self.search('中检'), [])
+
+    def test_other_scripts(self):
+        article = self.create('Café', '<p>한국어 검색 и поиск</p>')
+        for query in ['café', 'CAFÉ', '검색', 'Поиск']:
+            self.assertEqual(self.search(query), [article.id], query)
+        self.assertEqual(self.search('caf'), [])
+
+    def test_ranking(self):
+        content = self.create('其它', '<p>django是一个框架</p>')
+        title = self.create('django入门', '<p>正文</p>')
+        repeated = self.create('其它', '<p>django django</p>')
+        self.create('无关', '<p>flask</p>')
+        self.assertEqual(self.search('django'), [title.id, repeated.id, content.id])
+        # 标题中的词按3次计算 多个查询词须全部命中
+        self.assertEqual(self.search('django 框架'), [content.id])
+
+    def test_public_only(self):
+        public = self.create('django公开')
+        private = self.create('django私密', is_public=False)
+        draft = self.create('django草稿', status=1)
+        self.assertEqual(self.search('django'), [public.id])
+        self.assertEqual(sorted(self.search('django', public_only=False)), sorted([public.id, private.id, draft.id]))
+
+        response = self.client.get(reverse('search'), {'search': 'django'})
+        self.assertContains(response, 'django公开')
+        self.assertNotContains(response, 'django私密')
+        self.assertNotContains(response, 'django草稿')
+
+    def test_save_and_delete(self):
+        article = self.create('flask入门')
+        article.title = 'django入门'
+        article.save()
+        self.assertEqual(self.search('flask'), [])
+        self.assertEqual(self.search('django'), [article.id])
+        article.is_public = False
+        article.save()
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(self.search('django', public_only=False), [article.id])
+        article.delete()
+        self.assertEqual(self.search('django', public_only=False), [])
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class DatabaseBackendTests(BackendTestsMixin, TestCase):
+    backend = 'search.backends.database.DatabaseBackend'
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class SqliteFtsBackendTests(BackendTestsMixin, TestCase):
+    backend = 'search.backends.sqlite_fts.SqliteFtsBackend'
@@ -0,0 +1,86 @@
+"""
+分词与摘要
+
+文本转为小写并做NFKC规范化，字母、数字按单词切分(含带重音的拉丁字母、韩文、西里尔字母等)，
+中日文按连续两字(bigram)切分，同时保留单字以支持单字查询。
+"""
+import re
+import html
+import unicodedata
+from collections import OrderedDict
+
+from django.utils.html import strip_tags, escape
+from django.utils.safestring import mark_safe
+
+# 单个词的最大长度
+MAX_TERM_LENGTH = 40
+
+# 假名、中日韩统一表意文字及其扩展A、兼容表意文字
+CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# 连续的中日文 或不含中日文、下划线的连续字母数字(可带组合附加符号)
+TOKEN_RE = re.compile(r'[{0}]+|[^\W_{0}](?:[^\W_{0}]|[\u0300-\u036f])*'.format(CJK))
+CJK_RE = re.compile(r'[{}]'.format(CJK))
+
+
+def html_to_text(value):
+    """
+    :param value: html
+    :return: 纯文本
+    """
+    if not value:
+        return ''
+    return re.sub(r'\s+', ' ', html.unescape(strip_tags(value))).strip()
+
+
+def tokenize(text, unigrams=True):
+    """
+    :param text: 文本
+    :param unigrams: 中日文是否同时输出单字
+    :return: 词列表
+    """
+    tokens = []
+    for run in TOKEN_RE.findall(unicodedata.normalize('NFKC', (text or '').lower())):
+        if not CJK_RE.match(run):
+            tokens.append(run[:MAX_TERM_LENGTH])
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                tokens.extend(run)
+    return tokens
+
+
+def query_terms(query):
+    """
+    :param query: 搜索内容
+    :return: 去重后的查询词 连续中文只取bigram
+    """
+    return list(OrderedDict.fromkeys(tokenize(query, unigrams=False)))
+
+
+def make_snippet(text, terms, size=120):
+    """
+    截取首个命中位置附近的文本并高亮查询词
+    :param text: 纯文本
+    :param terms: 查询词
+    :param size: 摘要长度
+    :return: 已转义的html
+    """
+    lower = text.lower()
+    positions = [position for position in (lower.find(term) for term in terms) if position >= 0]
+    start = max(0, min(positions) - size // 4) if positions else 0
+    end = min(len(text), start + size)
+    fragment = text[start:end]
+
+    parts = []
+    last = 0
+    if terms:
+        pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+                             re.IGNORECASE)
+        for match in pattern.finditer(fragment):
+            parts.append(escape(fragment[last:match.start()]))
+            parts.append('<em class="search-highlight">{}</em>'.format(escape(match.group())))
+            last = match.end()
+    parts.append(escape(fragment[last:]))
+    return mark_safe('{}{}{}'.format('...' if start else '', ''.join(parts), '...' if end < len(text) else ''))
@@ -0,0 +1,6 @@
+from django.conf.urls import url
+from .views import *
+
+urlpatterns = [
+    url(r'^$', SearchView.as_view(), name='search'),
+]
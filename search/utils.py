@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+from django.db.models import Case, When, Value, IntegerField
+
+from .backends import get_backend, search
+from .indexes import get_index
+
+
+def index_object(obj):
+    """
+    新增或更新对象的索引
+    :param obj: 已注册模型的实例
+    :return: 无返回
+    """
+    index = get_index(type(obj))
+    get_backend().index(index.kind, obj.pk, index.is_public(obj), index.get_title(obj), index.get_fields(obj))
+
+
+def remove_object(obj):
+    """
+    删除对象的索引
+    :param obj: 已注册模型的实例
+    :return: 无返回
+    """
+    get_backend().remove(get_index(type(obj)).kind, obj.pk)
+
+
+def search_queryset(queryset, query, public_only=True):
+    """
+    用全文索引筛选queryset 并按相关度排序
+    :param queryset: 已注册模型的QuerySet
+    :param query: 搜索内容
+    :param public_only: 仅搜索公开文档
+    :return: (QuerySet, {对象id: Hit})
+    """
+    hits = OrderedDict((hit.object_id, hit) for hit in search(query, get_index(queryset.model).kind, public_only))
+    if not hits:
+        return queryset.none(), hits
+    ordering = Case(*[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(hits)],
+                    output_field=IntegerField())
+    return queryset.filter(pk__in=list(hits)).order_by(ordering), hits
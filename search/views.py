@@ -0,0 +1,23 @@
+from django.views.generic import TemplateView
+
+from common.views import BaseContextMixin
+
+from .backends import search
+from .indexes import INDEXES
+
+
+# 全站搜索 文章、新闻、专栏
+class SearchView(BaseContextMixin, TemplateView):
+    template_name = 'search/search.html'
+
+    def get_context_data(self, **kwargs):
+        query = self.request.GET.get('search', '').strip()
+        public_only = not self.request.user.has_perm('article.view_article')
+        results = []
+        if query:
+            for kind, name in (('article', '文章'), ('news', '新闻'), ('column', '专栏')):
+                index = INDEXES[kind]
+                hits = [(index.get_url(hit.object_id), hit) for hit in search(query, kind, public_only)]
+                results.append((name, hits))
+        kwargs['results'] = results
+        return super(SearchView, self).get_context_data(**kwargs)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Permission, Group
 
@@ -34,6 +35,21 @@ class EmailVerifyAdmin(admin.ModelAdmin):
 admin.site.register(EmailVerify, EmailVerifyAdmin)
 
 
+# 待发送邮件
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'recipients', 'status', 'attempts', 'next_try_time', 'sent_time']
+    list_filter = ['status']
+    search_fields = ('subject', 'recipients')
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        queryset.exclude(status=OutboxEmail.SENT).update(status=OutboxEmail.PENDING, attempts=0, claim='',
+                                                        next_try_time=timezone.now())
+
+    retry.short_description = '重新发送'
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+
+
 # 职务
 class GroupAdmin(admin.ModelAdmin):
     list_display = ['id', 'name']
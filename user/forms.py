@@ -4,6 +4,7 @@ from django.contrib.auth import authenticate, login, password_validation
 from django.contrib.sites.shortcuts import get_current_site
 
 from .models import *
+from .outbox import enqueue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -208,14 +209,10 @@ class ForgetPasswordForm(forms.Form):
             u"{} 团队\n\n\n".format(site_name)
         ])
 
-        try:
-            send_mail(title, message, settings.DEFAULT_FROM_EMAIL, [self.user.email])
-            self.email_send_message = "密码重置邮件已发送,如果你没有收到邮件," \
-                                      " 请确保您所输入的地址是正确的, 并检查您的垃圾邮件文件夹。"
-        except ConnectionRefusedError as e:
-            self.add_error('email', e.strerror)
-        except Exception as e:
-            self.add_error('email', str(e))
+        # 放入发件箱 由后台发送
+        enqueue(title, message, [self.user.email])
+        self.email_send_message = "密码重置邮件已发送,如果你没有收到邮件," \
+                                  " 请确保您所输入的地址是正确的, 并检查您的垃圾邮件文件夹。"
 
 
 class SetPasswordForm(forms.Form):
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+
+from user.portrait import PORTRAIT_DIR, PortraitError, save_portrait
+
+
+class Command(BaseCommand):
+    help = '将旧版本上传的头像转换为多尺寸头像'
+
+    def handle(self, *args, **options):
+        count = 0
+        users = get_user_model().objects.exclude(portrait='').exclude(portrait__isnull=True).exclude(
+            portrait__startswith=PORTRAIT_DIR)
+        for user in users.iterator():
+            try:
+                with user.portrait.open('rb') as f:
+                    data = f.read()
+                save_portrait(user, data)
+                count += 1
+            except (OSError, PortraitError) as e:
+                self.stderr.write('{}: {}'.format(user.username, e))
+        self.stdout.write('已转换{}个头像'.format(count))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.outbox import send_all
+
+
+class Command(BaseCommand):
+    help = '发送发件箱中到期的邮件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='常驻运行 每隔interval秒发送一次')
+        parser.add_argument('--interval', type=int, default=10,
+                            help='发送间隔(秒)')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_all()
+            if sent or failed:
+                self.stdout.write('已发送{}封 失败{}封'.format(sent, failed))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
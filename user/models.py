@@ -1,13 +1,15 @@
 import os
 import binascii
 from django.db import models
+from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 from common.utils import get_time_filename, validate_attachment_size, sizeof_fmt
 
+from .portrait import PORTRAIT_DIR, get_size_name
+
 
 def user_portrait_path(instance, filename):
     return 'user/{}'.format(get_time_filename(filename))
@@ -101,6 +103,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(blank=True,
                                        default=timezone.now,
                                        verbose_name='账号创建日期')
+    # 未读消息数 由notification.signals维护
+    unread_notification_count = models.IntegerField(default=0,
+                                                    editable=False,
+                                                    verbose_name='未读消息数')
 
     objects = UserManager()
 
@@ -115,6 +121,13 @@ class User(AbstractBaseUser, PermissionsMixin):
             ("view_cnzz", "查看站点流量"),
         )
 
+    def save(self, *args, **kwargs):
+        # 未读消息数只通过F()表达式原子更新 普通保存时不写回该字段 避免覆盖并发的修改
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'unread_notification_count']
+        return super(User, self).save(*args, **kwargs)
+
     # 获取全名
     def get_full_name(self):
         if self.name == '':
@@ -128,16 +141,24 @@ class User(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         return self.name
 
-    # 向该用户发送邮件
+    # 向该用户发送邮件 放入待发送邮件由后台发送
     def email_user(self, subject, message, from_email=None, **kwargs):
-        send_mail(subject, message, from_email, [self.email], **kwargs)
+        from .outbox import enqueue
+        enqueue(subject, message, [self.email], from_email)
 
-    def get_portrait(self):
+    def get_portrait(self, size=None):
         if self.portrait:
+            # 旧版本上传的头像只有一个尺寸
+            if size and self.portrait.name.startswith(PORTRAIT_DIR):
+                return self.portrait.storage.url(get_size_name(self.portrait.name, size))
             return self.portrait.url
         else:
             return '/media/default/user/default.png'
 
+    # 评论等处显示的小尺寸头像
+    def get_small_portrait(self):
+        return self.get_portrait(min(settings.PORTRAIT_SIZES))
+
     def __str__(self):
         return self.username
 
@@ -157,8 +178,9 @@ class EmailVerify(models.Model):
                                    default=0,
                                    verbose_name='类型')
     # 验证码
-    verify_code = models.CharField(max_length=254,
+    verify_code = models.CharField(max_length=64,
                                    null=True,
+                                   db_index=True,
                                    verbose_name='验证码')
 
     def update(self):
@@ -182,6 +204,67 @@ class EmailVerify(models.Model):
         verbose_name_plural = '邮箱验证码'
 
 
+# 待发送邮件 由user.outbox在后台批量发送
+class OutboxEmail(models.Model):
+    # 主题
+    subject = models.CharField(max_length=255,
+                               verbose_name='主题')
+    # 内容
+    message = models.TextField(verbose_name='内容')
+    # 发件人
+    from_email = models.CharField(max_length=254,
+                                  verbose_name='发件人')
+    # 收件人 每行一个
+    recipients = models.TextField(verbose_name='收件人')
+    # 状态
+    PENDING, SENT, DEAD = 0, 1, 2
+    STATUS = {
+        PENDING: '待发送',
+        SENT: '已发送',
+        DEAD: '发送失败',
+    }
+    status = models.IntegerField(choices=STATUS.items(),
+                                 default=PENDING,
+                                 verbose_name='状态')
+    # 已尝试次数
+    attempts = models.IntegerField(default=0,
+                                   verbose_name='尝试次数')
+    # 下次尝试时间 发送中的邮件为租约到期时间
+    next_try_time = models.DateTimeField(default=timezone.now,
+                                         verbose_name='下次尝试时间')
+    # 领取本邮件的发送批次
+    claim = models.CharField(max_length=32,
+                             blank=True,
+                             editable=False,
+                             verbose_name='发送批次')
+    # 最近一次错误
+    last_error = models.TextField(blank=True,
+                                  verbose_name='错误信息')
+    # 创建时间
+    create_time = models.DateTimeField(auto_now_add=True,
+                                       verbose_name='创建时间')
+    # 发送时间
+    sent_time = models.DateTimeField(null=True,
+                                     blank=True,
+                                     verbose_name='发送时间')
+
+    class Meta:
+        verbose_name = '待发送邮件'
+        verbose_name_plural = '待发送邮件'
+        ordering = ['-id']
+        indexes = [
+            # 领取待发送邮件
+            models.Index(fields=['status', 'next_try_time']),
+            models.Index(fields=['claim']),
+        ]
+
+    def get_recipients(self):
+        return [email for email in self.recipients.splitlines() if email]
+
+    def __str__(self):
+        return self.subject
+
+
 def attachment_file(instance, filename):
     return 'attachment/{}'.format(get_time_filename(filename))
 
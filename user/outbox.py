@@ -0,0 +1,183 @@
+"""
+邮件发件箱
+
+请求中只调用 enqueue() 将邮件写入 OutboxEmail 表，由 send_pending() 批量发送：
+每批最多 EMAIL_OUTBOX_BATCH_SIZE 封，共用一个SMTP连接。
+发送失败的邮件按 EMAIL_OUTBOX_RETRY_DELAY * 2^(n-1) 秒后重试，
+失败 EMAIL_OUTBOX_MAX_ATTEMPTS 次后标记为发送失败，不再重试，可在后台重新放回队列。
+
+领取邮件时写入批次号并将 next_try_time 延后 EMAIL_OUTBOX_LEASE 秒作为租约，
+多个进程同时发送时不会重复领取，发送进程中途退出的邮件在租约到期后重新发送。
+
+EMAIL_OUTBOX_SEND_ON_COMMIT = True 时事务提交后唤醒本进程内的后台线程立即发送，
+线程在最早一封待重试的邮件到期时自行醒来，失败的邮件不必等到有新邮件时才重试。
+也可关闭后使用 python manage.py send_emails --loop 常驻发送。
+"""
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction, close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(subject, message, recipients, from_email=None):
+    """
+    将邮件放入发件箱
+    :param subject: 主题
+    :param message: 内容
+    :param recipients: 收件人列表
+    :param from_email: 发件人 默认DEFAULT_FROM_EMAIL
+    :return: OutboxEmail
+    """
+    email = OutboxEmail.objects.create(subject=subject, message=message,
+                                       from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                                       recipients='\n'.join(recipients))
+    if settings.EMAIL_OUTBOX_SEND_ON_COMMIT:
+        transaction.on_commit(_wake)
+    return email
+
+
+def get_retry_delay(attempts):
+    """
+    :param attempts: 已失败次数
+    :return: 距下次重试的时间
+    """
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim(limit):
+    """
+    领取一批到期的待发送邮件
+    :param limit: 最多领取的邮件数
+    :return: 领取到的邮件列表
+    """
+    now = timezone.now()
+    ids = list(OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_try_time__lte=now).order_by(
+        'next_try_time', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # 条件中再次检查next_try_time 已被其它进程领取的邮件不会被覆盖
+    OutboxEmail.objects.filter(id__in=ids, status=OutboxEmail.PENDING, next_try_time__lte=now).update(
+        claim=token, next_try_time=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE))
+    return list(OutboxEmail.objects.filter(claim=token, status=OutboxEmail.PENDING).order_by('id'))
+
+
+def _fail(email, error):
+    email.attempts += 1
+    email.last_error = error
+    email.claim = ''
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxEmail.DEAD
+        logger.error(u'[outbox]邮件{}发送失败{}次 不再重试: {}'.format(email.id, email.attempts, error))
+    else:
+        email.next_try_time = timezone.now() + get_retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'next_try_time'])
+
+
+def send_pending(limit=None, connection=None):
+    """
+    发送一批到期的邮件 整批共用一个连接
+    :param limit: 最多发送的邮件数 默认EMAIL_OUTBOX_BATCH_SIZE
+    :param connection: 邮件连接 默认按EMAIL_BACKEND创建
+    :return: (发送成功数, 发送失败数)
+    """
+    emails = claim(limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection()
+    sent_ids = []
+    try:
+        connection.open()
+    except Exception as e:
+        # 连接失败 整批计为一次失败
+        for email in emails:
+            _fail(email, str(e))
+        return 0, len(emails)
+    try:
+        for index, email in enumerate(emails):
+            message = EmailMessage(email.subject, email.message, email.from_email, email.get_recipients(),
+                                   connection=connection)
+            try:
+                message.send()
+                sent_ids.append(email.id)
+            except Exception as e:
+                _fail(email, str(e))
+                # 连接可能已断开 重新建立连接后继续发送
+                connection.close()
+                try:
+                    connection.open()
+                except Exception as e:
+                    for rest in emails[index + 1:]:
+                        _fail(rest, str(e))
+                    break
+    finally:
+        connection.close()
+    OutboxEmail.objects.filter(id__in=sent_ids).update(status=OutboxEmail.SENT, sent_time=timezone.now(),
+                                                      claim='', last_error='')
+    return len(sent_ids), len(emails) - len(sent_ids)
+
+
+def send_all():
+    """
+    发送全部到期的邮件
+    :return: (发送成功数, 发送失败数)
+    """
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_pending()
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
+
+
+def get_next_wait():
+    """
+    :return: 距最早一封待发送邮件到期的秒数 没有待发送的邮件时为None
+    """
+    next_try_time = OutboxEmail.objects.filter(status=OutboxEmail.PENDING).aggregate(
+        next_try_time=Min('next_try_time'))['next_try_time']
+    if next_try_time is None:
+        return None
+    return max(0.0, (next_try_time - timezone.now()).total_seconds())
+
+
+def _run():
+    timeout = None
+    while True:
+        # 有新邮件时被唤醒 否则在最早一封待重试的邮件到期时醒来
+        _wakeup.wait(timeout)
+        _wakeup.clear()
+        try:
+            close_old_connections()
+            send_all()
+            timeout = get_next_wait()
+        except Exception:
+            logger.exception(u'[outbox]发送邮件出错')
+            timeout = settings.EMAIL_OUTBOX_RETRY_DELAY
+
+
+def _wake():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        with _worker_lock:
+            if _worker is None or not _worker.is_alive():
+                _worker = threading.Thread(target=_run, name='email-outbox', daemon=True)
+                _worker.start()
+    _wakeup.set()
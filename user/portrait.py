@@ -0,0 +1,148 @@
+"""
+头像处理
+
+上传的头像在内存中完成 校验 -> 按PORTRAIT_SIZES缩放 -> PNG编码，不再写入磁盘后重新打开。
+处理在进程池(PORTRAIT_WORKERS个进程)中进行，不占用请求线程的GIL，PORTRAIT_WORKERS为0时在当前进程处理。
+
+文件名为 user/portrait/<用户id>-<内容摘要>.png，对应最大尺寸，其余尺寸为 <文件名>_<尺寸>.png，
+各文件先写入临时文件再替换。重复上传相同的头像不会写入文件；
+更换头像后旧文件由django_cleanup删除，其余尺寸由user.signals一并删除。
+"""
+import io
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from common.utils import write_file_atomic
+
+# logger
+import logging
+
+logger = logging.getLogger("info")
+
+PORTRAIT_DIR = 'user/portrait/'
+
+_executor = None
+
+
+class PortraitError(ValueError):
+    pass
+
+
+def get_size_name(name, size):
+    """
+    :param name: 头像文件名(最大尺寸)
+    :param size: 尺寸
+    :return: 该尺寸的文件名
+    """
+    if size == max(settings.PORTRAIT_SIZES):
+        return name
+    root, ext = os.path.splitext(name)
+    return '{}_{}{}'.format(root, size, ext)
+
+
+def process(data, sizes, max_pixels):
+    """
+    在工作进程中执行 不访问数据库与settings
+    :param data: 图片内容 bytes
+    :param sizes: 输出尺寸列表
+    :param max_pixels: 允许的最大像素数
+    :return: [PNG内容, ...] 与sizes一一对应
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > max_pixels:
+            raise PortraitError('头像尺寸过大')
+        image.load()
+    except PortraitError:
+        raise
+    except Exception:
+        raise PortraitError('头像格式错误')
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    result = []
+    for size in sizes:
+        # 非正方形时居中裁剪 不再拉伸
+        out = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(out, 'PNG', optimize=True)
+        result.append(out.getvalue())
+    return result
+
+
+def get_executor():
+    global _executor
+    if _executor is None and settings.PORTRAIT_WORKERS:
+        _executor = ProcessPoolExecutor(max_workers=settings.PORTRAIT_WORKERS)
+    return _executor
+
+
+def render(data, sizes=None):
+    """
+    :param data: 图片内容 bytes
+    :param sizes: 输出尺寸列表 默认PORTRAIT_SIZES
+    :return: [PNG内容, ...] 与sizes一一对应
+    """
+    global _executor
+    if len(data) > settings.PORTRAIT_MAX_BYTES:
+        raise PortraitError('头像文件过大')
+    args = (data, sizes or settings.PORTRAIT_SIZES, settings.PORTRAIT_MAX_PIXELS)
+    executor = get_executor()
+    if executor is None:
+        return process(*args)
+    try:
+        return executor.submit(process, *args).result(timeout=settings.PORTRAIT_TIMEOUT)
+    except TimeoutError:
+        raise PortraitError('头像处理超时 请重试')
+    except BrokenProcessPool:
+        # 工作进程异常退出 下次请求时重建进程池
+        logger.error(u'[portrait]进程池已损坏 重新创建')
+        _executor = None
+        raise PortraitError('头像处理失败 请重试')
+
+
+def write(name, images, sizes=None):
+    """
+    写入各尺寸的头像
+    :param name: 头像文件名(最大尺寸)
+    :param images: render()的返回值
+    :param sizes: 与images对应的尺寸列表 默认PORTRAIT_SIZES
+    :return: 无返回
+    """
+    # 最大尺寸最后写入 其存在即表示各尺寸已写入
+    pairs = sorted(zip(sizes or settings.PORTRAIT_SIZES, images))
+    for size, content in pairs:
+        write_file_atomic(default_storage.path(get_size_name(name, size)), content)
+
+
+def save_portrait(user, data):
+    """
+    处理并保存用户头像
+    :param user: 用户
+    :param data: 图片内容 bytes
+    :return: 头像文件名
+    """
+    name = '{}{}-{}.png'.format(PORTRAIT_DIR, user.pk, hashlib.sha1(data).hexdigest()[:16])
+    if user.portrait.name == name:
+        return name
+    write(name, render(data))
+    user.portrait = name
+    user.save(update_fields=['portrait'])
+    return name
+
+
+def delete_sizes(name):
+    """
+    删除头像的其余尺寸
+    :param name: 头像文件名(最大尺寸)
+    :return: 无返回
+    """
+    for size in settings.PORTRAIT_SIZES:
+        size_name = get_size_name(name, size)
+        if size_name != name:
+            default_storage.delete(size_name)
@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from django_cleanup.signals import cleanup_pre_delete
+
+from .portrait import PORTRAIT_DIR, delete_sizes
+
+
+# django_cleanup删除旧头像时 一并删除其余尺寸
+@receiver(cleanup_pre_delete)
+def portrait_deleted(sender, file, **kwargs):
+    if file.name and file.name.startswith(PORTRAIT_DIR):
+        delete_sizes(file.name)
@@ -1,3 +1,154 @@
-from django.test import TestCase
+import io
+import os
+import time
+import base64
+import hashlib
+import tempfile
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import outbox, portrait
+from .models import OutboxEmail, User
+
+
+class FlakyBackend(BaseEmailBackend):
+    """
+    前failures次发送失败
+    """
+    failures = 0
+    sent = []
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise SMTPException('temporary failure')
+        FlakyBackend.sent.extend(messages)
+        return len(messages)
+
+
+@override_settings(EMAIL_BACKEND='user.tests.FlakyBackend', EMAIL_OUTBOX_SEND_ON_COMMIT=True,
+                   EMAIL_OUTBOX_RETRY_DELAY=0.5, EMAIL_OUTBOX_MAX_ATTEMPTS=5)
+class OutboxWorkerTests(TransactionTestCase):
+    def setUp(self):
+        FlakyBackend.failures = 0
+        FlakyBackend.sent = []
+
+    def wait_for(self, email, status, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            email.refresh_from_db()
+            if email.status == status:
+                return email
+            time.sleep(0.05)
+        self.fail('邮件{}在{}秒内未变为{} 当前为{}'.format(email.id, timeout, status, email.status))
+
+    def test_send_on_commit(self):
+        email = outbox.enqueue('激活', 'message', ['user@example.com'])
+        self.wait_for(email, OutboxEmail.SENT)
+        self.assertEqual(email.attempts, 0)
+        self.assertEqual([message.subject for message in FlakyBackend.sent], ['激活'])
+
+    def test_failed_email_retried_after_backoff(self):
+        # 发送失败后不再有新邮件 后台线程须在重试时间到期时自行醒来
+        FlakyBackend.failures = 1
+        start = time.time()
+        email = outbox.enqueue('重置密码', 'message', ['user@example.com'])
+        email = self.wait_for(email, OutboxEmail.SENT)
+        self.assertGreaterEqual(time.time() - start, 0.5)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual([message.subject for message in FlakyBackend.sent], ['重置密码'])
+
+    def test_next_wait(self):
+        self.assertIsNone(outbox.get_next_wait())
+        OutboxEmail.objects.create(subject='s', message='m', from_email='a@example.com', recipients='b@example.com',
+                                   status=OutboxEmail.DEAD)
+        self.assertIsNone(outbox.get_next_wait())
+        email = OutboxEmail(subject='s', message='m', from_email='a@example.com', recipients='b@example.com')
+        email.next_try_time = email.next_try_time + timedelta(minutes=4)
+        email.save()
+        self.assertAlmostEqual(outbox.get_next_wait(), 240, delta=5)
+
+
+@override_settings(PORTRAIT_WORKERS=0, PAGE_CACHE_TIMEOUT=0)
+class PortraitTests(TransactionTestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+    def make_image(self, size=(300, 150), color=(200, 100, 50)):
+        out = io.BytesIO()
+        Image.new('RGB', size, color).save(out, 'JPEG')
+        return out.getvalue()
+
+    def get_files(self):
+        root = os.path.join(self.media.name, portrait.PORTRAIT_DIR)
+        return sorted(os.listdir(root)) if os.path.isdir(root) else []
+
+    def test_save(self):
+        data = self.make_image()
+        name = portrait.save_portrait(self.user, data)
+        # 文件名为用户id与内容摘要 其余尺寸在文件名后加尺寸
+        self.assertEqual(name, '{}{}-{}.png'.format(portrait.PORTRAIT_DIR, self.user.pk,
+                                                    hashlib.sha1(data).hexdigest()[:16]))
+        base = os.path.basename(name)
+        self.assertEqual(self.get_files(), [base, base.replace('.png', '_40.png')])
+        for size in settings.PORTRAIT_SIZES:
+            with Image.open(default_storage.path(portrait.get_size_name(name, size))) as image:
+                self.assertEqual(image.size, (size, size))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.portrait.name, name)
+        self.assertTrue(user.get_small_portrait().endswith('_40.png'))
+
+    def test_same_content(self):
+        data = self.make_image()
+        portrait.save_portrait(self.user, data)
+        with mock.patch('user.portrait.write_file_atomic') as write:
+            portrait.save_portrait(self.user, data)
+        write.assert_not_called()
+
+    def test_change(self):
+        # 更换头像后旧头像的全部尺寸被删除
+        old = portrait.save_portrait(self.user, self.make_image())
+        new = portrait.save_portrait(self.user, self.make_image(color=(0, 0, 255)))
+        self.assertNotEqual(old, new)
+        base = os.path.basename(new)
+        self.assertEqual(self.get_files(), [base, base.replace('.png', '_40.png')])
+
+    @override_settings(PORTRAIT_WORKERS=1)
+    def test_process_pool(self):
+        self.addCleanup(setattr, portrait, '_executor', None)
+        data = self.make_image()
+        images = portrait.render(data)
+        self.assertIsNotNone(portrait._executor)
+        portrait._executor.shutdown()
+        self.assertEqual(images, portrait.process(data, settings.PORTRAIT_SIZES, settings.PORTRAIT_MAX_PIXELS))
+
+    def test_invalid(self):
+        with self.assertRaises(portrait.PortraitError):
+            portrait.render(b'not an image')
+        with self.settings(PORTRAIT_MAX_PIXELS=100 * 100), self.assertRaises(portrait.PortraitError):
+            portrait.render(self.make_image())
+        with self.settings(PORTRAIT_MAX_BYTES=10), self.assertRaises(portrait.PortraitError):
+            portrait.render(self.make_image())
+        self.assertEqual(self.get_files(), [])
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('user_portrait'), {'tx': base64.b64encode(self.make_image()).decode()})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).portrait.name.startswith(portrait.PORTRAIT_DIR))
+        response = self.client.post(reverse('user_portrait'), {'tx': base64.b64encode(b'not an image').decode()})
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,7 @@
-from django.conf import settings
-from django.core.mail import send_mail
 from django.contrib.sites.shortcuts import get_current_site
 
 from .models import EmailVerify
+from .outbox import enqueue
 
 
 def send_active_email(request, user):
@@ -24,12 +23,7 @@ def send_active_email(request, user):
         u"{} 团队\n\n\n".format(site_name)
     ])
 
-    try:
-        send_mail(title, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-        message = "账号激活邮件已发送,如果你没有收到邮件," \
-                  " 请确保您所输入的邮箱地址是正确的, 并检查您的垃圾邮件文件夹。"
-    except ConnectionRefusedError as e:
-        message = e.strerror
-    except Exception as e:
-        message = str(e)
-    return message
+    # 放入发件箱 由后台发送
+    enqueue(title, message, [user.email])
+    return "账号激活邮件已发送,如果你没有收到邮件," \
+           " 请确保您所输入的邮箱地址是正确的, 并检查您的垃圾邮件文件夹。"
@@ -1,6 +1,6 @@
 import json
 import base64
-from PIL import Image
+import binascii
 
 from django.shortcuts import render
 from django.urls import reverse_lazy
@@ -10,10 +10,13 @@ from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.http import HttpResponse, HttpResponseRedirect
 from django.utils.http import urlquote
 from django.contrib.auth.mixins import LoginRequiredMixin
+from common import counters
 from common.views import BaseContextMixin
 from notification.models import Notification
+from notification.utils import change_unread_count
 from .forms import *
 from .utils import *
+from .portrait import save_portrait, PortraitError
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,7 @@ class LoginView(BaseContextMixin, FormView):
     template_name = 'user/login.html'
     form_class = LoginForm
     success_url = reverse_lazy('index')
+    query_budget = 10
 
     def get_context_data(self, **kwargs):
         if 'form' not in kwargs:
@@ -59,6 +63,8 @@ class LoginView(BaseContextMixin, FormView):
 
 # 登出
 class LogoutView(View):
+    query_budget = 5
+
     def get(self, request):
         if request.user.is_authenticated:
             logout(request)
@@ -70,6 +76,7 @@ class RegisterView(BaseContextMixin, FormView):
     template_name = 'user/register.html'
     form_class = UserCreationForm
     success_url = reverse_lazy('user_login')
+    query_budget = 15
 
     def form_valid(self, form):
         form.save()
@@ -80,6 +87,7 @@ class RegisterView(BaseContextMixin, FormView):
 class ForgetPasswordView(BaseContextMixin, FormView):
     template_name = 'user/forget_password.html'
     form_class = ForgetPasswordForm
+    query_budget = 10
 
     def form_valid(self, form):
         form.save(request=self.request)
@@ -89,6 +97,8 @@ class ForgetPasswordView(BaseContextMixin, FormView):
 
 # 找回密码-输入新密码
 class ResetPasswordView(View):
+    query_budget = 8
+
     @staticmethod
     def get_email_verify(random):
         try:
@@ -121,6 +131,7 @@ class ChangePasswordView(BaseContextMixin, LoginRequiredMixin, FormView):
     template_name = 'user/change_password.html'
     form_class = PasswordChangeForm
     success_url = reverse_lazy('user_change_pwd')
+    query_budget = 10
 
     def get_form(self, form_class=None):
         if form_class is None:
@@ -136,46 +147,25 @@ class ChangePasswordView(BaseContextMixin, LoginRequiredMixin, FormView):
 # 修改头像
 class ChangePortraitView(LoginRequiredMixin, BaseContextMixin, TemplateView):
     template_name = 'user/change_portrait.html'
+    query_budget = 10
 
     def post(self, request):
-        data = request.POST['tx']
+        data = request.POST.get('tx', '')
         if not data:
             return HttpResponse(u"请裁剪头像", status=500)
-        img_base64 = base64.b64decode(data)
-        file_dir = "user/"
-        media_root = getattr(settings, 'MEDIA_ROOT', None)
-        if media_root:
-            file_dir = os.path.join(media_root, 'user/')
-        if not os.path.exists(file_dir):
-            os.makedirs(file_dir)
-
-        name = user_portrait_path(request.user, 'portal.png')
-        path = os.path.join(media_root, name)
-
-        file = open(path, "wb+")
-        file.write(img_base64)
-        file.flush()
-        file.close()
-
-        # 修改头像分辨率
-        im = Image.open(path)
-        out = im.resize((200, 200), Image.ANTIALIAS)
-        out.save(path)
-
-        # 选择上传头像到本地
-        # 只需要为image存储文件名即可 url为base_url+user.image字段值
-        request.user.portrait = name
-        request.user.save()
-        # 验证上传是否错误
-        if not os.path.exists(path):
-            return HttpResponse(u"上传头像错误", status=500)
-
+        try:
+            save_portrait(request.user, base64.b64decode(data))
+        except binascii.Error:
+            return HttpResponse(u"头像格式错误", status=400)
+        except PortraitError as e:
+            return HttpResponse(str(e), status=400)
         return HttpResponse(u"上传头像成功!")
 
 
 # 消息通知
 class NotificationView(LoginRequiredMixin, BaseContextMixin, TemplateView):
     template_name = 'user/notification.html'
+    query_budget = 10
 
     def get_context_data(self, **kwargs):
         kwargs['notifications'] = self.request.user.to_user_notification_set.order_by('-create_time').all()
@@ -186,12 +176,14 @@ class NotificationView(LoginRequiredMixin, BaseContextMixin, TemplateView):
         notification_id = int(notification_id)
 
         notification = Notification.objects.filter(
-            pk=notification_id
+            pk=notification_id,
+            to_user=request.user
         ).first()
 
         if notification:
-            notification.is_read = True
-            notification.save()
+            # 仅在由未读改为已读时减少未读消息数
+            if Notification.objects.filter(pk=notification.pk, is_read=0).update(is_read=1):
+                change_unread_count(request.user.id, -1)
             mydict = {"url": notification.url}
         else:
             mydict = {"url": '#'}
@@ -205,6 +197,7 @@ class NotificationView(LoginRequiredMixin, BaseContextMixin, TemplateView):
 class AttachmentView(BaseContextMixin, DetailView):
     queryset = Attachment.objects.all()
     slug_field = 'id'
+    query_budget = 10
 
     def get(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -214,6 +207,5 @@ class AttachmentView(BaseContextMixin, DetailView):
             response = HttpResponse(content_type='application/force-download')
             response['X-Sendfile'] = instance.file.path
         response['Content-Disposition'] = 'attachment; filename={}'.format(urlquote(instance.filename))
-        instance.download_times += 1
-        instance.save()
+        counters.incr(Attachment, 'download_times', instance.id)
         return response